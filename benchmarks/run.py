@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 性能基准测试
+#
+# 用法:
+#     python -m benchmarks.run --records 200 --output results.json
+#     python -m benchmarks.run --compare baseline.json results.json
+#
+# 每项基准在独立的子进程中运行，峰值内存互不影响。结果以JSON输出，
+# 包含运行环境、参数和每项基准的吞吐量、延迟分位数和峰值内存，便于在不同提交之间比较。
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_records, write_text, write_docx
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _measure(name, items, func, sizes):
+    """
+    逐个处理items并统计吞吐量和延迟
+
+    参数:
+        name: 基准名称
+        items: 输入列表
+        func: 处理单个输入的函数
+        sizes: 与items对应的字符数
+    """
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    chars = sum(sizes)
+    return {
+        'name': name,
+        'docs': len(items),
+        'chars': chars,
+        'seconds': round(elapsed, 4),
+        'docs_per_s': round(len(items) / elapsed, 2) if elapsed else None,
+        'chars_per_s': round(chars / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50) * 1000, 3),
+            'p90': round(_percentile(latencies, 90) * 1000, 3),
+            'p99': round(_percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0.0
+        }
+    }
+
+
+def _recall(records, results):
+    """
+    按实体类型统计召回率
+
+    真实实体被识别结果完全覆盖（不论识别出的类型）即视为召回，因为覆盖后原文不会泄露。
+    """
+    found = {}
+    total = {}
+    for (_, truth), entities in zip(records, results):
+        spans = [(e['start'], e['end']) for e in entities]
+        for entity in truth:
+            total[entity['type']] = total.get(entity['type'], 0) + 1
+            covered = sum(
+                min(end, entity['end']) - max(start, entity['start'])
+                for start, end in spans if start < entity['end'] and end > entity['start']
+            )
+            if covered >= entity['end'] - entity['start']:
+                found[entity['type']] = found.get(entity['type'], 0) + 1
+    recall = {entity_type: round(found.get(entity_type, 0) / count, 4)
+              for entity_type, count in sorted(total.items())}
+    recall['ALL'] = round(sum(found.values()) / sum(total.values()), 4) if total else 0.0
+    return recall
+
+
+# ---- 各项基准，均在子进程中运行 ----
+
+def bench_redact_text(params):
+    from privacy_redactor import PrivacyRedactor
+    records = generate_records(params['records'], params['seed'])
+    texts = [text for text, _ in records]
+    redactor = PrivacyRedactor(strategy='medical')
+    redactor.strategy.warmup()
+    return _measure('redact_text', texts, redactor.redact_text, [len(t) for t in texts])
+
+
+def bench_stages(params):
+    """MedicalStrategy各阶段分别计时"""
+    from privacy_redactor.strategies import MedicalStrategy
+    from privacy_redactor.spans import resolve_overlaps
+    records = generate_records(params['records'], params['seed'])
+    texts = [text for text, _ in records]
+    sizes = [len(t) for t in texts]
+    strategy = MedicalStrategy()
+    strategy.warmup()
+    detected = [strategy._extract_by_regex(t) + strategy._extract_by_jieba(t) for t in texts]
+    pairs = list(zip(texts, detected))
+    return [
+        _measure('stage.regex', texts, strategy._extract_by_regex, sizes),
+        _measure('stage.jieba', texts, strategy._extract_by_jieba, sizes),
+        _measure('stage.resolve_overlaps', pairs,
+                 lambda pair: resolve_overlaps(pair[1], strategy.type_priority), sizes),
+        _measure('stage.get_entities', texts, strategy.get_entities, sizes),
+    ]
+
+
+def bench_pos_gate(params):
+    """jieba词性标注阶段在开启、关闭候选词块筛选时的吞吐量，以及两者的召回率"""
+    from privacy_redactor.strategies import MedicalStrategy
+    records = generate_records(params['records'], params['seed'])
+    texts = [text for text, _ in records]
+    sizes = [len(t) for t in texts]
+    results = []
+    for pos_gate in (False, True):
+        strategy = MedicalStrategy(pos_gate=pos_gate)
+        strategy.warmup()
+        result = _measure(f'stage.jieba[pos_gate={pos_gate}]', texts, strategy._extract_by_jieba, sizes)
+        result['recall'] = _recall(records, [strategy.get_entities(t) for t in texts])
+        results.append(result)
+    return results
+
+
+def bench_batch(params):
+    """extract_entities_batch一次处理全部文本"""
+    from privacy_redactor.strategies import MedicalStrategy
+    records = generate_records(params['records'], params['seed'])
+    texts = [text for text, _ in records]
+    strategy = MedicalStrategy()
+    strategy.warmup()
+    result = _measure('extract_entities_batch', [texts], strategy.extract_entities_batch,
+                      [sum(len(t) for t in texts)])
+    result['docs'] = len(texts)
+    result['docs_per_s'] = round(len(texts) / result['seconds'], 2) if result['seconds'] else None
+    return result
+
+
+def _bench_file(params, ext, docx_engine='python-docx'):
+    from privacy_redactor import PrivacyRedactor
+    records = generate_records(params['records'], params['seed'])
+    files = params['files']
+    per_file = max(1, len(records) // files)
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        sizes = []
+        for i in range(files):
+            chunk = records[i * per_file:(i + 1) * per_file] or records[:per_file]
+            path = os.path.join(workdir, f'record_{i}{ext}')
+            if ext == '.docx':
+                write_docx(path, chunk, seed=params['seed'] + i)
+            else:
+                write_text(path, chunk)
+            paths.append(path)
+            sizes.append(sum(len(text) for text, _ in chunk))
+        redactor = PrivacyRedactor(strategy='medical', docx_engine=docx_engine)
+        redactor.strategy.warmup()
+        name = f'redact_file{ext}' if ext == '.txt' else f'redact_file.docx[{docx_engine}]'
+        return _measure(name, paths, lambda p: redactor.redact_file(p, p + '.out' + ext), sizes)
+
+
+def bench_file_txt(params):
+    return _bench_file(params, '.txt')
+
+
+def bench_file_docx(params):
+    return _bench_file(params, '.docx')
+
+
+def bench_file_docx_stream(params):
+    return _bench_file(params, '.docx', docx_engine='stream')
+
+
+BENCHMARKS = {
+    'redact_text': bench_redact_text,
+    'stages': bench_stages,
+    'pos_gate': bench_pos_gate,
+    'batch': bench_batch,
+    'file_txt': bench_file_txt,
+    'file_docx': bench_file_docx,
+    'file_docx_stream': bench_file_docx_stream,
+}
+
+
+def _run_in_child(name, params):
+    results = BENCHMARKS[name](params)
+    if isinstance(results, dict):
+        results = [results]
+    peak = round(_peak_rss_mb(), 1)
+    for result in results:
+        result['peak_rss_mb'] = peak
+    return results
+
+
+def run(names, params, isolate=True):
+    """依次运行各项基准，返回结果列表"""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        print(f"运行基准: {name}", file=sys.stderr)
+        if isolate:
+            with context.Pool(1) as pool:
+                results.extend(pool.apply(_run_in_child, (name, params)))
+        else:
+            results.extend(_run_in_child(name, params))
+    return results
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def compare(baseline_path, current_path):
+    """比较两次结果的吞吐量，返回 [(基准名称, 基线字符/秒, 当前字符/秒, 比值), ...]"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)['results']
+    rows = []
+    for result in current:
+        before = baseline.get(result['name'])
+        if before and before.get('chars_per_s') and result.get('chars_per_s'):
+            rows.append((result['name'], before['chars_per_s'], result['chars_per_s'],
+                         result['chars_per_s'] / before['chars_per_s']))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cn-HPP性能基准测试')
+    parser.add_argument('--records', type=int, default=200, help='合成病历数量（默认: 200）')
+    parser.add_argument('--files', type=int, default=5, help='文件基准中的文件数量（默认: 5）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认: 0）')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS),
+                        help='只运行指定的基准，可以重复指定')
+    parser.add_argument('--no-isolate', action='store_true', help='在当前进程中运行所有基准')
+    parser.add_argument('--output', help='结果JSON文件路径，默认输出到标准输出')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='比较两个结果文件的吞吐量')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        for name, before, after, ratio in compare(*args.compare):
+            print(f'{name:36s} {before:14.1f} -> {after:14.1f} 字符/秒  x{ratio:.2f}')
+        return 0
+
+    params = {'records': args.records, 'files': args.files, 'seed': args.seed}
+    report = {
+        'environment': _environment(),
+        'params': params,
+        'results': run(args.bench or list(BENCHMARKS), params, isolate=not args.no_isolate)
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
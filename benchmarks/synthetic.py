@@ -0,0 +1,182 @@
+# 合成中文医疗病历生成器
+#
+# 按随机种子生成包含姓名、身份证号、手机号、住院号、地址、医生姓名和检验结果表格的病历文本，
+# 同一种子生成的内容完全相同，用于基准测试和识别效果评估。每条病历附带其中隐私信息的真实位置。
+import random
+
+SURNAMES = '张李王赵刘陈杨黄周吴徐孙马朱胡林郭何高罗郑梁谢宋唐许邓冯韩曹曾彭蒋蔡'
+GIVEN_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红建国文斌辉鹏宇晨浩然欣怡子涵'
+PROVINCES = {
+    '浙江省': {'杭州市': ['西湖区', '上城区', '拱墅区'], '宁波市': ['海曙区', '鄞州区']},
+    '江苏省': {'南京市': ['玄武区', '鼓楼区'], '苏州市': ['姑苏区', '吴中区']},
+    '广东省': {'广州市': ['天河区', '越秀区'], '深圳市': ['南山区', '福田区']},
+    '四川省': {'成都市': ['武侯区', '锦江区']},
+}
+ROADS = ['文三路', '学院路', '中山路', '人民路', '解放路', '建设路', '和平街', '新华街']
+# 身份证号前6位行政区划代码
+AREA_CODES = ['330102', '330106', '320102', '320506', '440106', '440305', '510107']
+PHONE_PREFIXES = ['138', '139', '137', '150', '151', '158', '186', '188', '199']
+DOCTOR_TITLES = ['主治医师', '主管医师', '经治医师', '值班医师']
+DEPARTMENTS = ['呼吸内科', '心血管内科', '消化内科', '内分泌科', '神经内科', '普外科']
+COMPLAINTS = [
+    '持续发热三天，伴有咳嗽、咳痰', '反复胸闷、气促一月余', '上腹部疼痛伴恶心两天',
+    '头晕、乏力一周', '多饮、多尿、体重下降三月', '右下腹疼痛十二小时'
+]
+HISTORIES = [
+    '既往有高血压病史，目前口服硝苯地平缓释片控制', '既往有糖尿病病史十年，规律使用胰岛素',
+    '否认高血压、糖尿病等慢性病史', '既往有冠心病病史，长期服用阿司匹林'
+]
+DIAGNOSES = ['肺炎', '高血压（2级）', '2型糖尿病', '冠心病', '急性胃炎', '急性阑尾炎']
+LAB_ITEMS = [
+    ('白细胞', '10^9/L', 3.5, 9.5), ('红细胞', '10^12/L', 4.3, 5.8), ('血红蛋白', 'g/L', 130, 175),
+    ('血小板', '10^9/L', 125, 350), ('空腹血糖', 'mmol/L', 3.9, 6.1), ('肌酐', 'μmol/L', 57, 111),
+    ('谷丙转氨酶', 'U/L', 9, 50), ('总胆固醇', 'mmol/L', 2.8, 5.2)
+]
+_ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+_ID_CHECK = '10X98765432'
+
+
+class RecordBuilder:
+    """拼接病历文本，同时记录隐私信息的位置"""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+        self.entities = []
+
+    def add(self, text, entity_type=None):
+        if entity_type is not None:
+            self.entities.append({
+                'original': text,
+                'type': entity_type,
+                'start': self.length,
+                'end': self.length + len(text)
+            })
+        self.parts.append(text)
+        self.length += len(text)
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+class MedicalRecordGenerator:
+    """按随机种子生成合成病历"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def name(self):
+        rng = self.rng
+        return rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2))))
+
+    def id_card(self):
+        rng = self.rng
+        birth = f'{rng.randint(1940, 2005)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}'
+        body = rng.choice(AREA_CODES) + birth + f'{rng.randint(0, 999):03d}'
+        check = _ID_CHECK[sum(int(d) * w for d, w in zip(body, _ID_WEIGHTS)) % 11]
+        return body + check
+
+    def phone(self):
+        return self.rng.choice(PHONE_PREFIXES) + f'{self.rng.randint(0, 99999999):08d}'
+
+    def admission_no(self):
+        return str(self.rng.randint(10 ** 7, 10 ** 8 - 1))
+
+    def address(self):
+        rng = self.rng
+        province = rng.choice(list(PROVINCES))
+        city = rng.choice(list(PROVINCES[province]))
+        district = rng.choice(PROVINCES[province][city])
+        return f'{province}{city}{district}{rng.choice(ROADS)}{rng.randint(1, 999)}号'
+
+    def date(self):
+        rng = self.rng
+        return f'{rng.randint(2015, 2024)}年{rng.randint(1, 12)}月{rng.randint(1, 28)}日'
+
+    def lab_rows(self, count):
+        """生成检验结果表格的行：[项目, 结果, 单位, 参考范围]"""
+        rows = []
+        for _ in range(count):
+            item, unit, low, high = self.rng.choice(LAB_ITEMS)
+            value = round(self.rng.uniform(low * 0.7, high * 1.3), 1)
+            rows.append([item, str(value), unit, f'{low}-{high}'])
+        return rows
+
+    def record(self, lab_rows=4):
+        """
+        生成一条病历
+
+        返回:
+            text: 病历文本，段落之间以换行分隔
+            entities: 隐私信息的真实位置列表
+        """
+        rng = self.rng
+        b = RecordBuilder()
+        b.add(f'{rng.choice(DEPARTMENTS)}入院记录\n')
+        b.add('患者')
+        b.add(self.name(), 'NAME')
+        b.add(f'，{rng.choice("男女")}，{rng.randint(18, 90)}岁，身份证号码')
+        b.add(self.id_card(), 'ID_CARD')
+        b.add('，住院号：')
+        b.add(self.admission_no(), 'PATIENT_ID')
+        b.add('。\n家庭住址：')
+        b.add(self.address(), 'LOCATION')
+        b.add('，联系电话')
+        b.add(self.phone(), 'PHONE')
+        b.add('。\n联系人：')
+        b.add(self.name(), 'NAME')
+        b.add('，电话')
+        b.add(self.phone(), 'PHONE')
+        b.add(f'。\n患者因{rng.choice(COMPLAINTS)}，于')
+        b.add(self.date(), 'DATE')
+        b.add(f'来我院就诊。\n患者{rng.choice(HISTORIES)}。\n检验结果：\n')
+        for row in self.lab_rows(lab_rows):
+            b.add(' '.join(row) + '\n')
+        b.add(f'诊断为：1.{rng.choice(DIAGNOSES)} 2.{rng.choice(DIAGNOSES)}\n')
+        b.add(f'{rng.choice(DOCTOR_TITLES)}：')
+        b.add(self.name(), 'DOCTOR_NAME')
+        b.add('\n')
+        return b.text(), b.entities
+
+    def records(self, count, lab_rows=4):
+        """生成count条病历，返回 [(text, entities), ...]"""
+        return [self.record(lab_rows) for _ in range(count)]
+
+
+def generate_records(count, seed=0, lab_rows=4):
+    """按种子生成count条病历，返回 [(text, entities), ...]"""
+    return MedicalRecordGenerator(seed).records(count, lab_rows)
+
+
+def write_text(path, records):
+    """将多条病历写入一个UTF-8文本文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for text, _ in records:
+            f.write(text)
+            f.write('\n')
+
+
+def write_docx(path, records, seed=0, lab_rows=8):
+    """
+    将多条病历写入一个Word文档，每条病历的正文为段落，并附带一张检验结果表格
+
+    参数:
+        path: 输出文件路径
+        records: generate_records返回的病历列表
+        seed: 生成表格内容使用的随机种子
+        lab_rows: 每张表格的行数
+    """
+    from docx import Document
+
+    generator = MedicalRecordGenerator(seed)
+    doc = Document()
+    for text, _ in records:
+        for line in text.rstrip('\n').split('\n'):
+            doc.add_paragraph(line)
+        table = doc.add_table(rows=lab_rows + 1, cols=4)
+        for cell, title in zip(table.rows[0].cells, ('项目', '结果', '单位', '参考范围')):
+            cell.text = title
+        for row, values in zip(table.rows[1:], generator.lab_rows(lab_rows)):
+            for cell, value in zip(row.cells, values):
+                cell.text = value
+    doc.save(path)
@@ -105,23 +105,21 @@ def main():
     # 也可以通过以下方式直接集成到PrivacyRedactor
     print("\n集成到PrivacyRedactor:")
     
-    # 方法1: 使用实例化后的策略
-    from privacy_redactor.redactor import PrivacyRedactor as PR
+    # 方法1: 注册自定义策略，之后可以像内置策略一样按名称选择
+    from privacy_redactor import register_strategy
     
-    # 创建不带类型提示的工厂函数
-    def get_custom_strategy():
-        return CustomMedicalStrategy()
-    
-    # 添加自定义策略到策略映射
-    PR._strategy_map = {'custom': get_custom_strategy}
+    register_strategy('custom', CustomMedicalStrategy, replace=True)
     
     # 创建使用自定义策略的PrivacyRedactor
     try:
-        redactor = PR(strategy='custom')
+        redactor = PrivacyRedactor(strategy='custom')
         print("成功创建使用自定义策略的PrivacyRedactor实例")
     except Exception as e:
         print(f"创建使用自定义策略的PrivacyRedactor实例失败: {e}")
     
+    # 方法2: 直接传入策略实例
+    redactor = PrivacyRedactor(strategy=custom_strategy)
+    
     print("\n=== 示例结束 ===")
 
 if __name__ == "__main__":
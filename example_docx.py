@@ -43,18 +43,18 @@ def main():
         print(f"处理文档时出错: {e}")
     
     # 6. 使用不同的策略
-    print("\n3. 使用Hybrid策略处理文档")
+    print("\n3. 使用Auto策略处理文档")
     try:
-        hybrid_redactor = PrivacyRedactor(strategy='hybrid')
-        hybrid_output = "example_medical_hybrid.docx"
-        hybrid_path, hybrid_entities = hybrid_redactor.redact_file(docx_file, hybrid_output)
-        print(f"处理完成，输出文件: {hybrid_path}")
-        print(f"Hybrid策略识别到 {len(hybrid_entities)} 个敏感实体")
+        auto_redactor = PrivacyRedactor(strategy='auto')
+        auto_output = "example_medical_auto.docx"
+        auto_path, auto_entities = auto_redactor.redact_file(docx_file, auto_output)
+        print(f"处理完成，输出文件: {auto_path}")
+        print(f"Auto策略识别到 {len(auto_entities)} 个敏感实体")
     except Exception as e:
-        print(f"使用Hybrid策略处理文档时出错: {e}")
+        print(f"使用Auto策略处理文档时出错: {e}")
     
     print("\n=== 示例结束 ===")
-    print("提示: 请使用Word打开生成的 '*_redacted.docx' 和 '*_hybrid.docx' 文件查看处理效果")
+    print("提示: 请使用Word打开生成的 '*_redacted.docx' 和 '*_auto.docx' 文件查看处理效果")
     print("敏感实体信息会被保存在同目录下的 '*_entities.json' 文件中")
 
 if __name__ == "__main__":
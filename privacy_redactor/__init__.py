@@ -1,11 +1,33 @@
 from .redactor import PrivacyRedactor
-from .strategies import HanlpStrategy, LLMStrategy, RegexStrategy, HybridStrategy, MedicalStrategy
+from .registry import register_strategy, unregister_strategy, available_strategies
+from .metrics import Metrics, MetricsCollector, LoggingSink
+from .sink import JsonlEntitySink, iter_entities
+from .pseudonym import Pseudonymizer, PseudonymVault
+
+# 策略类在第一次访问时才导入strategies模块，避免import privacy_redactor时加载jieba
+_STRATEGY_EXPORTS = ('RegexStrategy', 'MedicalStrategy', 'TriageStrategy')
+
+
+def __getattr__(name):
+    if name in _STRATEGY_EXPORTS:
+        from . import strategies
+        return getattr(strategies, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'PrivacyRedactor',
-    'HanlpStrategy',
-    'LLMStrategy',
     'RegexStrategy',
-    'HybridStrategy',
-    'MedicalStrategy'
+    'MedicalStrategy',
+    'TriageStrategy',
+    'register_strategy',
+    'unregister_strategy',
+    'available_strategies',
+    'Metrics',
+    'MetricsCollector',
+    'LoggingSink',
+    'JsonlEntitySink',
+    'iter_entities',
+    'Pseudonymizer',
+    'PseudonymVault'
 ] 
\ No newline at end of file
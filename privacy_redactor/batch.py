@@ -0,0 +1,206 @@
+import gc
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from .registry import register_strategy, get_strategy_factory
+from .utils import save_entities
+
+# 工作进程内的处理器，由进程池初始化函数创建，每个进程只创建一次
+_worker_redactor = None
+
+
+def _init_worker(config, factory):
+    """进程池初始化：创建处理器并预先加载策略依赖的词典"""
+    global _worker_redactor
+    from .redactor import PrivacyRedactor
+
+    strategy = config['strategy']
+    # spawn方式启动的进程中没有父进程注册的自定义策略，按父进程的工厂补注册
+    if isinstance(strategy, str) and factory is not None and get_strategy_factory(strategy) is None:
+        register_strategy(strategy, factory)
+    _worker_redactor = PrivacyRedactor(**config)
+    warmup = getattr(_worker_redactor.strategy, 'warmup', None)
+    if warmup is not None:
+        warmup()
+
+
+def _redact_chunk(texts):
+    """在工作进程中处理一批文本，整批合并为一次批量识别"""
+    return _worker_redactor.redact_batch(texts)
+
+
+def _redact_file(redactor, input_path, output_path, write_entities, return_entities=False):
+    """处理一个文件，返回识别出的实体数量，return_entities为True时返回实体"""
+    dirname = os.path.dirname(output_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    output_path, entities = redactor.redact_file(input_path, output_path)
+    if write_entities:
+        save_entities(entities, output_path)
+    return entities if return_entities else len(entities)
+
+
+def _redact_file_in_worker(input_path, output_path, write_entities, return_entities):
+    """在工作进程中处理一个文件"""
+    return _redact_file(_worker_redactor, input_path, output_path, write_entities, return_entities)
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def redact_texts(redactor, texts, workers=None, chunksize=64):
+    """
+    使用进程池批量处理文本
+
+    输入按chunksize分批提交给进程池，同时在途的批次数量有上限，输入可以是任意长的迭代器，
+    结果按输入顺序以生成器形式逐个返回。redactor配置了entity_sink时，
+    实体在当前进程中按输入顺序写出，文档编号为文本的序号。
+
+    参数:
+        redactor: PrivacyRedactor实例，工作进程按其配置创建各自的处理器
+        texts: 可迭代的文本
+        workers: 工作进程数，默认为CPU核数；为1时在当前进程中处理
+        chunksize: 每次提交给工作进程的文本数量
+
+    返回:
+        生成器，每项为 (redacted_text, entities)，与redact_text的返回值相同
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize < 1:
+        raise ValueError(f"chunksize必须为正整数: {chunksize}")
+    if workers <= 1:
+        for index, text in enumerate(texts):
+            yield redactor.redact_text(text, doc_id=index)
+        return
+
+    sink = getattr(redactor, 'entity_sink', None)
+    index = 0
+
+    def results(future):
+        nonlocal index
+        for result in future.result():
+            if sink is not None:
+                sink.write(index, result[1])
+            index += 1
+            yield result
+
+    pool = _pool_for(redactor, workers)
+    pending = deque()
+    try:
+        for chunk in _chunked(texts, chunksize):
+            pending.append(pool.submit(_redact_chunk, chunk))
+            # 在途批次达到上限时先等待最早的批次，保证顺序并限制内存
+            if len(pending) >= workers * 2:
+                yield from results(pending.popleft())
+        while pending:
+            yield from results(pending.popleft())
+    finally:
+        _shutdown(pool, pending)
+
+
+def _shutdown(pool, pending):
+    """关闭进程池，在途但尚未开始执行的任务直接取消（shutdown的cancel_futures参数需要Python 3.9）"""
+    for future in pending:
+        future.cancel()
+    pool.shutdown(wait=True)
+
+
+def _pool_for(redactor, workers):
+    """
+    创建按redactor配置初始化工作进程的进程池
+
+    以fork方式启动工作进程时，先在当前进程中加载词典，工作进程直接继承已加载的jieba状态，
+    不再各自加载，词典占用的内存页在各进程间写时复制共享。fork前冻结垃圾回收跟踪的现有对象，
+    避免工作进程中的垃圾回收遍历这些对象时写入对象头部，使共享的页被逐个复制；
+    工作进程fork出来后立即在当前进程中解除冻结，调用方的垃圾回收行为不受影响。
+    """
+    fork = multiprocessing.get_start_method() == 'fork'
+    if fork:
+        warmup = getattr(redactor.strategy, 'warmup', None)
+        if warmup is not None:
+            warmup()
+        gc.collect()
+        gc.freeze()
+    config = redactor.worker_config()
+    strategy = config['strategy']
+    factory = get_strategy_factory(strategy) if isinstance(strategy, str) else None
+    try:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(config, factory))
+        if fork:
+            # 进程池在第一次提交任务时才fork出全部工作进程，提交一个空任务使其立即完成fork
+            pool.submit(os.getpid)
+    finally:
+        if fork:
+            gc.unfreeze()
+    return pool
+
+
+def redact_files(redactor, jobs, workers=None, write_entities=True):
+    """
+    使用进程池批量处理文件
+
+    单个文件出错不会中断其余文件，错误随结果返回。结果按完成顺序返回，
+    同时在途的文件数量有上限，jobs可以是任意长的迭代器。
+    redactor配置了entity_sink时，工作进程把实体传回当前进程，由当前进程统一写出。
+
+    参数:
+        redactor: PrivacyRedactor实例，工作进程按其配置创建各自的处理器
+        jobs: 可迭代的 (输入文件路径, 输出文件路径)
+        workers: 工作进程数，默认为CPU核数；为1时在当前进程中处理
+        write_entities: 是否在输出文件旁保存实体文件（见utils.save_entities）
+
+    返回:
+        生成器，每项为 (输入文件路径, 输出文件路径, 实体数量, 错误)，成功时错误为None
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for input_path, output_path in jobs:
+            try:
+                count = _redact_file(redactor, input_path, output_path, write_entities)
+            except Exception as e:
+                yield input_path, output_path, 0, e
+            else:
+                yield input_path, output_path, count, None
+        return
+
+    sink = getattr(redactor, 'entity_sink', None)
+    pool = _pool_for(redactor, workers)
+    pending = {}
+    try:
+        for input_path, output_path in jobs:
+            future = pool.submit(_redact_file_in_worker, input_path, output_path, write_entities,
+                                 sink is not None)
+            pending[future] = (input_path, output_path)
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _file_result(pending.pop(future), future, sink)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _file_result(pending.pop(future), future, sink)
+    finally:
+        _shutdown(pool, pending)
+
+
+def _file_result(job, future, sink=None):
+    input_path, output_path = job
+    error = future.exception()
+    if error is not None:
+        return input_path, output_path, 0, error
+    result = future.result()
+    if sink is None:
+        return input_path, output_path, result, None
+    sink.write(input_path, result)
+    return input_path, output_path, len(result), None
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# 缓存内容的格式版本，实体结构或识别逻辑发生不兼容变化时递增，旧的磁盘缓存随之失效
+CACHE_FORMAT_VERSION = 1
+
+
+def segment_key(text, fingerprint):
+    """
+    计算文本片段的缓存键
+
+    参数:
+        text: 文本片段
+        fingerprint: 策略配置指纹，配置不同的策略不会共享缓存项
+
+    返回:
+        key: 十六进制的SHA-256摘要
+    """
+    digest = hashlib.sha256(f'{CACHE_FORMAT_VERSION}\x00{fingerprint}\x00'.encode('utf-8'))
+    digest.update(text.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class EntityCache:
+    """
+    按内容寻址的实体缓存
+
+    医疗文档高度模板化，相同的页眉、签名、科室行和固定段落在大量文件中反复出现。
+    缓存以文本片段和策略配置指纹的哈希为键，保存识别出的实体：
+    第一层是进程内有容量上限的LRU，第二层是可选的SQLite磁盘缓存（WAL模式），
+    可以在多次运行和多个工作进程之间共享。
+    """
+
+    def __init__(self, maxsize=4096, path=None):
+        """
+        初始化实体缓存
+
+        参数:
+            maxsize: 内存中最多缓存的文本片段数量，为0时只使用磁盘缓存
+            path: SQLite缓存文件路径，为None时只使用内存缓存
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def __getstate__(self):
+        # 传给工作进程时只传递配置，各进程使用自己的内存缓存和数据库连接
+        return {'maxsize': self.maxsize, 'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _db(self):
+        """返回当前进程的数据库连接，fork出的子进程不能沿用父进程的连接"""
+        if self._connection is None or self._pid != os.getpid():
+            import sqlite3
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entities (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key, entities):
+        if self.maxsize <= 0:
+            return
+        self._memory[key] = entities
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        查询缓存
+
+        返回:
+            entities: 缓存的实体列表（副本），未命中时返回None
+        """
+        with self._lock:
+            entities = self._memory.get(key)
+            if entities is not None:
+                self._memory.move_to_end(key)
+            elif self.path is not None:
+                row = self._db().execute('SELECT value FROM entities WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    entities = json.loads(row[0])
+                    self._remember(key, entities)
+                    self.disk_hits += 1
+            if entities is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # 调用方可能修改返回的实体，缓存中保留一份独立的副本
+        return [dict(entity) for entity in entities]
+
+    def put(self, key, entities):
+        """写入一个缓存项"""
+        self.put_many([(key, entities)])
+
+    def put_many(self, items):
+        """
+        批量写入缓存项，磁盘缓存在一个事务中写入
+
+        参数:
+            items: 可迭代的 (缓存键, 实体列表)
+        """
+        items = [(key, [dict(entity) for entity in entities]) for key, entities in items]
+        if not items:
+            return
+        with self._lock:
+            for key, entities in items:
+                self._remember(key, entities)
+            if self.path is not None:
+                connection = self._db()
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO entities (key, value) VALUES (?, ?)',
+                        [(key, json.dumps(entities, ensure_ascii=False)) for key, entities in items]
+                    )
+
+    def stats(self):
+        """
+        返回缓存命中统计
+
+        返回:
+            stats: 包含hits、misses、disk_hits、hit_rate、size的字典
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._memory)
+        }
+
+    def clear(self):
+        """清空内存缓存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self.path is not None:
+                connection = self._db()
+                with connection:
+                    connection.execute('DELETE FROM entities')
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
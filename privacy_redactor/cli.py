@@ -0,0 +1,300 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from .batch import redact_files
+
+# 支持处理的文件类型，与PrivacyRedactor.file_handlers一致
+SUPPORTED_EXTENSIONS = ('.txt', '.docx')
+MANIFEST_NAME = '.cn-hpp-manifest.jsonl'
+
+
+class Manifest:
+    """
+    记录每个文件处理状态的清单文件
+
+    每处理完一个文件追加一行JSON（相对路径、文件大小、修改时间、状态），
+    同一路径以最后一行为准。重新运行时跳过大小和修改时间都未变化且已成功处理的文件，
+    因此中断的任务可以从中断处继续。
+    """
+
+    def __init__(self, path):
+        """
+        参数:
+            path: 清单文件路径，不存在时自动创建
+        """
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 中断时可能留下不完整的最后一行
+                        continue
+                    self.records[record['path']] = record
+        self._file = None
+
+    def is_done(self, rel_path, stat):
+        """文件是否已经成功处理且之后没有被修改"""
+        record = self.records.get(rel_path)
+        return (record is not None and record['status'] == 'done'
+                and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns)
+
+    def record(self, rel_path, stat, status, entities=0, error=None):
+        """追加一条处理记录并立即写入磁盘"""
+        record = {
+            'path': rel_path,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'status': status,
+            'entities': entities
+        }
+        if error is not None:
+            record['error'] = error
+        if self._file is None:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.records[rel_path] = record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_files(input_dir, extensions=SUPPORTED_EXTENSIONS):
+    """
+    按固定顺序遍历目录树中支持处理的文件
+
+    返回:
+        生成器，每项为 (相对路径, 绝对路径)，相对路径统一使用'/'分隔
+    """
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, input_dir).replace(os.sep, '/'), path
+
+
+def redact_directory(redactor, input_dir, output_dir, workers=None, manifest_path=None,
+                     write_entities=True, stream=sys.stdout):
+    """
+    处理目录树中的所有文本和Word文档，在输出目录中按相同的目录结构写出结果
+
+    参数:
+        redactor: PrivacyRedactor实例
+        input_dir: 输入目录
+        output_dir: 输出目录
+        workers: 工作进程数，默认为CPU核数
+        manifest_path: 清单文件路径，默认为输出目录下的.cn-hpp-manifest.jsonl
+        write_entities: 是否在每个输出文件旁保存实体文件
+        stream: 输出进度信息的文件对象，为None时不输出
+
+    返回:
+        summary: 各状态的文件数量，键为 'done', 'skipped', 'failed'
+    """
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+        raise ValueError("输出目录不能与输入目录相同")
+    manifest = Manifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    summary = {'done': 0, 'skipped': 0, 'failed': 0}
+    stats = {}
+
+    def jobs():
+        for rel_path, path in iter_files(input_dir):
+            # 输出目录位于输入目录之内时不处理已生成的结果
+            if os.path.abspath(path).startswith(os.path.abspath(output_dir) + os.sep):
+                continue
+            stat = os.stat(path)
+            if manifest.is_done(rel_path, stat):
+                summary['skipped'] += 1
+                continue
+            stats[path] = (rel_path, stat)
+            yield path, os.path.join(output_dir, *rel_path.split('/'))
+
+    try:
+        for input_path, _, count, error in redact_files(redactor, jobs(), workers, write_entities):
+            rel_path, stat = stats.pop(input_path)
+            if error is None:
+                manifest.record(rel_path, stat, 'done', count)
+                summary['done'] += 1
+            else:
+                manifest.record(rel_path, stat, 'failed', error=f'{type(error).__name__}: {error}')
+                summary['failed'] += 1
+                if stream is not None:
+                    print(f"❌ 处理失败: {rel_path}: {error}", file=stream)
+    finally:
+        manifest.close()
+    return summary
+
+
+def _add_redactor_arguments(parser):
+    """添加redact和serve共用的处理器参数"""
+    parser.add_argument('--strategy', default='medical', help='使用的策略名称（默认: medical）')
+    parser.add_argument('--pseudonym-key-file', default=None, metavar='PATH',
+                        help='伪名化密钥文件，指定时姓名、证件号等替换为由密钥派生的一致的替代文本')
+    parser.add_argument('--pseudonym-vault', default=None, metavar='DIR',
+                        help='记录替代文本与原文对应关系的目录，供授权后还原（需同时指定--pseudonym-key-file）')
+    parser.add_argument('--tokenizer-snapshot', default=None, metavar='PATH',
+                        help='build-tokenizer生成的分词词典快照，各进程直接恢复分词器状态')
+    parser.add_argument('--enable-llm', action='store_true', help='启用大语言模型增强')
+    parser.add_argument('--model-name', default='qwen2:7b', help='大语言模型名称')
+    parser.add_argument('--url', default='http://127.0.0.1:11434', help='大语言模型API地址')
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='cn-hpp', description='中文医疗隐私信息处理工具')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='输出更详细的日志，-v 输出每个文件的处理结果，-vv 输出调试信息')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    redact = subparsers.add_parser('redact', help='处理单个文件或整个目录中的文本和Word文档')
+    redact.add_argument('input', help='输入文件或目录')
+    redact.add_argument('output', help='输出文件或目录，输入为目录时按相同的目录结构写出')
+    redact.add_argument('--workers', type=int, default=None, help='工作进程数（默认: CPU核数）')
+    redact.add_argument('--manifest', default=None,
+                        help=f'清单文件路径（默认: 输出目录下的{MANIFEST_NAME}）')
+    redact.add_argument('--no-entities', action='store_true', help='不保存实体文件')
+    redact.add_argument('--entities-jsonl', default=None, metavar='PATH',
+                        help='将所有文件的实体流式写入一组JSON Lines文件，代替每个文件旁的实体文件')
+    redact.add_argument('--entities-max-mb', type=int, default=64,
+                        help='每个JSON Lines实体文件的大小上限（MB，默认: 64）')
+    redact.add_argument('--docx-engine', choices=('python-docx', 'stream'), default='python-docx',
+                        help='Word文档的处理方式（默认: python-docx）')
+    redact.add_argument('--incremental', action='store_true',
+                        help='在输出文件旁保存段落识别结果，重新处理修订后的Word文档时只识别变化的段落')
+    _add_redactor_arguments(redact)
+
+    serve = subparsers.add_parser('serve', help='启动常驻的HTTP服务，合并并发请求批量处理文本')
+    serve.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    serve.add_argument('--port', type=int, default=8765, help='监听端口（默认: 8765）')
+    serve.add_argument('--unix', default=None, metavar='PATH', help='监听Unix套接字，代替TCP端口')
+    serve.add_argument('--workers', type=int, default=0,
+                       help='工作进程数（默认: 0，在服务进程的后台线程中处理）')
+    serve.add_argument('--max-batch', type=int, default=64, help='每批最多合并的文本数量（默认: 64）')
+    serve.add_argument('--max-delay-ms', type=float, default=2.0,
+                       help='第一个文本等待合并其他文本的最长时间（毫秒，默认: 2）')
+    _add_redactor_arguments(serve)
+
+    build = subparsers.add_parser('build-tokenizer',
+                                  help='生成合并了医疗词表和用户词典的分词词典快照，供各进程快速加载')
+    build.add_argument('output', help='快照文件路径')
+    build.add_argument('--user-dict', action='append', default=[], metavar='PATH',
+                       help='jieba格式的用户词典（每行：词条 [词频] [词性]），可以多次指定')
+    return parser
+
+
+def _use_tokenizer_snapshot(args):
+    """通过环境变量指定快照，工作进程（包括spawn方式启动的）自动继承"""
+    from .tokenizer import SNAPSHOT_ENV
+
+    if args.tokenizer_snapshot:
+        os.environ[SNAPSHOT_ENV] = os.path.abspath(args.tokenizer_snapshot)
+
+
+def _pseudonymizer(args):
+    """按命令行参数创建伪名化器，未指定密钥文件时返回None"""
+    from .pseudonym import Pseudonymizer, PseudonymVault
+
+    if args.pseudonym_vault and not args.pseudonym_key_file:
+        raise ValueError("--pseudonym-vault需要同时指定--pseudonym-key-file")
+    if not args.pseudonym_key_file:
+        return None
+    vault = PseudonymVault(args.pseudonym_vault) if args.pseudonym_vault else None
+    return Pseudonymizer.from_key_file(args.pseudonym_key_file, vault=vault)
+
+
+def _redact_command(args):
+    from .redactor import PrivacyRedactor
+    from .sink import JsonlEntitySink
+
+    pseudonymizer = _pseudonymizer(args)
+    sink = None
+    if args.entities_jsonl and not args.no_entities:
+        sink = JsonlEntitySink(args.entities_jsonl, max_bytes=args.entities_max_mb << 20)
+    # 使用JSON Lines实体文件时不再在每个输出文件旁保存实体文件
+    write_entities = not args.no_entities and sink is None
+    redactor = PrivacyRedactor(
+        strategy=args.strategy,
+        enable_llm=args.enable_llm,
+        model_name=args.model_name,
+        url=args.url,
+        docx_engine=args.docx_engine,
+        entity_sink=sink,
+        pseudonymizer=pseudonymizer,
+        incremental=args.incremental
+    )
+    try:
+        if os.path.isdir(args.input):
+            summary = redact_directory(
+                redactor, args.input, args.output,
+                workers=args.workers,
+                manifest_path=args.manifest,
+                write_entities=write_entities
+            )
+            print(f"处理完成: 成功 {summary['done']} 个，跳过 {summary['skipped']} 个，失败 {summary['failed']} 个")
+            return 1 if summary['failed'] else 0
+
+        output_path, entities = redactor.redact_file(args.input, args.output)
+        if write_entities:
+            from .utils import save_entities
+            save_entities(entities, output_path)
+        print(f"处理完成，识别到 {len(entities)} 个敏感实体")
+        return 0
+    finally:
+        if sink is not None:
+            sink.close()
+        if pseudonymizer is not None and pseudonymizer.vault is not None:
+            pseudonymizer.vault.close()
+
+
+def _serve_command(args):
+    from .redactor import PrivacyRedactor
+    from .server import serve
+
+    pseudonymizer = _pseudonymizer(args)
+    redactor = PrivacyRedactor(
+        strategy=args.strategy,
+        enable_llm=args.enable_llm,
+        model_name=args.model_name,
+        url=args.url,
+        pseudonymizer=pseudonymizer
+    )
+    try:
+        serve(redactor, host=args.host, port=args.port, unix_path=args.unix, workers=args.workers,
+              max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000)
+    finally:
+        if pseudonymizer is not None and pseudonymizer.vault is not None:
+            pseudonymizer.vault.close()
+    return 0
+
+
+def main(argv=None):
+    """命令行入口"""
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    if args.command == 'redact':
+        _use_tokenizer_snapshot(args)
+        return _redact_command(args)
+    if args.command == 'serve':
+        _use_tokenizer_snapshot(args)
+        return _serve_command(args)
+    if args.command == 'build-tokenizer':
+        from .tokenizer import build_snapshot
+
+        header = build_snapshot(args.output, user_dicts=args.user_dict)
+        print(f"分词词典快照已生成: {args.output}（{header['words']} 个词条，编号 {header['id']}）")
+        return 0
+    return 0
@@ -0,0 +1,281 @@
+from array import array
+from collections.abc import Mapping
+
+# 每个实体都有的字段，按列存储；其余字段（如投票得到的confidence）按实体单独存放
+_FIELDS = ('original', 'type', 'replacement', 'start', 'end')
+# 字符串表中的0号位置表示字段不存在
+_MISSING = 0
+
+
+class Entity(Mapping):
+    """
+    EntityBatch中一个实体的视图
+
+    不复制数据，按需从所在批次的列中读取字段，可以像字典一样使用：
+    entity['original']、entity.get('replacement')、dict(entity)。
+    通过entity['start'] = ...修改字段会写回所在批次。
+    """
+    __slots__ = ('_batch', '_index')
+
+    def __init__(self, batch, index):
+        self._batch = batch
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._batch._get(self._index, key)
+
+    def __setitem__(self, key, value):
+        self._batch._set(self._index, key, value)
+
+    def __iter__(self):
+        return iter(self._batch._keys(self._index))
+
+    def __len__(self):
+        return len(self._batch._keys(self._index))
+
+    def __repr__(self):
+        return f'Entity({self.to_dict()!r})'
+
+    def to_dict(self):
+        """返回实体的字典副本"""
+        return {key: self[key] for key in self._batch._keys(self._index)}
+
+
+class EntityBatch:
+    """
+    按列存储的实体列表
+
+    起始位置、结束位置保存在array中，实体类型保存为类型编码，原文和替换文本在批次内去重后保存为编号，
+    每个实体只占二十几个字节，而一个五个键的字典连同其中的整数对象要占数百字节。
+    批次可以像列表一样使用：len()、下标、切片、迭代，迭代和下标访问返回Entity视图。
+    starts、ends、type_codes列支持缓冲区协议，可以零复制地转换为numpy数组做批量排序和筛选。
+    """
+
+    def __init__(self, entities=()):
+        """
+        参数:
+            entities: 初始实体，可以是字典、Entity或另一个EntityBatch
+        """
+        self.starts = array('q')
+        self.ends = array('q')
+        self.type_codes = array('H')
+        self._originals = array('I')
+        self._replacements = array('I')
+        # 类型名称表和字符串表，编号即下标
+        self.types = []
+        self._type_index = {}
+        self._strings = [None]
+        self._string_index = {}
+        # 实体下标 -> 其他字段，大多数实体没有其他字段
+        self._extra = {}
+        self.extend(entities)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield Entity(self, i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.select(range(len(self.starts))[index])
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError('EntityBatch下标越界')
+        return Entity(self, index)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def __repr__(self):
+        return f'EntityBatch({len(self)} entities, types={self.types!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, (EntityBatch, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    # ---- 编码 ----
+
+    def _type_code(self, entity_type):
+        code = self._type_index.get(entity_type)
+        if code is None:
+            code = self._type_index[entity_type] = len(self.types)
+            self.types.append(entity_type)
+        return code
+
+    def _string_id(self, value):
+        if value is None:
+            return _MISSING
+        string_id = self._string_index.get(value)
+        if string_id is None:
+            string_id = self._string_index[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    # ---- 增加实体 ----
+
+    def append(self, entity):
+        """
+        添加一个实体
+
+        参数:
+            entity: 带有type、start、end的字典或Entity
+        """
+        self.starts.append(entity['start'])
+        self.ends.append(entity['end'])
+        self.type_codes.append(self._type_code(entity['type']))
+        self._originals.append(self._string_id(entity.get('original')))
+        self._replacements.append(self._string_id(entity.get('replacement')))
+        extra = {key: value for key, value in entity.items() if key not in _FIELDS}
+        if extra:
+            self._extra[len(self.starts) - 1] = extra
+
+    def extend(self, entities):
+        """添加多个实体，另一个EntityBatch按列合并"""
+        if isinstance(entities, EntityBatch):
+            self._extend_batch(entities)
+            return
+        for entity in entities:
+            self.append(entity)
+
+    def _extend_batch(self, other):
+        base = len(self.starts)
+        type_map = [self._type_code(entity_type) for entity_type in other.types]
+        string_map = [self._string_id(value) for value in other._strings]
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        self.type_codes.extend(type_map[code] for code in other.type_codes)
+        self._originals.extend(string_map[string_id] for string_id in other._originals)
+        self._replacements.extend(string_map[string_id] for string_id in other._replacements)
+        for index, extra in other._extra.items():
+            self._extra[base + index] = dict(extra)
+
+    # ---- Entity视图使用的字段访问 ----
+
+    def _get(self, index, key):
+        if key == 'start':
+            return self.starts[index]
+        if key == 'end':
+            return self.ends[index]
+        if key == 'type':
+            return self.types[self.type_codes[index]]
+        if key == 'original' or key == 'replacement':
+            column = self._originals if key == 'original' else self._replacements
+            string_id = column[index]
+            if string_id == _MISSING:
+                raise KeyError(key)
+            return self._strings[string_id]
+        extra = self._extra.get(index)
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        return extra[key]
+
+    def _set(self, index, key, value):
+        if key == 'start':
+            self.starts[index] = value
+        elif key == 'end':
+            self.ends[index] = value
+        elif key == 'type':
+            self.type_codes[index] = self._type_code(value)
+        elif key == 'original':
+            self._originals[index] = self._string_id(value)
+        elif key == 'replacement':
+            self._replacements[index] = self._string_id(value)
+        else:
+            self._extra.setdefault(index, {})[key] = value
+
+    def _keys(self, index):
+        keys = []
+        if self._originals[index] != _MISSING:
+            keys.append('original')
+        keys.append('type')
+        if self._replacements[index] != _MISSING:
+            keys.append('replacement')
+        keys.append('start')
+        keys.append('end')
+        extra = self._extra.get(index)
+        if extra:
+            keys.extend(extra)
+        return keys
+
+    # ---- 批量操作 ----
+
+    def select(self, indices):
+        """
+        按下标选出实体，返回新的EntityBatch
+
+        参数:
+            indices: 下标序列，可以是numpy数组
+        """
+        batch = EntityBatch()
+        batch.types = list(self.types)
+        batch._type_index = dict(self._type_index)
+        batch._strings = list(self._strings)
+        batch._string_index = dict(self._string_index)
+        for new_index, index in enumerate(indices):
+            batch.starts.append(self.starts[index])
+            batch.ends.append(self.ends[index])
+            batch.type_codes.append(self.type_codes[index])
+            batch._originals.append(self._originals[index])
+            batch._replacements.append(self._replacements[index])
+            extra = self._extra.get(index)
+            if extra:
+                batch._extra[new_index] = dict(extra)
+        return batch
+
+    def filter(self, types=None, start=None, end=None):
+        """
+        按类型和位置范围筛选实体
+
+        参数:
+            types: 保留的实体类型集合，为None时不按类型筛选
+            start: 只保留起始位置不小于start的实体
+            end: 只保留结束位置不大于end的实体
+
+        返回:
+            batch: 新的EntityBatch
+        """
+        codes = None if types is None else {self._type_index[t] for t in types if t in self._type_index}
+        starts, ends, type_codes = self.starts, self.ends, self.type_codes
+        return self.select([
+            i for i in range(len(starts))
+            if (codes is None or type_codes[i] in codes)
+            and (start is None or starts[i] >= start)
+            and (end is None or ends[i] <= end)
+        ])
+
+    def argsort(self):
+        """按 (起始位置, 结束位置) 排序的下标列表"""
+        starts, ends = self.starts, self.ends
+        return sorted(range(len(starts)), key=lambda i: (starts[i], ends[i]))
+
+    def sorted(self):
+        """返回按位置排序的新EntityBatch"""
+        return self.select(self.argsort())
+
+    def shift(self, offset):
+        """将所有实体的位置平移offset"""
+        if offset:
+            self.starts = array('q', (start + offset for start in self.starts))
+            self.ends = array('q', (end + offset for end in self.ends))
+
+    def to_dicts(self):
+        """转换为字典列表"""
+        return [entity.to_dict() for entity in self]
+
+    def to_numpy(self):
+        """
+        以numpy数组返回位置和类型编码列，与批次共享内存
+
+        返回:
+            columns: {'start': ..., 'end': ..., 'type_code': ...}，类型编码对应types中的下标
+        """
+        import numpy as np
+        return {
+            'start': np.frombuffer(self.starts, dtype=np.int64),
+            'end': np.frombuffer(self.ends, dtype=np.int64),
+            'type_code': np.frombuffer(self.type_codes, dtype=np.uint16)
+        }
@@ -1,11 +1,26 @@
 import os
-from docx import Document
+import logging
 from .utils import is_chinese
+from .spans import redact_spans
+from .metrics import NULL_METRICS
+from .entity import EntityBatch
+from .incremental import ParagraphStore, paragraph_store_path
+
+logger = logging.getLogger(__name__)
 
 class FileHandler:
-    """文件处理基类"""
+    """
+    文件处理基类
+
+    处理器只保存配置，每次处理的结果直接返回，同一个实例可以被多个线程同时使用。
+    """
     def __init__(self):
-        self.entities = []
+        # 各处理阶段的耗时和文档大小记录到metrics（见metrics.Metrics），由PrivacyRedactor设置
+        self.metrics = NULL_METRICS
+        # 生成确定性替代文本的pseudonym.Pseudonymizer，由PrivacyRedactor设置，为None时使用策略给出的替换文本
+        self.pseudonymizer = None
+        # 是否在输出文件旁保存段落识别结果，重新处理修订后的文档时只识别变化的段落，由PrivacyRedactor设置
+        self.incremental = False
         
     def redact(self, input_path, output_path, strategy, language=None):
         """
@@ -16,103 +31,278 @@ class FileHandler:
             output_path: 输出文件路径
             strategy: 使用的识别策略
             language: 指定语言，如果为None则自动检测
+            
+        返回:
+            entities: 识别出的实体（EntityBatch），实体按列存储，大文档中的大量实体不会占用过多内存
         """
         raise NotImplementedError
         
     def get_entities(self):
-        """获取最近一次处理中识别的实体"""
-        return self.entities
+        """
+        兼容旧式自定义处理器：redact返回None、结果保存在self.entities中的处理器由此取得实体
+
+        这类处理器不能在多个线程中共用，新的处理器应直接从redact返回实体。
+        """
+        return getattr(self, 'entities', [])
+        
+    def _paragraph_store(self, output_path, strategy, language):
+        """增量处理时返回输出文件对应的段落结果，策略没有配置指纹时无法判断保存的结果是否有效，返回None"""
+        if not self.incremental:
+            return None
+        fingerprint = getattr(strategy, 'fingerprint', None)
+        if fingerprint is None:
+            logger.info("策略 %s 没有fingerprint()，不使用增量处理", type(strategy).__name__)
+            return None
+        return ParagraphStore(paragraph_store_path(output_path), fingerprint(), language)
+        
+    def _save_paragraph_store(self, store):
+        """写出段落结果并记录复用和重新识别的段落数量"""
+        store.save()
+        self.metrics.count('paragraphs_reused', store.reused)
+        self.metrics.count('paragraphs_detected', store.detected)
+        logger.debug("增量处理: 复用 %d 个段落，识别 %d 个段落", store.reused, store.detected)
 
 
 class TextFileHandler(FileHandler):
     """处理纯文本文件"""
     
-    def redact(self, input_path, output_path, strategy, language=None):
-        """处理纯文本文件并替换隐私信息"""
+    # 流式处理时优先在这些字符之后切分，使锚点词和实体尽量落在同一块中
+    BOUNDARY_CHARS = ('\n', '。', '！', '？', '；')
+    
+    def __init__(self, chunk_size=1 << 20, overlap=4096, stream_threshold=16 << 20):
+        """
+        初始化纯文本文件处理器
+        
+        参数:
+            chunk_size: 流式处理时每次读取的字符数
+            overlap: 流式处理时块与块之间的重叠窗口字符数，应大于最长实体及其锚点的长度
+            stream_threshold: 文件大小（字节）超过该值时自动使用流式处理
+        """
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.stream_threshold = stream_threshold
+    
+    def redact(self, input_path, output_path, strategy, language=None, stream=None):
+        """
+        处理纯文本文件并替换隐私信息
+        
+        参数:
+            stream: 是否流式处理，为None时根据文件大小自动选择
+        """
+        if stream is None:
+            stream = os.path.getsize(input_path) > self.stream_threshold
+        metrics = self.metrics
+        if stream:
+            with metrics.timer('txt_stream'):
+                entities, chars = self._redact_stream(input_path, output_path, strategy, language)
+            metrics.document('txt', chars)
+            logger.info("成功处理文本文件: %s", output_path)
+            return entities
+        
         # 读取文本文件
-        with open(input_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        with metrics.timer('txt_read'):
+            with open(input_path, 'r', encoding='utf-8') as f:
+                text = f.read()
         
         # 自动检测语言
         if language is None:
             language = 'zh' if is_chinese(text) else 'en'
         
-        # 提取实体
-        self.entities = strategy.extract_entities(text, language)
-        
-        # 替换文本
-        redacted_text = text
-        for entity in self.entities:
-            redacted_text = redacted_text.replace(entity['original'], entity['replacement'])
+        # 提取实体并按位置替换文本
+        with metrics.timer('detect'):
+            entities = strategy.extract_entities(text, language)
+        with metrics.timer('replace'):
+            redacted_text, entities, _ = redact_spans(
+                text, entities, getattr(strategy, 'type_priority', None), self.pseudonymizer)
         
         # 写入处理后的文本
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(redacted_text)
+        with metrics.timer('txt_write'):
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(redacted_text)
+        
+        metrics.document('txt', len(text))
+        logger.info("成功处理文本文件: %s", output_path)
+        return EntityBatch(entities)
+        
+    def _redact_stream(self, input_path, output_path, strategy, language):
+        """
+        分块读取、识别并写出文本，内存占用与文件大小无关
+        
+        缓冲区由三部分组成：已写出的左侧上下文、本轮待写出的部分、作为右侧上下文的重叠窗口。
+        每轮只写出到切分点为止的文本，跨越切分点的实体会把切分点前移到实体起点，
+        留到下一轮连同上下文一起重新识别，因此跨块的实体只会被识别并替换一次。
+        实体的位置为其在整个文件中的字符位置。
         
-        print(f"✅ 成功处理文本文件: {output_path}")
+        返回:
+            entities: 识别出的实体
+            chars: 文件的字符数
+        """
+        metrics = self.metrics
+        priority = getattr(strategy, 'type_priority', None)
+        entities = EntityBatch()
+        buffer = ''
+        written = 0  # 缓冲区中已写出的左侧上下文长度
+        base = 0  # 缓冲区起点在文件中的字符位置
+        
+        with open(input_path, 'r', encoding='utf-8', newline='') as src, \
+                open(output_path, 'w', encoding='utf-8', newline='') as dst:
+            eof = False
+            while not eof:
+                chunk = src.read(self.chunk_size)
+                eof = not chunk
+                buffer += chunk
+                if not eof and len(buffer) - written <= self.overlap:
+                    continue
+                
+                # 自动检测语言
+                if language is None:
+                    language = 'zh' if is_chinese(buffer) else 'en'
+                    
+                with metrics.timer('detect'):
+                    found = strategy.extract_entities(buffer, language)
+                cut = self._find_cut(buffer, written, eof)
+                
+                # 跨越切分点的实体留到下一轮处理
+                pending = [e for e in found if e['start'] < cut < e['end'] and e['start'] >= written]
+                if pending:
+                    cut = min(e['start'] for e in pending)
+                    
+                # 只写出起点在左侧上下文之后、终点在切分点之前的实体
+                committed = [
+                    dict(e, start=e['start'] - written, end=e['end'] - written)
+                    for e in found if e['start'] >= written and e['end'] <= cut
+                ]
+                with metrics.timer('replace'):
+                    redacted_text, committed, _ = redact_spans(
+                        buffer[written:cut], committed, priority, self.pseudonymizer)
+                dst.write(redacted_text)
+                
+                offset = base + written
+                for entity in committed:
+                    entity['start'] += offset
+                    entity['end'] += offset
+                entities.extend(committed)
+                
+                # 保留切分点之前的一段文本作为下一轮的左侧上下文
+                keep_from = max(0, cut - self.overlap)
+                buffer = buffer[keep_from:]
+                base += keep_from
+                written = cut - keep_from
+        return entities, base + len(buffer)
+                
+    def _find_cut(self, buffer, written, eof):
+        """确定本轮写出的结束位置，尽量切在换行或句末标点之后"""
+        if eof:
+            return len(buffer)
+        target = len(buffer) - self.overlap
+        boundary = max(buffer.rfind(char, written, target) for char in self.BOUNDARY_CHARS)
+        if boundary >= written:
+            return boundary + 1
+        return target
+
+
+def extract_batch(strategy, texts, language):
+    """
+    对多个文本批量识别实体
+
+    策略提供extract_entities_batch时一次调用完成，否则逐个调用extract_entities。
+
+    返回:
+        results: 与texts一一对应的实体列表
+    """
+    batch = getattr(strategy, 'extract_entities_batch', None)
+    if batch is not None:
+        return batch(texts, language)
+    return [strategy.extract_entities(text, language) for text in texts]
 
 
 class DocxFileHandler(FileHandler):
     """处理Word文档文件"""
     
     def redact(self, input_path, output_path, strategy, language=None):
-        """处理Word文档文件并替换隐私信息"""
+        """
+        处理Word文档文件并替换隐私信息
+        
+        分三个阶段：收集所有包含文本的段落（合并单元格只访问一次），
+        一次批量识别全部段落，最后逐段落写回替换结果。
+        """
+        # python-docx较重，只在处理Word文档时导入
+        from docx import Document
+        
+        metrics = self.metrics
+        
         # 读取文档
-        doc = Document(input_path)
+        with metrics.timer('docx_load'):
+            doc = Document(input_path)
         
-        # 处理所有段落和表格
-        self.entities = []
+        # 1. 收集段落
+        paragraphs = [para for para in self._iter_paragraphs(doc) if para.text.strip()]
+        texts = [para.text for para in paragraphs]
         
-        # 处理段落
-        for para in doc.paragraphs:
-            self._process_paragraph(para, strategy, language)
-            
-        # 处理表格
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        self._process_paragraph(para, strategy, language)
+        # 自动检测语言，整篇文档只检测一次
+        if language is None:
+            language = 'zh' if is_chinese(''.join(texts)) else 'en'
+        
+        # 2. 批量识别，增量处理时只识别内容变化的段落
+        store = self._paragraph_store(output_path, strategy, language)
+        with metrics.timer('detect'):
+            if store is None:
+                results = extract_batch(strategy, texts, language)
+            else:
+                results = store.detect(texts, lambda pending: extract_batch(strategy, pending, language))
+        
+        # 3. 逐段落写回
+        entities = EntityBatch()
+        priority = getattr(strategy, 'type_priority', None)
+        with metrics.timer('replace'):
+            for para, text, paragraph_entities in zip(paragraphs, texts, results):
+                if not paragraph_entities:
+                    continue
+                replaced_text, paragraph_entities, _ = redact_spans(text, paragraph_entities, priority, self.pseudonymizer)
+                entities.extend(paragraph_entities)
+                
+                # 如果没有变化，不需要更新
+                if replaced_text != text:
+                    # 替换段落内容，保留格式
+                    self._replace_with_runs(para, replaced_text)
+        
+        metrics.document('docx', sum(len(text) for text in texts))
         
         # 保存处理后的文档
         try:
-            doc.save(output_path)
-            print(f"✅ 成功处理Word文档: {output_path}")
+            with metrics.timer('docx_save'):
+                doc.save(output_path)
+            if store is not None:
+                self._save_paragraph_store(store)
+            logger.info("成功处理Word文档: %s", output_path)
         except Exception as e:
-            print(f"❌ 保存Word文档失败: {e}")
+            # 输出没有写出时不能当作处理成功，否则批量处理的清单会把该文件记为已完成
+            logger.error("保存Word文档失败: %s", e)
+            raise
+        return entities
             
-    def _process_paragraph(self, para, strategy, language):
-        """处理单个段落"""
-        # 获取段落文本
-        text = para.text.strip()
-        if not text:
-            return
-            
-        # 自动检测语言
-        if language is None:
-            lang = 'zh' if is_chinese(text) else 'en'
-        else:
-            lang = language
-            
-        # 提取实体
-        paragraph_entities = strategy.extract_entities(text, lang)
-        if not paragraph_entities:
-            return
+    def _iter_paragraphs(self, doc):
+        """依次返回正文段落和表格（含嵌套表格）中的段落"""
+        yield from doc.paragraphs
+        seen_cells = set()
+        for table in doc.tables:
+            yield from self._iter_table_paragraphs(table, seen_cells)
             
-        # 添加到总实体列表
-        self.entities.extend(paragraph_entities)
+    def _iter_table_paragraphs(self, table, seen_cells):
+        """
+        返回表格中的段落
         
-        # 替换文本
-        replaced_text = text
-        for entity in paragraph_entities:
-            replaced_text = replaced_text.replace(entity['original'], entity['replacement'])
-            
-        # 如果没有变化，不需要更新
-        if replaced_text == text:
-            return
-            
-        # 替换段落内容，保留格式
-        self._replace_with_runs(para, replaced_text)
+        合并单元格在row.cells中会按其跨越的网格列重复出现，按底层<w:tc>元素去重。
+        """
+        for row in table.rows:
+            for cell in row.cells:
+                if cell._tc in seen_cells:
+                    continue
+                seen_cells.add(cell._tc)
+                yield from cell.paragraphs
+                for nested in cell.tables:
+                    yield from self._iter_table_paragraphs(nested, seen_cells)
         
     def _replace_with_runs(self, para, new_text):
         """替换段落内容，尽量保留原始格式"""
@@ -142,4 +332,67 @@ class DocxFileHandler(FileHandler):
             
         # 如果新文本更长，将剩余部分添加到最后一个run
         if offset < len(new_text):
-            para.runs[-1].text += new_text[offset:] 
\ No newline at end of file
+            para.runs[-1].text += new_text[offset:]
+
+
+class StreamingDocxFileHandler(FileHandler):
+    """
+    流式处理Word文档，不构建python-docx对象模型
+    
+    正文、页眉、页脚、脚注和尾注部件逐块解析，只改写含有实体的<w:t>文字，
+    图片等其余zip成员按原压缩数据复制，适合包含大量图片或超大表格的文档。
+    """
+    
+    def __init__(self, batch_chars=65536):
+        """
+        初始化流式Word文档处理器
+        
+        参数:
+            batch_chars: 累积多少字的段落后进行一次批量识别
+        """
+        super().__init__()
+        self.batch_chars = batch_chars
+    
+    def redact(self, input_path, output_path, strategy, language=None):
+        """
+        处理Word文档文件并替换隐私信息
+        
+        语言未指定时根据第一批段落检测，实体的位置为其在所在段落中的字符位置。
+        """
+        from .ooxml import redact_docx_stream
+        
+        entities = EntityBatch()
+        priority = getattr(strategy, 'type_priority', None)
+        metrics = self.metrics
+        chars = 0
+        store = None
+        
+        def detect(texts):
+            nonlocal language, chars, store
+            if language is None:
+                language = 'zh' if is_chinese(''.join(texts)) else 'en'
+            # 语言确定后才能创建段落结果，False表示不使用增量处理
+            if store is None:
+                store = self._paragraph_store(output_path, strategy, language) or False
+            chars += sum(len(text) for text in texts)
+            with metrics.timer('detect'):
+                if store:
+                    batch = store.detect(texts, lambda pending: extract_batch(strategy, pending, language))
+                else:
+                    batch = extract_batch(strategy, texts, language)
+            results = []
+            with metrics.timer('replace'):
+                for text, paragraph_entities in zip(texts, batch):
+                    if paragraph_entities:
+                        _, paragraph_entities, _ = redact_spans(text, paragraph_entities, priority, self.pseudonymizer)
+                        entities.extend(paragraph_entities)
+                    results.append(paragraph_entities)
+            return results
+        
+        with metrics.timer('docx_stream'):
+            redact_docx_stream(input_path, output_path, detect, self.batch_chars)
+        if store:
+            self._save_paragraph_store(store)
+        metrics.document('docx', chars)
+        logger.info("成功处理Word文档: %s", output_path)
+        return entities
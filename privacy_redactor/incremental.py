@@ -0,0 +1,105 @@
+import json
+import os
+
+from .cache import segment_key
+
+# 段落结果文件的格式版本，结构发生不兼容变化时递增，旧文件随之失效
+PARAGRAPH_STORE_VERSION = 1
+
+
+def paragraph_store_path(output_path):
+    """
+    返回输出文件对应的段落结果文件路径，与utils.save_entities的实体文件放在同一目录
+
+    参数:
+        output_path: 脱敏后的输出文件路径
+    """
+    name, _ = os.path.splitext(os.path.basename(output_path))
+    return os.path.join(os.path.dirname(output_path), f"{name}_paragraphs.json")
+
+
+class ParagraphStore:
+    """
+    按段落内容保存识别结果，供文档修订后增量处理
+
+    每个段落以其文本、策略配置指纹和语言的哈希为键保存策略返回的原始识别结果（段落内的位置）。
+    重新处理修订后的文档时，内容未变的段落（包括只是移动了位置的段落）直接使用保存的结果，
+    只有修改过的和新增的段落交给策略识别；替换、伪名化仍对每个段落重新执行。
+    策略对每个段落的识别结果只取决于段落本身时，输出与完整处理完全一致。
+    保存时只写出本次文档中的段落，已删除段落的结果随之清除。
+    """
+
+    def __init__(self, path, fingerprint, language):
+        """
+        参数:
+            path: 段落结果文件路径，不存在或与当前策略配置不符时从空开始
+            fingerprint: 策略配置指纹（见MedicalStrategy.fingerprint）
+            language: 文档语言
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.language = language
+        self._previous = self._load()
+        self._current = {}
+        self.reused = 0
+        self.detected = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # 损坏的结果文件按不存在处理，本次完整识别后重新写出
+            return {}
+        if data.get('version') != PARAGRAPH_STORE_VERSION or data.get('fingerprint') != self.fingerprint:
+            return {}
+        return data.get('paragraphs', {})
+
+    def _key(self, text):
+        return segment_key(text, f'{self.fingerprint}\x00{self.language}')
+
+    def detect(self, texts, extract):
+        """
+        识别一批段落，已保存的段落直接使用保存的结果
+
+        参数:
+            texts: 段落文本列表
+            extract: 接收段落文本列表、返回对应实体列表的函数，只对需要识别的段落调用一次
+
+        返回:
+            results: 与texts对应的实体列表
+        """
+        keys = [self._key(text) for text in texts]
+        # 需要识别的段落，文档中重复出现的段落（如页眉、签名行）只识别一次
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in self._current or key in missing:
+                continue
+            stored = self._previous.get(key)
+            if stored is None:
+                missing[key] = i
+            else:
+                self._current[key] = stored
+        if missing:
+            for key, entities in zip(missing, extract([texts[i] for i in missing.values()])):
+                self._current[key] = [dict(entity) for entity in entities]
+        self.detected += len(missing)
+        self.reused += len(texts) - len(missing)
+        return [[dict(entity) for entity in self._current[key]] for key in keys]
+
+    def save(self):
+        """写出本次文档中全部段落的识别结果，先写临时文件再替换，中断时不会留下不完整的文件"""
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        data = {
+            'version': PARAGRAPH_STORE_VERSION,
+            'fingerprint': self.fingerprint,
+            'paragraphs': self._current
+        }
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,468 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from .matcher import DictionaryMatcher, leftmost_longest, matches_to_entities
+
+logger = logging.getLogger(__name__)
+
+# 让模型识别的实体类型及说明
+LLM_ENTITY_TYPES = {
+    'NAME': '患者、家属或其他人员的姓名',
+    'DOCTOR_NAME': '医生、护士等医务人员的姓名',
+    'LOCATION': '住址、工作单位地址等具体地址',
+    'ORGANIZATION': '医院、工作单位等机构名称',
+    'PHONE': '电话号码',
+    'ID_CARD': '身份证号码',
+    'PATIENT_ID': '病历号、住院号、门诊号等患者标识',
+    'MEDICAL_INSURANCE_NO': '医保号',
+    'DATE': '出生日期、就诊日期等日期',
+}
+
+# 提示词由所有请求共享的前缀和待识别文本组成，前缀放在最前面且逐字节相同，
+# Ollama可以复用前缀部分已计算的KV缓存
+PROMPT_PREFIX_TEMPLATE = """你是医疗文本隐私信息识别助手。请找出下面文本中的隐私信息，只识别以下类型：
+{types}
+
+只输出JSON，格式为 {{"entities": [{{"text": "原文中的片段", "type": "类型"}}]}}，
+text必须与原文完全一致，没有隐私信息时输出 {{"entities": []}}。
+
+文本：
+"""
+
+
+class LLMError(RuntimeError):
+    """大语言模型服务返回错误"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _Response:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class OllamaClient:
+    """
+    异步的Ollama /api/generate 客户端
+
+    在一个后台事件循环线程中维护HTTP/1.1长连接池，多个请求复用连接并发发送，
+    同时在途的请求数量不超过max_concurrency。每个请求有独立的超时，
+    连接错误、超时、429和5xx响应按指数退避重试。
+    同步代码通过generate_many一次提交一批提示词，协程中可以直接await agenerate_many，
+    同一个客户端只应在一个事件循环中使用。
+    """
+
+    def __init__(self, url="http://127.0.0.1:11434", model_name="qwen2:7b", max_concurrency=4,
+                 timeout=60.0, retries=2, backoff=0.5, options=None, cache_size=1024):
+        """
+        初始化Ollama客户端
+
+        参数:
+            url: Ollama服务地址
+            model_name: 模型名称
+            max_concurrency: 同时在途的最大请求数，也是连接池的最大连接数
+            timeout: 单个请求的超时时间（秒）
+            retries: 失败后的最大重试次数
+            backoff: 第一次重试前等待的秒数，之后每次翻倍
+            options: 传给模型的生成参数，如 {'temperature': 0}
+            cache_size: 缓存的回复数量，只缓存结果确定的请求（temperature为0或指定了seed）
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"不支持的大语言模型API地址: {url}")
+        self.url = url
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.options = dict(options) if options is not None else {'temperature': 0}
+        self.cache_size = cache_size
+
+        self._host = parts.hostname
+        self._ssl = parts.scheme == 'https'
+        self._port = parts.port or (443 if self._ssl else 80)
+        self._base_path = parts.path.rstrip('/')
+        self._reset()
+
+    def _reset(self):
+        self._loop = None
+        self._thread = None
+        self._pid = os.getpid()
+        self._idle = []
+        self._semaphore = None
+        self._thread_lock = threading.Lock()
+        self._responses = OrderedDict()
+
+    def __getstate__(self):
+        # 事件循环和连接不能跨进程传递，只传递配置
+        state = self.__dict__.copy()
+        for name in ('_loop', '_thread', '_idle', '_semaphore', '_thread_lock', '_responses'):
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    # ---- 连接池 ----
+
+    async def _open(self):
+        return await asyncio.open_connection(self._host, self._port, ssl=self._ssl or None)
+
+    async def _acquire(self):
+        """取出一个空闲连接，没有时新建连接；返回 (reader, writer, 是否复用)"""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await self._open()
+        return reader, writer, False
+
+    def _release(self, reader, writer, keep_alive):
+        if keep_alive and len(self._idle) < self.max_concurrency:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _close_idle(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    # ---- HTTP ----
+
+    async def _post(self, path, payload):
+        """发送一个POST请求，空闲连接已被服务端关闭时换新连接重发一次"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        request = (
+            f'POST {self._base_path}{path} HTTP/1.1\r\n'
+            f'Host: {self._host}:{self._port}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: keep-alive\r\n'
+            '\r\n'
+        ).encode('latin-1') + body
+
+        while True:
+            reader, writer, reused = await self._acquire()
+            try:
+                writer.write(request)
+                await writer.drain()
+                response = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # 超时取消时连接上可能还有未读完的响应，不能再复用
+                writer.close()
+                raise
+            keep_alive = response.headers.get('connection', '').lower() != 'close'
+            self._release(reader, writer, keep_alive)
+            return response
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readuntil(b'\r\n')
+        try:
+            status = int(status_line.split(None, 2)[1])
+        except (IndexError, ValueError):
+            raise LLMError(f"无法解析的HTTP响应: {status_line!r}") from None
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+                if size == 0:
+                    # 跳过可能存在的trailer
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return _Response(status, headers, body)
+
+    # ---- 生成 ----
+
+    def _payload(self, prompt, extra):
+        payload = {
+            'model': self.model_name,
+            'prompt': prompt,
+            'stream': False
+        }
+        payload.update(extra)
+        # 单个请求的生成参数与客户端的默认参数合并
+        payload['options'] = dict(self.options, **extra.get('options', {}))
+        return payload
+
+    def _cache_key(self, payload):
+        """结果确定的请求返回缓存键，否则返回None"""
+        options = payload['options']
+        if self.cache_size <= 0 or (options.get('temperature', 0.8) != 0 and 'seed' not in options):
+            return None
+        return json.dumps(payload, ensure_ascii=False, sort_keys=True)
+
+    async def agenerate(self, prompt, **extra):
+        """
+        调用 /api/generate 生成一个回复
+
+        参数:
+            prompt: 提示词
+            **extra: 额外的请求字段，如 format='json'、context=[...]
+
+        返回:
+            result: Ollama返回的JSON对象，生成的文本在result['response']中
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        payload = self._payload(prompt, extra)
+        key = self._cache_key(payload)
+        if key is not None and key in self._responses:
+            self._responses.move_to_end(key)
+            return dict(self._responses[key])
+        result = await self._generate(payload)
+        if key is not None:
+            self._responses[key] = result
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+            result = dict(result)
+        return result
+
+    async def _generate(self, payload):
+        """发送请求，按需重试"""
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await asyncio.wait_for(self._post('/api/generate', payload), self.timeout)
+                    if response.status == 200:
+                        return json.loads(response.body)
+                    error = LLMError(
+                        f"大语言模型服务返回 {response.status}: {response.body[:200].decode('utf-8', 'replace')}",
+                        response.status)
+                    # 只有限流和服务端错误值得重试
+                    if response.status != 429 and response.status < 500:
+                        raise error
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    error = e
+                if attempt < self.retries:
+                    delay = self.backoff * (2 ** attempt)
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+            raise error
+
+    async def agenerate_many(self, prompts, **extra):
+        """
+        并发生成多个回复
+
+        返回:
+            results: 与prompts一一对应的结果，失败的请求对应的是异常对象
+        """
+        return await self.agenerate_batch([(prompt, extra) for prompt in prompts])
+
+    async def agenerate_batch(self, requests):
+        """
+        并发发送多个各自带有额外字段的请求
+
+        参数:
+            requests: [(提示词, 额外的请求字段), ...]
+
+        返回:
+            results: 与requests一一对应的结果，失败的请求对应的是异常对象
+        """
+        return await asyncio.gather(*(self.agenerate(prompt, **extra) for prompt, extra in requests),
+                                    return_exceptions=True)
+
+    def _ensure_loop(self):
+        """启动后台事件循环线程，fork出的子进程中重新启动"""
+        if self._pid != os.getpid():
+            self._reset()
+        with self._thread_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='ollama-client', daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+        return self._loop
+
+    def generate_many(self, prompts, **extra):
+        """
+        在后台事件循环中并发生成多个回复，阻塞直到全部完成，连接在多次调用之间复用
+
+        返回:
+            results: 与prompts一一对应的结果，失败的请求对应的是异常对象
+        """
+        return self.generate_batch([(prompt, extra) for prompt in prompts])
+
+    def generate_batch(self, requests):
+        """
+        在后台事件循环中并发发送多个各自带有额外字段的请求，阻塞直到全部完成
+
+        参数:
+            requests: [(提示词, 额外的请求字段), ...]
+
+        返回:
+            results: 与requests一一对应的结果，失败的请求对应的是异常对象
+        """
+        requests = list(requests)
+        if not requests:
+            return []
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.agenerate_batch(requests), loop).result()
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        if self._loop is None or self._pid != os.getpid():
+            return
+        loop = self._loop
+        asyncio.run_coroutine_threadsafe(self._close_idle(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+        self._reset()
+
+
+@lru_cache(maxsize=8)
+def _prompt_prefix(entity_types):
+    types = '\n'.join(f'- {name}: {description}' for name, description in entity_types)
+    return PROMPT_PREFIX_TEMPLATE.format(types=types)
+
+
+def build_prompt(text, entity_types=None):
+    """生成识别隐私实体的提示词，共享的前缀只生成一次"""
+    entity_types = entity_types or LLM_ENTITY_TYPES
+    return _prompt_prefix(tuple(entity_types.items())) + text
+
+
+def parse_entities(text, response, entity_types=None):
+    """
+    解析模型返回的实体并定位到原文
+
+    模型只返回实体原文，原文在文本中的每次出现都作为一个实体；
+    不在文本中出现的片段（模型改写或编造的内容）被丢弃。
+
+    参数:
+        text: 原始文本
+        response: 模型生成的JSON字符串
+        entity_types: 允许的实体类型，默认为LLM_ENTITY_TYPES
+
+    返回:
+        entities: 实体信息列表
+    """
+    entity_types = entity_types or LLM_ENTITY_TYPES
+    try:
+        data = json.loads(response)
+    except (TypeError, ValueError):
+        return []
+    items = data.get('entities') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return []
+
+    matcher = DictionaryMatcher()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        original = item.get('text')
+        entity_type = str(item.get('type', '')).upper()
+        if isinstance(original, str) and original.strip() and entity_type in entity_types:
+            matcher.add_word(original.strip(), entity_type)
+    if not len(matcher):
+        return []
+    return matches_to_entities(text, leftmost_longest(matcher.iter_matches(text)))
+
+
+def vote_entities(client, texts, samples=3, min_confidence=0.5, temperature=0.7, entity_types=None):
+    """
+    多次采样投票识别实体
+
+    每个文本采样多次，同一位置、同一类型的实体得票超过 samples * min_confidence 时保留。
+    第一轮并发采样达到阈值所需的最少次数，之后每轮只为仍有未决实体的文本再采样一次：
+    剩余采样无论结果如何都不能改变任何实体的去留时立即停止，结果与采满samples次相同。
+    失败的采样不计票。
+
+    参数:
+        client: OllamaClient实例
+        texts: 文本列表
+        samples: 每个文本最多采样的次数
+        min_confidence: 保留实体所需的得票比例，实际要求得票数严格大于 samples * min_confidence
+        temperature: 采样温度，每次采样使用不同的seed
+        entity_types: 允许的实体类型，默认为LLM_ENTITY_TYPES
+
+    返回:
+        results: 与texts一一对应的实体列表，每个实体的confidence为得票数与有效采样次数之比
+    """
+    required = int(samples * min_confidence) + 1
+    if not 0 < required <= samples:
+        raise ValueError(f"min_confidence必须在0到1之间: {min_confidence}")
+    prompts = [build_prompt(text, entity_types) for text in texts]
+    votes = [{} for _ in texts]  # (起始, 结束, 类型) -> [票数, 实体]
+    drawn = [0] * len(texts)  # 已发出的采样次数
+    valid = [0] * len(texts)  # 成功的采样次数
+
+    def undecided(i):
+        remaining = samples - drawn[i]
+        if remaining == 0:
+            return False
+        # 尚未出现的实体也可能在剩余采样中得票
+        if remaining >= required:
+            return True
+        return any(required - remaining <= count < required for count, _ in votes[i].values())
+
+    active = [i for i, text in enumerate(texts) if text.strip()]
+    round_size = required
+    while active:
+        requests = [(i, drawn[i] + k) for i in active for k in range(min(round_size, samples - drawn[i]))]
+        responses = client.generate_batch([
+            (prompts[i], {'format': 'json', 'options': {'temperature': temperature, 'seed': seed}})
+            for i, seed in requests
+        ])
+        for (i, _), response in zip(requests, responses):
+            drawn[i] += 1
+            if isinstance(response, Exception):
+                continue
+            valid[i] += 1
+            for entity in parse_entities(texts[i], response.get('response'), entity_types):
+                key = (entity['start'], entity['end'], entity['type'])
+                vote = votes[i].setdefault(key, [0, entity])
+                vote[0] += 1
+        active = [i for i in active if undecided(i)]
+        round_size = 1
+
+    results = []
+    for i in range(len(texts)):
+        if drawn[i] and not valid[i]:
+            logger.warning("大语言模型调用失败，仅使用规则识别结果: 第%d个文本的%d次采样全部失败", i + 1, drawn[i])
+        kept = []
+        for count, entity in votes[i].values():
+            if count >= required:
+                entity['confidence'] = count / valid[i]
+                kept.append(entity)
+        results.append(sorted(kept, key=lambda e: (e['start'], e['end'])))
+    return results
@@ -0,0 +1,233 @@
+import re
+import hashlib
+import threading
+from collections import deque
+
+from .utils import ENTITY_REPLACEMENTS
+
+# 自动机只在添加词条后的第一次匹配时构建，构建很少发生，所有实例共用一个锁，实例仍可被pickle序列化
+_build_lock = threading.Lock()
+
+
+def leftmost_longest(matches):
+    """
+    从可能重叠的匹配中选出互不重叠的匹配，重叠时保留最左最长的匹配
+
+    参数:
+        matches: 可迭代的 (起始位置, 结束位置, 实体类型)
+
+    返回:
+        result: 按起始位置排序的匹配列表
+    """
+    result = []
+    last_end = 0
+    for start, end, entity_type in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+        if start >= last_end:
+            result.append((start, end, entity_type))
+            last_end = end
+    return result
+
+
+def matches_to_entities(text, matches, replacements=None):
+    """
+    将匹配结果转换为实体信息列表
+
+    参数:
+        text: 原始文本
+        matches: 可迭代的 (起始位置, 结束位置, 实体类型)
+        replacements: 实体类型到替换文本的映射，默认使用utils.ENTITY_REPLACEMENTS
+
+    返回:
+        entities: 实体信息列表
+    """
+    replacements = replacements or ENTITY_REPLACEMENTS
+    return [
+        {
+            'original': text[start:end],
+            'type': entity_type,
+            'replacement': replacements.get(entity_type, f'[{entity_type}]'),
+            'start': start,
+            'end': end
+        }
+        for start, end, entity_type in matches
+    ]
+
+
+class DictionaryMatcher:
+    """
+    基于Aho-Corasick自动机的多模式词典匹配器
+
+    一次线性扫描即可找出文本中所有词条的全部出现位置，扫描代价与词条数量无关。
+    词条可以来自分词结果中识别出的表层形式，也可以来自用户提供的词典
+    （患者名册、医院名称、科室名称等），也可以单独作为词典识别器使用。
+    添加完词条后可以在多个线程中同时匹配，添加词条不能与匹配同时进行。
+    """
+
+    def __init__(self, words=None, entity_type=None):
+        """
+        初始化词典匹配器
+
+        参数:
+            words: 初始词条，可以是词条列表，也可以是词条到实体类型的映射
+            entity_type: words为列表时使用的实体类型
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        self._size = 0
+        self._built = True
+        self._first_chars = None
+        self._fingerprint = ''
+        if words is not None:
+            self.add_words(words, entity_type)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        node = 0
+        for char in word:
+            node = self._goto[node].get(char)
+            if node is None:
+                return False
+        return self._output[node] is not None
+
+    def add_word(self, word, entity_type=None):
+        """
+        添加一个词条，已存在的词条保留先添加的实体类型
+
+        参数:
+            word: 词条
+            entity_type: 实体类型
+        """
+        if not word:
+            return
+        goto = self._goto
+        node = 0
+        for char in word:
+            next_node = goto[node].get(char)
+            if next_node is None:
+                next_node = len(goto)
+                goto[node][char] = next_node
+                goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            node = next_node
+        if self._output[node] is None:
+            self._output[node] = (len(word), entity_type)
+            self._size += 1
+            # 链式摘要：每个新词条都与之前的摘要一起计算，实例可以被pickle序列化
+            entry = f'{self._fingerprint}\t{word}\t{entity_type}'.encode('utf-8', 'surrogatepass')
+            self._fingerprint = hashlib.sha256(entry).hexdigest()
+        self._built = False
+
+    def fingerprint(self):
+        """词条及其类型的摘要，添加新词条后随之改变"""
+        return self._fingerprint
+
+    def add_words(self, words, entity_type=None):
+        """
+        批量添加词条
+
+        参数:
+            words: 词条列表，或词条到实体类型的映射
+            entity_type: words为列表时使用的实体类型
+        """
+        if isinstance(words, dict):
+            for word, word_type in words.items():
+                self.add_word(word, word_type)
+        else:
+            for word in words:
+                self.add_word(word, entity_type)
+
+    def _build(self):
+        """按广度优先顺序计算失败指针和输出链接，多个线程同时匹配时只构建一次"""
+        with _build_lock:
+            if self._built:
+                return
+            goto, output = self._goto, self._output
+            # 在新的列表中计算，构建完成后一起替换，其他线程不会读到构建了一半的失败指针
+            fail = [0] * len(goto)
+            # 输出链接：沿失败指针最近的一个词条结尾节点
+            dict_link = [0] * len(goto)
+            queue = deque(goto[0].values())
+            while queue:
+                node = queue.popleft()
+                for char, child in goto[node].items():
+                    state = fail[node]
+                    while state and char not in goto[state]:
+                        state = fail[state]
+                    target = goto[state].get(char, 0)
+                    fail[child] = target if target != child else 0
+                    dict_link[child] = target if output[target] is not None else dict_link[target]
+                    queue.append(child)
+
+            # 根节点状态下只有词条首字符可能开始匹配，用字符集正则直接跳过其余字符
+            if goto[0]:
+                self._first_chars = re.compile('[' + ''.join(re.escape(c) for c in goto[0]) + ']')
+            else:
+                self._first_chars = None
+            self._fail = fail
+            self._dict_link = dict_link
+            self._built = True
+
+    def iter_matches(self, text):
+        """
+        扫描文本，返回所有词条的全部出现位置（可能相互重叠）
+
+        参数:
+            text: 要扫描的文本
+
+        返回:
+            生成器，每项为 (起始位置, 结束位置, 实体类型)
+        """
+        if not self._built:
+            self._build()
+        if self._first_chars is None:
+            return
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        search = self._first_chars.search
+        node = 0
+        i = 0
+        n = len(text)
+        while i < n:
+            if node == 0:
+                match = search(text, i)
+                if match is None:
+                    return
+                i = match.start()
+            char = text[i]
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            i += 1
+            hit = node if output[node] is not None else dict_link[node]
+            while hit:
+                length, entity_type = output[hit]
+                yield i - length, i, entity_type
+                hit = dict_link[hit]
+
+    def find_all(self, text):
+        """
+        查找文本中所有词条，重叠时保留最左最长的匹配
+
+        参数:
+            text: 要扫描的文本
+
+        返回:
+            matches: [(起始位置, 结束位置, 实体类型), ...]，按起始位置排序
+        """
+        return leftmost_longest(self.iter_matches(text))
+
+    def extract(self, text, replacements=None):
+        """
+        从文本中提取词典实体
+
+        参数:
+            text: 要处理的文本
+            replacements: 实体类型到替换文本的映射，默认使用utils.ENTITY_REPLACEMENTS
+
+        返回:
+            entities: 识别出的实体信息列表
+        """
+        return matches_to_entities(text, self.find_all(text), replacements)
@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+
+class _NullTimer:
+    """未启用指标时使用的计时器，不做任何事情"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'labels', 'start')
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    指标记录入口
+
+    记录各阶段耗时、按类型统计的实体数量、文档大小，以及缓存和大语言模型的统计信息，
+    并分发给所有输出端（见MetricsCollector、LoggingSink）。没有输出端时所有方法立即返回，
+    计时器是一个什么都不做的共享对象，几乎没有开销。
+    """
+
+    def __init__(self, sinks=None):
+        """
+        参数:
+            sinks: 输出端列表，每个输出端实现observe、count、gauge三个方法
+        """
+        self.sinks = list(sinks or [])
+
+    def __reduce__(self):
+        # 其他进程中记录的指标无法汇总回当前进程，传给工作进程的副本不记录指标
+        return (Metrics, ())
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        """添加一个输出端"""
+        self.sinks.append(sink)
+
+    def timer(self, stage, **labels):
+        """
+        返回记录一个阶段耗时的上下文管理器
+
+        参数:
+            stage: 阶段名称，如 'regex'、'jieba'、'llm'、'docx_load'
+            **labels: 附加的标签
+        """
+        if not self.sinks:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def observe(self, stage, seconds, **labels):
+        """记录一个阶段的耗时（秒）"""
+        for sink in self.sinks:
+            sink.observe(stage, seconds, labels)
+
+    def count(self, name, value=1, **labels):
+        """累加一个计数器"""
+        for sink in self.sinks:
+            sink.count(name, value, labels)
+
+    def gauge(self, name, value, **labels):
+        """设置一个瞬时值"""
+        for sink in self.sinks:
+            sink.gauge(name, value, labels)
+
+    def entities(self, entities):
+        """按类型统计实体数量"""
+        if not self.sinks:
+            return
+        counts = {}
+        for entity in entities:
+            counts[entity['type']] = counts.get(entity['type'], 0) + 1
+        for entity_type, value in counts.items():
+            self.count('entities', value, type=entity_type)
+
+    def document(self, kind, chars):
+        """记录处理的一个文档及其字符数"""
+        if not self.sinks:
+            return
+        self.count('documents', 1, kind=kind)
+        self.count('document_chars', chars, kind=kind)
+
+    def report(self, prefix, stats):
+        """将统计字典（如EntityCache.stats()）中的数值记录为瞬时值"""
+        if not self.sinks:
+            return
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.gauge(f'{prefix}_{key}', value)
+
+
+# 默认不记录任何指标
+NULL_METRICS = Metrics()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsCollector:
+    """在进程内汇总指标的输出端，可以导出为字典或Prometheus文本格式"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空已汇总的指标"""
+        with self._lock:
+            # (阶段, 标签) -> [次数, 总耗时, 最大耗时]
+            self._timers = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def observe(self, stage, seconds, labels):
+        key = (stage, _label_key(labels))
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    def count(self, name, value, labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    @staticmethod
+    def _format_key(name, labels):
+        if not labels:
+            return name
+        return name + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+
+    def snapshot(self):
+        """
+        返回当前汇总的指标
+
+        返回:
+            snapshot: {'timers': {...}, 'counters': {...}, 'gauges': {...}}，
+                键为 '名称{标签=值,...}' 形式的字符串
+        """
+        with self._lock:
+            timers = {
+                self._format_key(stage, labels): {
+                    'count': count,
+                    'total_s': total,
+                    'mean_s': total / count,
+                    'max_s': maximum
+                }
+                for (stage, labels), (count, total, maximum) in self._timers.items()
+            }
+            counters = {self._format_key(*key): value for key, value in self._counters.items()}
+            gauges = {self._format_key(*key): value for key, value in self._gauges.items()}
+        return {'timers': timers, 'counters': counters, 'gauges': gauges}
+
+    def to_prometheus(self, namespace='cn_hpp'):
+        """
+        按Prometheus文本格式导出
+
+        阶段耗时导出为 <namespace>_stage_seconds 的 _sum/_count 和 <namespace>_stage_seconds_max，
+        计数器导出为 <namespace>_<名称>_total，瞬时值导出为 <namespace>_<名称>。
+        """
+        with self._lock:
+            timers = dict(self._timers)
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = []
+        if timers:
+            metric = f'{namespace}_stage_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for (stage, labels), (count, total, _) in sorted(timers.items()):
+                label_text = _prometheus_labels((('stage', stage),) + labels)
+                lines.append(f'{metric}_sum{label_text} {total!r}')
+                lines.append(f'{metric}_count{label_text} {count}')
+            lines.append(f'# TYPE {metric}_max gauge')
+            for (stage, labels), (_, _, maximum) in sorted(timers.items()):
+                lines.append(f'{metric}_max{_prometheus_labels((("stage", stage),) + labels)} {maximum!r}')
+        for kind, items, suffix in (('counter', counters, '_total'), ('gauge', gauges, '')):
+            by_name = {}
+            for (name, labels), value in sorted(items.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, values in by_name.items():
+                metric = f'{namespace}_{_prometheus_name(name)}{suffix}'
+                lines.append(f'# TYPE {metric} {kind}')
+                for labels, value in values:
+                    lines.append(f'{metric}{_prometheus_labels(labels)} {value!r}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def write_prometheus(self, path, namespace='cn_hpp'):
+        """
+        将Prometheus文本格式写入文件，供node_exporter的textfile收集器读取
+
+        先写入临时文件再重命名，收集器不会读到写了一半的文件。
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(namespace))
+        os.replace(tmp_path, path)
+
+
+_PROMETHEUS_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _prometheus_name(name):
+    return _PROMETHEUS_INVALID.sub('_', name)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{_prometheus_name(k)}="{_escape_label_value(v)}"' for k, v in labels
+    ) + '}'
+
+
+class LoggingSink:
+    """将每条指标作为一行JSON写入日志的输出端"""
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """
+        参数:
+            logger: 使用的logger，默认为 'privacy_redactor.metrics'
+            level: 日志级别
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def _emit(self, record):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(record, ensure_ascii=False))
+
+    def observe(self, stage, seconds, labels):
+        self._emit({'metric': 'stage_seconds', 'stage': stage, 'value': seconds, **labels})
+
+    def count(self, name, value, labels):
+        self._emit({'metric': name, 'kind': 'counter', 'value': value, **labels})
+
+    def gauge(self, name, value, labels):
+        self._emit({'metric': name, 'kind': 'gauge', 'value': value, **labels})
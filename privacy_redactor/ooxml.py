@@ -0,0 +1,322 @@
+import re
+import struct
+import zipfile
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+# WordprocessingML的两个命名空间（过渡版与严格版）
+_W_NAMESPACES = (
+    'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'http://purl.oclc.org/ooxml/wordprocessingml/main',
+)
+_P = frozenset(f'{ns} p' for ns in _W_NAMESPACES)
+_T = frozenset(f'{ns} t' for ns in _W_NAMESPACES)
+# 段落中不含文字但会分隔文字的元素，识别时用对应字符占位
+_GAPS = {f'{ns} {name}': char for ns in _W_NAMESPACES
+         for name, char in (('tab', '\t'), ('br', '\n'), ('cr', '\n'))}
+_XML_SPACE = 'http://www.w3.org/XML/1998/namespace space'
+
+# 需要处理的文档部件：正文、页眉、页脚、脚注、尾注
+TEXT_PARTS = re.compile(r'^word/(?:document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+
+_ENCODING_DECL = re.compile(rb'^\s*<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+_COPY_BUFFER = 1 << 20
+
+
+class _Segment:
+    """段落中的一个<w:t>元素"""
+    __slots__ = ('tag_start', 'text_start', 'text_end', 'offset', 'text', 'preserve')
+
+    def __init__(self, tag_start, text_start, text_end, offset, text, preserve):
+        self.tag_start = tag_start
+        self.text_start = text_start
+        self.text_end = text_end
+        self.offset = offset  # 在段落文本中的起始位置
+        self.text = text
+        self.preserve = preserve
+
+
+class _Paragraph:
+    """一个<w:p>元素收集到的文字"""
+    __slots__ = ('start', 'pieces', 'segments', 'length')
+
+    def __init__(self, start):
+        self.start = start
+        self.pieces = []
+        self.segments = []
+        self.length = 0
+
+    def add(self, text, segment=None):
+        self.pieces.append(text)
+        if segment is not None:
+            self.segments.append(segment)
+        self.length += len(text)
+
+    @property
+    def text(self):
+        return ''.join(self.pieces)
+
+
+class PartRewriter:
+    """
+    流式改写一个WordprocessingML部件
+
+    用expat增量解析XML，只记录每个<w:t>文字在输入中的字节范围；
+    段落累积到一定字数后批量识别，只把含有实体的<w:t>文字替换掉，
+    其余字节原样写出。嵌套段落（如文本框）各自作为独立段落处理。
+    内存占用取决于批量大小和最长段落，与部件大小无关。
+    """
+
+    def __init__(self, out, detect, batch_chars=65536):
+        """
+        参数:
+            out: 输出的二进制文件对象
+            detect: 接收段落文本列表、返回与之对应的替换实体列表的函数
+            batch_chars: 累积多少字的段落后进行一次批量识别
+        """
+        self.out = out
+        self.detect = detect
+        self.batch_chars = batch_chars
+
+        self._raw = bytearray()
+        self._base = 0  # _raw[0]在输入中的字节位置
+        self._edits = []  # 待应用的 (起始字节, 结束字节, 新内容)
+        self._open = []  # 尚未结束的段落
+        self._pending = []  # 已结束、尚未识别的段落
+        self._pending_chars = 0
+        self._pending_start = None  # 未识别段落中最靠前的<w:t>起始字节
+        self._text = None  # 正在读取的<w:t>: [标签起始, 文字起始, 文字片段, 是否保留空白]
+
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._chars
+        self._parser = parser
+        self._first = True
+
+    def feed(self, data):
+        """输入一段XML字节"""
+        if self._first:
+            self._check_encoding(data)
+            self._first = False
+        self._raw += data
+        self._parser.Parse(data, False)
+        self._process(final=False)
+
+    def close(self):
+        """结束输入，处理并写出剩余内容"""
+        self._parser.Parse(b'', True)
+        self._process(final=True)
+
+    @staticmethod
+    def _check_encoding(data):
+        if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+            raise ValueError("不支持UTF-16编码的文档部件")
+        declared = _ENCODING_DECL.match(data)
+        if declared and declared.group(1).lower() not in (b'utf-8', b'utf8'):
+            raise ValueError(f"不支持{declared.group(1).decode()}编码的文档部件")
+
+    def _start(self, name, attrs):
+        if name in _P:
+            self._open.append(_Paragraph(self._parser.CurrentByteIndex))
+        elif name in _T and self._open:
+            self._text = [self._parser.CurrentByteIndex, None, [], attrs.get(_XML_SPACE) == 'preserve']
+        elif name in _GAPS and self._open:
+            self._open[-1].add(_GAPS[name])
+
+    def _chars(self, data):
+        text = self._text
+        if text is not None:
+            if text[1] is None:
+                text[1] = self._parser.CurrentByteIndex
+            text[2].append(data)
+
+    def _end(self, name):
+        if name in _T:
+            text = self._text
+            self._text = None
+            if text is not None and text[1] is not None:
+                paragraph = self._open[-1]
+                content = ''.join(text[2])
+                paragraph.add(content, _Segment(
+                    text[0], text[1], self._parser.CurrentByteIndex, paragraph.length, content, text[3]))
+        elif name in _P and self._open:
+            paragraph = self._open.pop()
+            if paragraph.segments:
+                self._pending.append(paragraph)
+                self._pending_chars += paragraph.length
+                # 嵌套段落先于外层段落结束，外层段落的文字可能更靠前
+                tag_start = paragraph.segments[0].tag_start
+                if self._pending_start is None or tag_start < self._pending_start:
+                    self._pending_start = tag_start
+
+    def _process(self, final):
+        """识别已结束的段落，并写出不会再被修改的字节"""
+        if self._pending and (final or (not self._open and self._pending_chars >= self.batch_chars)):
+            paragraphs = self._pending
+            self._pending = []
+            self._pending_chars = 0
+            self._pending_start = None
+            results = self.detect([p.text for p in paragraphs])
+            for paragraph, entities in zip(paragraphs, results):
+                if entities:
+                    self._edits.extend(self._paragraph_edits(paragraph, entities))
+            self._edits.sort()
+
+        # 未结束的段落和未识别的段落都可能被修改，只写出它们之前的字节
+        limit = self._base + len(self._raw)
+        if self._open:
+            limit = min(limit, self._open[0].start)
+        if self._pending:
+            limit = min(limit, self._pending_start)
+        self._flush(limit)
+
+    def _flush(self, limit):
+        if limit <= self._base:
+            return
+        raw, base, out = self._raw, self._base, self.out
+        pos = base
+        applied = 0
+        for start, end, content in self._edits:
+            if end > limit:
+                break
+            out.write(raw[pos - base:start - base])
+            out.write(content)
+            pos = end
+            applied += 1
+        out.write(raw[pos - base:limit - base])
+        del self._edits[:applied]
+        del raw[:limit - base]
+        self._base = limit
+
+    @staticmethod
+    def _paragraph_edits(paragraph, entities):
+        """
+        计算段落中需要改写的<w:t>
+
+        替换文本写入实体起点所在的<w:t>（起点落在制表符等占位字符上时写入实体覆盖的第一个<w:t>），
+        实体覆盖的其余文字从各自的<w:t>中删除，其余<w:t>保持不变。
+        """
+        segments = paragraph.segments
+        # 每个<w:t>中要替换的区间: (段内起始, 段内结束, 替换文本)
+        changes = {}
+        for entity in entities:
+            start, end = entity['start'], entity['end']
+            inserted = False
+            for index, segment in enumerate(segments):
+                seg_start = segment.offset
+                seg_end = seg_start + len(segment.text)
+                if seg_end <= start or seg_end == seg_start:
+                    continue
+                if seg_start >= end:
+                    break
+                local_start = max(start, seg_start) - seg_start
+                local_end = min(end, seg_end) - seg_start
+                replacement = '' if inserted else entity['replacement']
+                inserted = True
+                changes.setdefault(index, []).append((local_start, local_end, replacement))
+
+        edits = []
+        for index, spans in changes.items():
+            segment = segments[index]
+            parts = []
+            pos = 0
+            for local_start, local_end, replacement in sorted(spans):
+                parts.append(segment.text[pos:local_start])
+                parts.append(replacement)
+                pos = local_end
+            parts.append(segment.text[pos:])
+            new_text = ''.join(parts)
+            content = escape(new_text).encode('utf-8')
+            if segment.preserve or new_text == new_text.strip():
+                edits.append((segment.text_start, segment.text_end, content))
+            else:
+                # 首尾出现空白时需要xml:space="preserve"，否则Word会丢弃这些空白
+                edits.append((segment.tag_start, segment.text_end, b'<w:t xml:space="preserve">' + content))
+        return edits
+
+
+def _strip_zip64_extra(extra):
+    """去掉扩展字段中的ZIP64信息，写入本地文件头时会按需重新生成"""
+    result = bytearray()
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[i:i + 4])
+        if header_id != _ZIP64_EXTRA_ID:
+            result += extra[i:i + 4 + size]
+        i += 4 + size
+    return bytes(result)
+
+
+def copy_member_raw(src, info, zout):
+    """
+    将zip成员的压缩数据原样复制到输出zip中，不解压也不重新压缩
+
+    参数:
+        src: 以二进制方式打开的源zip文件
+        info: 源zip中该成员的ZipInfo
+        zout: 以写模式打开的输出ZipFile
+    """
+    src.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"zip成员 {info.filename} 的本地文件头已损坏")
+    src.seek(header[-2] + header[-1], 1)
+
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    for attr in ('compress_type', 'comment', 'create_system', 'create_version', 'extract_version',
+                 'flag_bits', 'internal_attr', 'external_attr', 'CRC', 'compress_size', 'file_size'):
+        setattr(copied, attr, getattr(info, attr))
+    # 大小和CRC已知，直接写在本地文件头中，不再需要数据描述符
+    copied.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    copied.extra = _strip_zip64_extra(info.extra)
+
+    out = zout.fp
+    copied.header_offset = out.tell()
+    out.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining > 0:
+        data = src.read(min(remaining, _COPY_BUFFER))
+        if not data:
+            raise zipfile.BadZipFile(f"zip成员 {info.filename} 的数据不完整")
+        out.write(data)
+        remaining -= len(data)
+
+    zout.filelist.append(copied)
+    zout.NameToInfo[copied.filename] = copied
+    zout.start_dir = out.tell()
+    zout._didModify = True
+
+
+def redact_docx_stream(input_path, output_path, detect, batch_chars=65536, parts=TEXT_PARTS):
+    """
+    流式处理Word文档
+
+    文本部件逐块解压、改写后重新压缩写出，其余成员（图片等）按原压缩数据复制。
+
+    参数:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        detect: 接收段落文本列表、返回与之对应的替换实体列表的函数
+        batch_chars: 累积多少字的段落后进行一次批量识别
+        parts: 匹配需要处理的部件名称的正则
+    """
+    with zipfile.ZipFile(input_path) as zin, open(input_path, 'rb') as src, \
+            zipfile.ZipFile(output_path, 'w') as zout:
+        for info in zin.infolist():
+            if not parts.match(info.filename):
+                copy_member_raw(src, info, zout)
+                continue
+            target = zipfile.ZipInfo(info.filename, info.date_time)
+            target.compress_type = zipfile.ZIP_DEFLATED
+            target.external_attr = info.external_attr
+            # 替换文本可能比原文长，接近上限的部件预先使用ZIP64格式
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT // 2
+            with zin.open(info) as reader, zout.open(target, 'w', force_zip64=force_zip64) as writer:
+                rewriter = PartRewriter(writer, detect, batch_chars)
+                for data in iter(lambda: reader.read(_COPY_BUFFER), b''):
+                    rewriter.feed(data)
+                rewriter.close()
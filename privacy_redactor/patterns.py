@@ -0,0 +1,310 @@
+import re
+import hashlib
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from .utils import REGEX_PATTERNS
+
+# re标志位与作用域内联标志字母的对应关系
+_FLAG_LETTERS = (
+    (re.IGNORECASE, 'i'),
+    (re.MULTILINE, 'm'),
+    (re.DOTALL, 's'),
+    (re.VERBOSE, 'x'),
+    (re.ASCII, 'a'),
+)
+
+# 规则开头的全局内联标志，如 (?i)
+_GLOBAL_FLAGS = re.compile(r'^\(\?([aimsux]+)\)')
+_LETTER_FLAGS = {letter: flag for flag, letter in _FLAG_LETTERS}
+_LETTER_FLAGS['u'] = 0
+
+# 数字形式的反向引用在合并后组号会改变，无法支持
+_NUMERIC_BACKREF = re.compile(r'\\[1-9]')
+
+# 可以直接写入字符集的类别
+_CATEGORY_ESCAPES = {
+    sre_constants.CATEGORY_DIGIT: r'\d',
+    sre_constants.CATEGORY_SPACE: r'\s',
+    sre_constants.CATEGORY_WORD: r'\w',
+}
+
+# 不消耗字符的操作，计算首字符集合时跳过
+_ZERO_WIDTH_OPS = (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+_REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name)
+)
+
+
+class _Unbounded(Exception):
+    """规则的首字符无法用一个字符集描述"""
+
+
+def _first_chars(items):
+    """
+    计算已解析的正则可能匹配的首字符
+
+    返回:
+        chars: 字符集片段的集合
+        nullable: 这段正则是否可能匹配空串
+    """
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars.add(re.escape(chr(av)))
+            return chars, False
+        if op is sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op is sre_constants.LITERAL:
+                    chars.add(re.escape(chr(item_av)))
+                elif item_op is sre_constants.RANGE:
+                    chars.add(f'{re.escape(chr(item_av[0]))}-{re.escape(chr(item_av[1]))}')
+                elif item_op is sre_constants.CATEGORY and item_av in _CATEGORY_ESCAPES:
+                    chars.add(_CATEGORY_ESCAPES[item_av])
+                else:
+                    raise _Unbounded
+            return chars, False
+        if op in _ZERO_WIDTH_OPS:
+            continue
+
+        if op is sre_constants.BRANCH:
+            nullable = False
+            for branch in av[1]:
+                branch_chars, branch_nullable = _first_chars(branch)
+                chars |= branch_chars
+                nullable = nullable or branch_nullable
+        elif op is sre_constants.SUBPATTERN:
+            if av[1] & re.IGNORECASE:
+                raise _Unbounded
+            sub_chars, nullable = _first_chars(av[3])
+            chars |= sub_chars
+        elif op in _REPEAT_OPS:
+            sub_chars, nullable = _first_chars(av[2])
+            chars |= sub_chars
+            nullable = nullable or av[0] == 0
+        else:
+            raise _Unbounded
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _first_char_class(rule_keys):
+    """计算所有规则首字符的并集，无法确定时返回None"""
+    chars = set()
+    for _, pattern, flags in rule_keys:
+        if flags & re.IGNORECASE:
+            return None
+        parsed = sre_parse.parse(pattern, flags)
+        if parsed.state.flags & re.IGNORECASE:
+            return None
+        try:
+            rule_chars, nullable = _first_chars(parsed)
+        except _Unbounded:
+            return None
+        if nullable:
+            return None
+        chars |= rule_chars
+    return '[' + ''.join(sorted(chars)) + ']'
+
+
+class PatternRule:
+    """单条正则规则"""
+    __slots__ = ('entity_type', 'pattern', 'flags', 'replacement', 'groups')
+
+    def __init__(self, entity_type, pattern, flags, replacement, groups):
+        self.entity_type = entity_type
+        self.pattern = pattern
+        self.flags = flags
+        self.replacement = replacement
+        self.groups = groups
+
+    def key(self):
+        """用于编译缓存的规则标识"""
+        return (self.entity_type, self.pattern, self.flags)
+
+
+def _scoped(pattern, flags):
+    """将标志位转换为作用域内联标志，使其只影响本条规则"""
+    letters = ''.join(letter for flag, letter in _FLAG_LETTERS if flags & flag)
+    if letters:
+        return f'(?{letters}:{pattern})'
+    return f'(?:{pattern})'
+
+
+@lru_cache(maxsize=32)
+def _compile_rules(rule_keys):
+    """
+    将多条规则编译为一个组合扫描器
+
+    每条规则之后追加一个空的标记捕获组，匹配成功时标记组是最后闭合的组，
+    通过match.lastindex即可确定命中的规则，标记组的位置即规则匹配的结束位置。
+
+    如果能确定所有规则可能的首字符，扫描器写成 ``[首字符](?<=(?=规则分支).)``：
+    以字符集开头的正则可以让引擎直接跳过不可能开始匹配的位置，
+    规则分支放在零宽断言中，因此每个候选位置只产生一个单字符匹配，
+    规则本身的范围通过捕获组获取。
+
+    返回:
+        scanner: 编译后的组合正则
+        group_index: 标记组序号 -> 规则下标
+    """
+    parts = []
+    group_index = {}
+    next_group = 1
+    for i, (_, pattern, flags) in enumerate(rule_keys):
+        parts.append(f'{_scoped(pattern, flags)}()')
+        next_group += re.compile(pattern, flags).groups
+        group_index[next_group] = i
+        next_group += 1
+
+    branches = '|'.join(parts)
+    first_chars = _first_char_class(rule_keys)
+    if first_chars is not None:
+        branches = f'{first_chars}(?<=(?={branches}).)'
+    return re.compile(branches), group_index
+
+
+class PatternEngine:
+    """
+    单遍正则扫描引擎
+
+    将内置模式与用户添加的模式编译为一个组合扫描器，每篇文档只扫描一次，
+    实体位置直接取自匹配对象。多条规则在同一位置都能匹配时（例如
+    PATIENT_ID、MEDICAL_RECORD_NO、ADMISSION_NO都以住院号/门诊号为锚点），
+    排在前面的规则优先；与之前的匹配重叠的结果被跳过，匹配结果互不重叠。
+    """
+
+    def __init__(self, patterns=None, replacements=None):
+        """
+        初始化正则扫描引擎
+
+        参数:
+            patterns: 实体类型到正则表达式的映射，默认为utils.REGEX_PATTERNS
+            replacements: 实体类型到替换文本的映射，默认为'[实体类型]'
+        """
+        self._rules = []
+        self._replacements = replacements or {}
+        self._compiled = None
+        self._fingerprint = None
+        if patterns is None:
+            patterns = REGEX_PATTERNS
+        for entity_type, pattern in patterns.items():
+            self.add_pattern(entity_type, pattern)
+
+    def add_pattern(self, entity_type, pattern, replacement=None, flags=0):
+        """
+        添加一条正则规则，新规则的优先级低于已有规则
+
+        参数:
+            entity_type: 实体类型
+            pattern: 正则表达式，若包含捕获组则使用第一个非空捕获组作为实体
+            replacement: 替换文本，默认为'[实体类型]'
+            flags: re标志位，只作用于本条规则
+        """
+        # 全局内联标志在组合后不再位于开头，转换为本条规则的标志位
+        global_flags = _GLOBAL_FLAGS.match(pattern)
+        if global_flags:
+            for letter in global_flags.group(1):
+                flags |= _LETTER_FLAGS[letter]
+            pattern = pattern[global_flags.end():]
+
+        if _NUMERIC_BACKREF.search(pattern):
+            raise ValueError(f"正则规则 {entity_type} 使用了数字反向引用，组合扫描器不支持，请改用命名组")
+        compiled = re.compile(pattern, flags)
+        if compiled.match(''):
+            raise ValueError(f"正则规则 {entity_type} 可以匹配空字符串")
+        for name in compiled.groupindex:
+            for rule in self._rules:
+                if name in re.compile(rule.pattern, rule.flags).groupindex:
+                    raise ValueError(f"正则规则 {entity_type} 与 {rule.entity_type} 使用了相同的命名组: {name}")
+
+        if replacement is None:
+            replacement = self._replacements.get(entity_type, f'[{entity_type}]')
+        self._rules.append(PatternRule(entity_type, pattern, flags, replacement, compiled.groups))
+        self._compiled = None
+        self._fingerprint = None
+
+    @property
+    def rules(self):
+        """按优先级排列的规则列表"""
+        return list(self._rules)
+
+    def fingerprint(self):
+        """规则配置的摘要，规则变化后随之改变"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for rule in self._rules:
+                digest.update(repr((rule.key(), rule.replacement)).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _scanner(self):
+        if self._compiled is None:
+            self._compiled = _compile_rules(tuple(rule.key() for rule in self._rules))
+        return self._compiled
+
+    def finditer(self, text):
+        """
+        扫描文本，逐个返回匹配结果
+
+        参数:
+            text: 要扫描的文本
+
+        返回:
+            生成器，每项为 (规则, 起始位置, 结束位置)
+        """
+        if not self._rules:
+            return
+        scanner, group_index = self._scanner()
+        search = scanner.search
+        rules = self._rules
+        last_end = 0
+        while True:
+            # 从上一个匹配的结束位置继续搜索，跳过与之重叠的位置
+            match = search(text, last_end)
+            if match is None:
+                return
+            match_start = match.start()
+            marker = match.lastindex
+            rule = rules[group_index[marker]]
+            last_end = match.start(marker)
+            if rule.groups:
+                # 使用第一个非空的捕获组
+                for group in range(marker - rule.groups, marker):
+                    start, end = match.span(group)
+                    if end > start:
+                        break
+                else:
+                    continue
+            else:
+                start, end = match_start, last_end
+            yield rule, start, end
+
+    def extract(self, text):
+        """
+        从文本中提取实体
+
+        参数:
+            text: 要处理的文本
+
+        返回:
+            entities: 识别出的实体信息列表
+        """
+        return [
+            {
+                'original': text[start:end],
+                'type': rule.entity_type,
+                'replacement': rule.replacement,
+                'start': start,
+                'end': end
+            }
+            for rule, start, end in self.finditer(text)
+        ]
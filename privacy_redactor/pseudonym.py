@@ -0,0 +1,372 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import unicodedata
+
+from .sink import _truncate_partial_line
+
+# 生成代号的实体类型及其前缀，同一原文在同一密钥下总是得到同一个代号，如 [姓名3FA81C0D9E52B7A4]
+SURROGATE_PREFIXES = {
+    'NAME': '姓名',
+    'DOCTOR_NAME': '医师',
+    'LOCATION': '地址',
+    'ORGANIZATION': '机构',
+}
+
+# 保持格式的实体类型：逐字符替换数字和字母，长度、分隔符不变，身份证号和银行卡号的校验位重新计算
+FORMAT_PRESERVING_TYPES = ('ID_CARD', 'PHONE', 'BANK_CARD', 'EMAIL', 'PATIENT_ID', 'MEDICAL_RECORD_NO',
+                           'ADMISSION_NO', 'MEDICAL_INSURANCE_NO', 'SOCIAL_SECURITY_NO')
+
+# 计算哈希时按同一类处理的实体类型。同一个编号可能因重叠取舍被识别为门诊号或病历号，
+# 同一个人可能既是患者又是医师，归为一类后在不同文档中仍能关联
+_HASH_FAMILIES = {
+    'DOCTOR_NAME': 'NAME',
+    'PATIENT_ID': 'RECORD_NO',
+    'MEDICAL_RECORD_NO': 'RECORD_NO',
+    'ADMISSION_NO': 'RECORD_NO',
+}
+
+# 身份证号校验位（GB 11643）
+_ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+_ID_CHECK = '10X98765432'
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# 生成的手机号使用的号段，均能被utils.REGEX_PATTERNS['PHONE']识别
+_PHONE_PREFIXES = ('130', '131', '132', '133', '135', '136', '137', '138', '139', '150', '151', '152',
+                   '155', '156', '157', '158', '159', '177', '180', '181', '186', '187', '188', '189')
+_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def normalize(entity_type, original):
+    """
+    规范化原文，书写形式不同的同一实体得到相同的代号
+
+    全角字符转为半角（NFKC），去掉空白；编号类实体再去掉连字符并统一为大写。
+
+    参数:
+        entity_type: 实体类型
+        original: 实体原文
+
+    返回:
+        normalized: 规范化后的原文
+    """
+    text = ''.join(unicodedata.normalize('NFKC', original).split())
+    if entity_type in FORMAT_PRESERVING_TYPES and entity_type != 'EMAIL':
+        text = text.replace('-', '').upper()
+    elif entity_type == 'EMAIL':
+        text = text.lower()
+    return text
+
+
+class _DigitStream:
+    """从HMAC摘要中逐个取出指定进制的数字，摘要用完后按计数器继续派生"""
+
+    def __init__(self, key, message):
+        self._key = key
+        self._message = message
+        self._counter = 0
+        self._value = 0
+        self._bits = 0
+
+    def take(self, base):
+        # 剩余的熵不足时追加下一块摘要，保证各位数字近似均匀
+        if self._bits < 64:
+            block = hmac.new(self._key, self._message + self._counter.to_bytes(4, 'big'),
+                             hashlib.sha256).digest()
+            self._counter += 1
+            self._value = (self._value << 256) | int.from_bytes(block, 'big')
+            self._bits += 256
+        self._value, digit = divmod(self._value, base)
+        self._bits -= base.bit_length()
+        return digit
+
+
+class Pseudonymizer:
+    """
+    以带密钥的哈希生成确定性的替代文本
+
+    代号由HMAC-SHA256(密钥, 实体类型 + 规范化原文)派生，不依赖任何映射表：
+    同一密钥下，同一患者在不同文档、不同工作进程、不同批次中得到同一个代号，纵向关联得以保留；
+    没有密钥则无法由代号反推原文，也无法对猜测的姓名验证。
+    姓名、地址、机构替换为带前缀的代号，证件号、电话号码等替换为格式相同的虚构号码，
+    其余类型（如日期、费用）保持策略给出的替换文本。
+    """
+
+    def __init__(self, key, vault=None, code_length=16, prefixes=None, format_preserving=FORMAT_PRESERVING_TYPES,
+                 cache_size=65536):
+        """
+        参数:
+            key: 密钥，字符串或字节串，应妥善保管并在需要关联的各次运行中保持不变
+            vault: 可选的PseudonymVault实例，记录代号与原文的对应关系，供授权后还原
+            code_length: 代号的十六进制位数，位数越多不同实体得到相同代号的可能越小。
+                8位（32比特）在十万个不同姓名中就几乎必然出现冲突，默认的16位在上百万个实体中也几乎不会冲突；
+                不同位数得到的代号不同，需要与已有的代号关联时应沿用原来的位数
+            prefixes: 实体类型到代号前缀的映射，会覆盖SURROGATE_PREFIXES中的同名项
+            format_preserving: 生成保持格式的虚构号码的实体类型
+            cache_size: 进程内缓存的代号数量
+        """
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if not key:
+            raise ValueError("伪名化密钥不能为空")
+        if not 4 <= code_length <= 64:
+            raise ValueError(f"code_length必须在4到64之间: {code_length}")
+        self._key = key
+        self.vault = vault
+        self.code_length = code_length
+        self.prefixes = dict(SURROGATE_PREFIXES, **(prefixes or {}))
+        self.format_preserving = frozenset(format_preserving)
+        self.cache_size = cache_size
+        self._cache = {}
+
+    @classmethod
+    def from_key_file(cls, path, **options):
+        """从文件读取密钥创建实例，文件首尾的空白不计入密钥"""
+        with open(path, 'rb') as f:
+            return cls(f.read().strip(), **options)
+
+    def __getstate__(self):
+        # 传给工作进程时不带缓存
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def handles(self, entity_type):
+        """是否为该类型的实体生成替代文本"""
+        return entity_type in self.prefixes or entity_type in self.format_preserving
+
+    def _message(self, entity_type, normalized):
+        family = _HASH_FAMILIES.get(entity_type, entity_type)
+        return f'{family}\x00{normalized}'.encode('utf-8', 'surrogatepass')
+
+    def surrogate(self, entity_type, original):
+        """
+        返回实体的替代文本
+
+        参数:
+            entity_type: 实体类型
+            original: 实体原文
+
+        返回:
+            surrogate: 替代文本，不生成替代文本的类型返回None
+        """
+        cache_key = (entity_type, original)
+        surrogate = self._cache.get(cache_key)
+        if surrogate is not None:
+            return surrogate
+        if not self.handles(entity_type):
+            return None
+        message = self._message(entity_type, normalize(entity_type, original))
+        if entity_type in self.format_preserving:
+            surrogate = self._format_preserving(entity_type, original, _DigitStream(self._key, message))
+        else:
+            digest = hmac.new(self._key, message, hashlib.sha256).hexdigest()
+            surrogate = f'[{self.prefixes[entity_type]}{digest[:self.code_length].upper()}]'
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[cache_key] = surrogate
+        if self.vault is not None:
+            self.vault.record(entity_type, surrogate, original)
+        return surrogate
+
+    def apply(self, entity):
+        """
+        返回替换文本换成替代文本的实体副本，不生成替代文本的类型原样返回
+
+        参数:
+            entity: 带有type和original的实体
+        """
+        original = entity.get('original')
+        if not original:
+            return entity
+        surrogate = self.surrogate(entity['type'], original)
+        if surrogate is None:
+            return entity
+        return dict(entity, replacement=surrogate)
+
+    def _format_preserving(self, entity_type, original, stream):
+        text = ''.join(unicodedata.normalize('NFKC', original).split())
+        if entity_type == 'ID_CARD' and len(text) == 18:
+            return self._id_card(stream)
+        if entity_type == 'PHONE' and len(text) == 11 and text.isdigit():
+            return _PHONE_PREFIXES[stream.take(len(_PHONE_PREFIXES))] + ''.join(
+                str(stream.take(10)) for _ in range(8))
+        if entity_type == 'EMAIL' and '@' in text:
+            local = text.split('@', 1)[0]
+            return _replace_chars(local, stream) + '@example.invalid'
+        surrogate = _replace_chars(text, stream)
+        if entity_type == 'BANK_CARD' and surrogate.isdigit():
+            surrogate = surrogate[:-1] + _luhn_digit(surrogate[:-1])
+        return surrogate
+
+    @staticmethod
+    def _id_card(stream):
+        # 地区码、出生日期和顺序码都由哈希派生，只保留格式和校验位，不泄露原号码中的任何信息
+        region = str(stream.take(9) + 1) + ''.join(str(stream.take(10)) for _ in range(5))
+        year = 1930 + stream.take(90)
+        month = stream.take(12) + 1
+        day = stream.take(_DAYS_IN_MONTH[month - 1]) + 1
+        sequence = ''.join(str(stream.take(10)) for _ in range(3))
+        body = f'{region}{year:04d}{month:02d}{day:02d}{sequence}'
+        check = _ID_CHECK[sum(int(c) * w for c, w in zip(body, _ID_WEIGHTS)) % 11]
+        return body + check
+
+
+def _replace_chars(text, stream):
+    """逐字符替换数字和字母，保持大小写和其余字符不变，首位数字不为0时替换后也不为0"""
+    chars = []
+    for i, char in enumerate(text):
+        if '0' <= char <= '9':
+            if i == 0 and char != '0':
+                chars.append(str(stream.take(9) + 1))
+            else:
+                chars.append(str(stream.take(10)))
+        elif 'A' <= char <= 'Z':
+            chars.append(_UPPER[stream.take(26)])
+        elif 'a' <= char <= 'z':
+            chars.append(_LOWER[stream.take(26)])
+        else:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def _luhn_digit(digits):
+    """计算使digits加上该位后满足Luhn校验的校验位"""
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        n = int(char)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return str((10 - total % 10) % 10)
+
+
+class PseudonymVault:
+    """
+    本地的代号与原文对应表，仅追加写入，按代号分片
+
+    代号本身由密钥派生，不需要对应表即可保持一致，对应表只用于授权后的还原。
+    每个分片是一个JSON Lines文件，每条记录一行：{"surrogate": ..., "type": ..., "original": ...}。
+    每条记录以一次追加写入完成，多个工作进程可以同时写入同一目录而无需加锁；
+    同一进程内已写过的代号与原文组合不再重复写入，不同原文得到同一代号时各自记录。查询时只读取代号所在的分片。
+    对应表中保存的是明文原文，目录应限制访问权限。
+    """
+
+    def __init__(self, directory, shards=16):
+        """
+        参数:
+            directory: 对应表目录，不存在时自动创建
+            shards: 分片数量，同一目录必须始终使用相同的分片数量
+        """
+        if not 1 <= shards <= 4096:
+            raise ValueError(f"shards必须在1到4096之间: {shards}")
+        self.directory = directory
+        self.shards = shards
+        self._lock = threading.Lock()
+        self._fds = {}
+        self._pid = None
+        # 分片编号 -> 已写入的 (代号, 原文)
+        self._written = {}
+
+    def __getstate__(self):
+        # 传给工作进程时只传递配置，各进程打开自己的文件描述符
+        return {'directory': self.directory, 'shards': self.shards}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _shard(self, surrogate):
+        digest = hashlib.blake2b(surrogate.encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'big') % self.shards
+
+    def shard_path(self, shard):
+        """分片文件路径"""
+        return os.path.join(self.directory, f'vault-{shard:04d}.jsonl')
+
+    def _fd(self, shard):
+        # fork出的子进程不能沿用父进程的文件描述符和已写入记录
+        if self._pid != os.getpid():
+            self._fds = {}
+            self._written = {}
+            self._pid = os.getpid()
+        fd = self._fds.get(shard)
+        if fd is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.shard_path(shard)
+            if os.path.exists(path):
+                # 进程被终止时可能留下不完整的最后一行，之后追加的记录不能接在半行后面
+                _truncate_partial_line(path)
+            flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+            fd = self._fds[shard] = os.open(path, flags, 0o600)
+            self._written[shard] = {(record['surrogate'], record['original']) for record in self._read(shard)}
+        return fd
+
+    def record(self, entity_type, surrogate, original):
+        """
+        记录一个代号及其原文
+
+        参数:
+            entity_type: 实体类型
+            surrogate: 代号或虚构号码
+            original: 实体原文
+        """
+        shard = self._shard(surrogate)
+        with self._lock:
+            fd = self._fd(shard)
+            written = self._written[shard]
+            if (surrogate, original) in written:
+                return
+            line = json.dumps({'surrogate': surrogate, 'type': entity_type, 'original': original},
+                              ensure_ascii=False, separators=(',', ':')) + '\n'
+            os.write(fd, line.encode('utf-8'))
+            written.add((surrogate, original))
+
+    def _read(self, shard):
+        path = self.shard_path(shard)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 中断时可能留下不完整的最后一行
+                    continue
+
+    def lookup(self, surrogate):
+        """
+        查询代号对应的原文
+
+        参数:
+            surrogate: 代号或虚构号码
+
+        返回:
+            originals: 对应的原文列表，通常只有一项；代号位数过少时不同原文可能得到同一代号
+        """
+        originals = []
+        for record in self._read(self._shard(surrogate)):
+            if record['surrogate'] == surrogate and record['original'] not in originals:
+                originals.append(record['original'])
+        return originals
+
+    def iter_records(self):
+        """依次返回全部分片中的记录"""
+        for shard in range(self.shards):
+            yield from self._read(shard)
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds = {}
+            self._written = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
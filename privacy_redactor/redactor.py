@@ -1,71 +1,199 @@
 import os
-from .utils import is_chinese
-from .strategies import HanlpStrategy, LLMStrategy, RegexStrategy, HybridStrategy, MedicalStrategy
-from .handlers import TextFileHandler, DocxFileHandler
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .registry import create_strategy
+from .handlers import TextFileHandler, DocxFileHandler, StreamingDocxFileHandler
+from .spans import redact_spans
+from .batch import redact_texts
+from .metrics import NULL_METRICS
 
 class PrivacyRedactor:
     """
     隐私信息处理工具包的主类，用于识别和替换中文医疗文本中的隐私信息。
     """
-    def __init__(self, strategy='medical', enable_llm=False, model_name="qwen2:7b", url="http://127.0.0.1:11434"):
+    def __init__(self, strategy='medical', enable_llm=False, model_name="qwen2:7b", url="http://127.0.0.1:11434",
+                 strategy_options=None, docx_engine='python-docx', llm_options=None, metrics=None,
+                 entity_sink=None, pseudonymizer=None, incremental=False):
         """
         初始化隐私信息处理器
         
         参数:
-            strategy: 使用的策略，可选值有 'hanlp', 'llm', 'regex', 'medical', 'hybrid'
+            strategy: 使用的策略，可以是已注册的策略名称（内置 'regex', 'medical', 'auto'，
+                自定义策略通过register_strategy注册），也可以直接传入策略实例
             enable_llm: 是否启用大语言模型增强
             model_name: 大语言模型名称
             url: 大语言模型API地址
+            strategy_options: 创建策略时传入的额外参数
+            docx_engine: Word文档的处理方式，'python-docx' 使用python-docx对象模型，
+                'stream' 流式改写文档XML，适合包含大量图片或超大表格的文档
+            llm_options: 大语言模型客户端的其他参数，如 {'max_concurrency': 8, 'timeout': 30, 'retries': 2}
+            metrics: 记录各阶段耗时、实体数量和文档大小的metrics.Metrics实例，默认不记录
+            entity_sink: 流式写出实体的sink.JsonlEntitySink实例，redact_text和redact_file
+                每处理完一个文档就写出其实体
+            pseudonymizer: pseudonym.Pseudonymizer实例，提供时姓名替换为由密钥派生的代号（如 [姓名3FA81C0D9E52B7A4]），
+                证件号、电话号码等替换为格式相同的虚构号码，同一实体在各文档、各工作进程中结果一致
+            incremental: 是否增量处理Word文档：在输出文件旁保存每个段落的识别结果（*_paragraphs.json），
+                重新处理修订后的文档时只识别修改过的和新增的段落，需要策略提供fingerprint()
         """
-        # 根据策略名称实例化相应的策略类
-        strategy_map = {
-            'hanlp': HanlpStrategy(),
-            'llm': LLMStrategy(model_name=model_name, url=url),
-            'regex': RegexStrategy(),
-            'medical': MedicalStrategy(),
-            'hybrid': HybridStrategy()
+        # 记录构造参数，供批处理的工作进程创建相同配置的处理器
+        self._config = {
+            'strategy': strategy,
+            'enable_llm': enable_llm,
+            'model_name': model_name,
+            'url': url,
+            'strategy_options': strategy_options,
+            'docx_engine': docx_engine,
+            'llm_options': llm_options,
+            'pseudonymizer': pseudonymizer,
+            'incremental': incremental
         }
         
-        if strategy not in strategy_map:
-            raise ValueError(f"不支持的策略: {strategy}，可选值为: {', '.join(strategy_map.keys())}")
-        
-        self.strategy = strategy_map[strategy]
+        # 只创建被选中的策略，策略模块及其依赖在此时才导入
+        if isinstance(strategy, str):
+            self.strategy = create_strategy(strategy, **(strategy_options or {}))
+        else:
+            self.strategy = strategy
         
         # 如果启用LLM，为策略配置LLM
-        if enable_llm and strategy in ['medical', 'hybrid']:
-            self.strategy.enable_llm(model_name=model_name, url=url)
+        if enable_llm and hasattr(self.strategy, 'enable_llm'):
+            self.strategy.enable_llm(model_name=model_name, url=url, **(llm_options or {}))
         
         # 文件处理器映射
+        docx_handlers = {'python-docx': DocxFileHandler, 'stream': StreamingDocxFileHandler}
+        if docx_engine not in docx_handlers:
+            raise ValueError(f"不支持的Word文档处理方式: {docx_engine}，可选值为: {', '.join(docx_handlers)}")
         self.file_handlers = {
             '.txt': TextFileHandler(),
-            '.docx': DocxFileHandler()
+            '.docx': docx_handlers[docx_engine]()
         }
         
-    def redact_text(self, text):
+        # 指标记录，策略和文件处理器共用同一个实例
+        self.metrics = metrics or NULL_METRICS
+        if hasattr(self.strategy, 'metrics'):
+            self.strategy.metrics = self.metrics
+        for handler in self.file_handlers.values():
+            handler.metrics = self.metrics
+        
+        self.entity_sink = entity_sink
+        
+        # 替代文本在替换时生成，不影响实体识别和缓存
+        self.pseudonymizer = pseudonymizer
+        if hasattr(self.strategy, 'pseudonymizer'):
+            self.strategy.pseudonymizer = pseudonymizer
+        for handler in self.file_handlers.values():
+            handler.pseudonymizer = pseudonymizer
+            handler.incremental = incremental
+        
+    def redact_text(self, text, return_offsets=False, doc_id=None):
         """
         处理中文医疗文本中的隐私信息
         
         参数:
             text: 要处理的文本
+            return_offsets: 是否同时返回原文与处理后文本之间的位置映射
+            doc_id: 写入entity_sink时使用的文档编号
             
         返回:
             redacted_text: 处理后的文本
-            entities: 识别出的实体列表，每个实体是一个包含原文、类型、替换文本的字典
+            entities: 实际替换的实体列表，每个实体是一个包含原文、类型、替换文本和位置的字典
+            offset_map: 位置映射（OffsetMap），仅在return_offsets为True时返回
         """
+        metrics = self.metrics
+        
         # 提取实体
-        entities = self.strategy.extract_entities(text)
+        with metrics.timer('detect'):
+            entities = self.strategy.extract_entities(text)
         
-        # 替换文本
-        redacted_text = text
-        for entity in entities:
-            redacted_text = redacted_text.replace(entity['original'], entity['replacement'])
-            
+        # 按位置替换文本，重叠的实体按类型优先级取舍
+        with metrics.timer('replace'):
+            redacted_text, entities, offset_map = redact_spans(
+                text, entities, getattr(self.strategy, 'type_priority', None), self.pseudonymizer)
+        
+        if metrics.enabled:
+            metrics.document('text', len(text))
+            metrics.entities(entities)
+            self.report_stats()
+        if self.entity_sink is not None:
+            self.entity_sink.write(doc_id, entities)
+        
+        if return_offsets:
+            return redacted_text, entities, offset_map
         return redacted_text, entities
         
+    def redact_batch(self, texts, doc_ids=None):
+        """
+        在当前进程中批量处理多个独立的文本
+        
+        全部文本合并为一次批量识别（策略提供extract_entities_batch时），结果与逐个调用redact_text相同，
+        但多个短文本的总耗时明显更少。
+        
+        参数:
+            texts: 文本列表
+            doc_ids: 写入entity_sink时使用的文档编号列表，默认为None
+            
+        返回:
+            results: 列表，每项为 (redacted_text, entities)，与redact_text的返回值相同
+        """
+        metrics = self.metrics
+        strategy = self.strategy
+        texts = list(texts)
+        
+        # 按文档分类的策略（如'auto'）需要逐个文本分类，不能把整批文本当作一个文档
+        with metrics.timer('detect'):
+            batch = getattr(strategy, 'extract_documents', None) or getattr(strategy, 'extract_entities_batch', None)
+            if batch is not None:
+                detected = batch(texts)
+            else:
+                detected = [strategy.extract_entities(text) for text in texts]
+        
+        priority = getattr(strategy, 'type_priority', None)
+        results = []
+        with metrics.timer('replace'):
+            for text, entities in zip(texts, detected):
+                redacted_text, entities, _ = redact_spans(text, entities, priority, self.pseudonymizer)
+                results.append((redacted_text, entities))
+        
+        if metrics.enabled:
+            for text, (_, entities) in zip(texts, results):
+                metrics.document('text', len(text))
+                metrics.entities(entities)
+            self.report_stats()
+        if self.entity_sink is not None:
+            for doc_id, (_, entities) in zip(doc_ids or [None] * len(texts), results):
+                self.entity_sink.write(doc_id, entities)
+        return results
+        
+    def redact_texts(self, texts, workers=None, chunksize=64):
+        """
+        使用进程池批量处理文本
+        
+        每个工作进程只创建一次策略并加载一次词典，结果按输入顺序逐个返回。
+        
+        参数:
+            texts: 可迭代的文本，可以是任意长的迭代器
+            workers: 工作进程数，默认为CPU核数；为1时在当前进程中处理
+            chunksize: 每次提交给工作进程的文本数量
+            
+        返回:
+            生成器，每项为 (redacted_text, entities)，与redact_text的返回值相同
+        """
+        return redact_texts(self, texts, workers=workers, chunksize=chunksize)
+        
+    def worker_config(self):
+        """
+        返回在其他进程中重建本处理器所需的构造参数
+        
+        直接传入策略实例时，实例需要可以被pickle序列化。
+        """
+        return dict(self._config)
+        
     def redact_file(self, input_path, output_path=None):
         """
         处理文件中的隐私信息
         
+        文件处理器不保存处理结果，可以在多个线程中同时调用。
+        
         参数:
             input_path: 输入文件路径
             output_path: 输出文件路径，如果为None则自动生成
@@ -90,9 +218,82 @@ class PrivacyRedactor:
         handler = self.file_handlers[ext]
         
         # 处理文件
-        handler.redact(input_path, output_path, self.strategy)
+        entities = handler.redact(input_path, output_path, self.strategy)
+        if entities is None:
+            # 兼容把结果保存在实例上的旧式自定义处理器，这类处理器不能在多个线程中共用
+            entities = handler.get_entities()
+        
+        if self.metrics.enabled:
+            self.metrics.entities(entities)
+            self.report_stats()
+        if self.entity_sink is not None:
+            self.entity_sink.write(input_path, entities)
+        
+        return output_path, entities
+        
+    async def redact_file_async(self, input_path, output_path=None, executor=None):
+        """
+        在线程池中处理文件，不阻塞事件循环
         
-        return output_path, handler.get_entities()
+        参数:
+            input_path: 输入文件路径
+            output_path: 输出文件路径，如果为None则自动生成
+            executor: 执行处理的线程池，默认为事件循环的默认线程池
+            
+        返回:
+            与redact_file相同
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.redact_file, input_path, output_path))
+        
+    async def redact_files_async(self, input_paths, output_paths=None, concurrency=4, return_exceptions=False):
+        """
+        在当前进程中并发处理多个文件
+        
+        多个文件在线程池中同时处理：一个文件读取、解压、解析或压缩、写出Word文档（zip）时，
+        文件读写和zlib压缩解压不占用GIL，其他文件的实体识别可以同时进行。
+        识别本身仍受GIL限制，CPU密集的大批量任务应使用batch.redact_files的多进程处理。
+        
+        参数:
+            input_paths: 输入文件路径列表
+            output_paths: 与input_paths对应的输出文件路径列表，为None时全部自动生成
+            concurrency: 同时处理的文件数
+            return_exceptions: 为True时处理失败的文件在结果中返回异常对象，否则第一个异常直接抛出
+            
+        返回:
+            results: 与input_paths对应的列表，每项为 (output_path, entities)
+        """
+        input_paths = list(input_paths)
+        output_paths = [None] * len(input_paths) if output_paths is None else list(output_paths)
+        if len(output_paths) != len(input_paths):
+            raise ValueError(f"输出路径数量 {len(output_paths)} 与输入文件数量 {len(input_paths)} 不一致")
+        if concurrency < 1:
+            raise ValueError(f"concurrency必须大于0: {concurrency}")
+        
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='cn-hpp-file')
+        tasks = [asyncio.ensure_future(self.redact_file_async(input_path, output_path, executor))
+                 for input_path, output_path in zip(input_paths, output_paths)]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        finally:
+            # 出错或被取消时不等待其余文件，尚未开始处理的文件随任务一起取消
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False)
+        
+    def report_stats(self):
+        """
+        将策略的实体缓存和大语言模型统计信息记录到metrics
+        
+        缓存统计记录为 cache_hits、cache_hit_rate 等瞬时值，大语言模型统计记录为 llm_segments 等。
+        """
+        if not self.metrics.enabled:
+            return
+        cache = getattr(self.strategy, 'cache', None)
+        if cache is not None:
+            self.metrics.report('cache', cache.stats())
+        if getattr(self.strategy, 'use_llm', False) and hasattr(self.strategy, 'llm_stats'):
+            self.metrics.report('llm', self.strategy.llm_stats())
         
     def get_entities(self, text):
         """
@@ -0,0 +1,76 @@
+import importlib
+import threading
+
+# 策略名称 -> 策略工厂（可调用对象，或 '模块路径:属性名' 形式的延迟导入路径）
+_registry = {}
+_lock = threading.Lock()
+
+
+def register_strategy(name, factory, replace=False):
+    """
+    注册一个策略，PrivacyRedactor(strategy=name) 时才会创建实例
+
+    参数:
+        name: 策略名称
+        factory: 策略类或返回策略实例的函数，也可以是 'package.module:ClassName'
+            形式的字符串，此时模块在第一次选择该策略时才导入
+        replace: 是否允许覆盖已注册的同名策略
+    """
+    if not (callable(factory) or isinstance(factory, str)):
+        raise TypeError(f"策略工厂必须是可调用对象或 'module:attr' 字符串: {factory!r}")
+    with _lock:
+        if name in _registry and not replace:
+            raise ValueError(f"策略 {name} 已注册，如需覆盖请传入replace=True")
+        _registry[name] = factory
+
+
+def unregister_strategy(name):
+    """取消注册一个策略"""
+    with _lock:
+        _registry.pop(name, None)
+
+
+def available_strategies():
+    """返回已注册的策略名称列表"""
+    return list(_registry)
+
+
+def get_strategy_factory(name):
+    """返回已注册的策略工厂，未注册时返回None"""
+    return _registry.get(name)
+
+
+def _resolve(name, factory):
+    """将延迟导入路径解析为可调用对象"""
+    module_name, _, attr = factory.partition(':')
+    try:
+        module = importlib.import_module(module_name)
+        return getattr(module, attr)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"策略 {name} 的实现 {factory} 无法加载: {e}") from e
+
+
+def create_strategy(name, **kwargs):
+    """
+    创建策略实例
+
+    参数:
+        name: 策略名称
+        **kwargs: 传给策略工厂的参数
+
+    返回:
+        strategy: 策略实例
+    """
+    try:
+        factory = _registry[name]
+    except KeyError:
+        raise ValueError(f"不支持的策略: {name}，可选值为: {', '.join(_registry)}") from None
+    if isinstance(factory, str):
+        factory = _resolve(name, factory)
+    return factory(**kwargs)
+
+
+# 内置策略，均在第一次被选择时才导入
+register_strategy('regex', 'privacy_redactor.strategies:RegexStrategy')
+register_strategy('medical', 'privacy_redactor.strategies:MedicalStrategy')
+register_strategy('auto', 'privacy_redactor.strategies:TriageStrategy')
@@ -0,0 +1,201 @@
+import re
+from bisect import bisect_right
+
+from .spans import locate_entities, resolve_overlaps
+
+# 句子：以中文句末标点、分号或换行结尾
+_SENTENCE = re.compile(r'[^。！？；\n]+[。！？；\n]*|[。！？；\n]+')
+# 粗略的分词单位：每个汉字、每个英文单词、每三位数字、每个标点各算一个token
+_TOKEN = re.compile(r'[\u4e00-\u9fff]|[A-Za-z]+|\d{1,3}|[^\s\w]')
+# 多个文本打包时使用的分隔符，同时也是句子边界
+_JOIN = '\n'
+
+
+def iter_sentences(text):
+    """
+    按句末标点和换行切分句子
+
+    返回:
+        生成器，每项为句子的 (起始位置, 结束位置)
+    """
+    for match in _SENTENCE.finditer(text):
+        yield match.span()
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数
+
+    对中文大模型的分词器来说，一个汉字大约是一个token，英文单词和数字会被切成若干片段，
+    这里只用于控制片段长度，不需要精确。
+    """
+    return len(_TOKEN.findall(text))
+
+
+class Segmenter:
+    """
+    按token预算切分长文本
+
+    先按句末标点（。！？；）和换行切分为句子，再把相邻句子打包成不超过max_tokens的片段，
+    相邻片段之间重叠最多overlap_tokens个token的完整句子，使跨越片段边界的实体在某个片段中完整出现。
+    超过预算的单个句子按token硬切分。各片段识别出的实体换算回原文位置，
+    重叠区域中重复识别的实体只保留一个。适用于任何策略。
+    """
+
+    def __init__(self, max_tokens=1024, overlap_tokens=64, token_counter=None):
+        """
+        初始化切分器
+
+        参数:
+            max_tokens: 每个片段的token上限
+            overlap_tokens: 相邻片段之间重叠的token上限
+            token_counter: 计算文本token数的函数，默认为estimate_tokens
+        """
+        if max_tokens <= 0:
+            raise ValueError(f"max_tokens必须为正整数: {max_tokens}")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError(f"overlap_tokens必须小于max_tokens: {overlap_tokens}")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.token_counter = token_counter or estimate_tokens
+
+    def __repr__(self):
+        return f'Segmenter(max_tokens={self.max_tokens}, overlap_tokens={self.overlap_tokens})'
+
+    def _sentences(self, text):
+        """返回 [(起始位置, 结束位置, token数), ...]，超过预算的句子被切成多段"""
+        sentences = []
+        for start, end in iter_sentences(text):
+            tokens = self.token_counter(text[start:end])
+            if tokens <= self.max_tokens:
+                sentences.append((start, end, tokens))
+                continue
+            # 在第max_tokens个token之前切开
+            piece_start = start
+            count = 0
+            for token in _TOKEN.finditer(text, start, end):
+                if count == self.max_tokens:
+                    sentences.append((piece_start, token.start(), count))
+                    piece_start = token.start()
+                    count = 0
+                count += 1
+            sentences.append((piece_start, end, count))
+        return sentences
+
+    def split(self, text):
+        """
+        将文本切分为片段
+
+        返回:
+            spans: [(起始位置, 结束位置), ...]，按位置排序，相邻片段可能重叠
+        """
+        sentences = self._sentences(text)
+        spans = []
+        i = 0
+        while i < len(sentences):
+            j = i
+            total = 0
+            while j < len(sentences) and (j == i or total + sentences[j][2] <= self.max_tokens):
+                total += sentences[j][2]
+                j += 1
+            spans.append((sentences[i][0], sentences[j - 1][1]))
+            if j == len(sentences):
+                break
+            # 下一个片段从末尾的若干完整句子开始，保证每次至少前进一个句子
+            k = j
+            overlap = 0
+            while k - 1 > i and overlap + sentences[k - 1][2] <= self.overlap_tokens:
+                k -= 1
+                overlap += sentences[k][2]
+            i = k
+        return spans
+
+    def extract(self, detect, text, priority=None):
+        """
+        切分文本并识别实体
+
+        参数:
+            detect: 接收片段文本列表、返回与之对应的实体列表的函数
+            text: 原始文本
+            priority: 实体重叠时的类型优先级，默认为utils.ENTITY_TYPE_PRIORITY
+
+        返回:
+            entities: 位置换算到原文的实体列表，互不重叠，按起始位置排序
+        """
+        spans = self.split(text)
+        if not spans:
+            return []
+        pieces = [text[start:end] for start, end in spans]
+        merged = {}
+        for (offset, _), piece, entities in zip(spans, pieces, detect(pieces)):
+            for entity in locate_entities(piece, entities):
+                start, end = entity['start'] + offset, entity['end'] + offset
+                # 重叠区域中的实体会被相邻两个片段各识别一次
+                key = (start, end, entity['type'])
+                if key not in merged:
+                    merged[key] = dict(entity, start=start, end=end)
+        # 被片段边界截断的实体与另一片段中完整的实体重叠，保留较长者
+        return resolve_overlaps(list(merged.values()), priority)
+
+    def extract_many(self, detect, texts, priority=None):
+        """
+        将多个短文本打包成片段识别，减少调用次数
+
+        文本以换行连接后切分，跨越文本边界的实体被丢弃。
+
+        返回:
+            results: 与texts一一对应的实体列表
+        """
+        texts = list(texts)
+        starts = []
+        pos = 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text) + len(_JOIN)
+        results = [[] for _ in texts]
+        for entity in self.extract(detect, _JOIN.join(texts), priority):
+            index = bisect_right(starts, entity['start']) - 1
+            offset = starts[index]
+            if entity['end'] - offset > len(texts[index]):
+                continue
+            entity['start'] -= offset
+            entity['end'] -= offset
+            results[index].append(entity)
+        return results
+
+
+class SegmentedStrategy:
+    """
+    为任意策略增加长文本切分
+
+    长文本按token预算切分后批量交给内部策略识别，实体位置换算回原文。
+    其余属性和方法直接使用内部策略的。
+    """
+
+    def __init__(self, strategy, segmenter=None):
+        """
+        参数:
+            strategy: 内部策略实例
+            segmenter: Segmenter实例，默认为Segmenter()
+        """
+        self.strategy = strategy
+        self.segmenter = segmenter or Segmenter()
+
+    def __getattr__(self, name):
+        # 只在常规属性查找失败时调用，反序列化时strategy可能尚未设置
+        if name == 'strategy':
+            raise AttributeError(name)
+        return getattr(self.strategy, name)
+
+    def _detect(self, language):
+        from .handlers import extract_batch
+        return lambda pieces: extract_batch(self.strategy, pieces, language)
+
+    def extract_entities(self, text, language='zh'):
+        """从文本中提取实体，参数与内部策略的extract_entities相同"""
+        return self.segmenter.extract(
+            self._detect(language), text, getattr(self.strategy, 'type_priority', None))
+
+    def extract_entities_batch(self, texts, language='zh'):
+        """批量提取实体，结果与逐个调用extract_entities相同"""
+        return [self.extract_entities(text, language) for text in texts]
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import _pool_for, _redact_chunk
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """请求处理失败，返回给客户端的状态码和错误信息"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _Pending:
+    """等待识别的一个文本"""
+    __slots__ = ('text', 'doc_id', 'future')
+
+    def __init__(self, text, doc_id, future):
+        self.text = text
+        self.doc_id = doc_id
+        self.future = future
+
+
+def _ping():
+    """确认工作进程已完成初始化"""
+    return os.getpid()
+
+
+class RedactionServer:
+    """
+    常驻的隐私信息处理服务
+
+    策略只创建一次、词典只加载一次，请求不再为此付出启动开销。并发到达的文本合并为微批：
+    凑满max_batch个文本或max_batch_chars个字符，或者第一个文本等待超过max_delay后，
+    整批交给一次批量识别。识别在后台线程（workers为0）或工作进程池中进行，
+    同时在途的批次数量等于工作进程数，前一批处理期间到达的请求自动合并为下一批，
+    负载越高批次越大；空闲时单个文本只多等待max_delay。
+
+    接口（HTTP/1.1，JSON）:
+        POST /redact  {"text": "...", "doc_id": ...} 返回 {"text": "...", "entities": [...]}；
+                      {"texts": [...]} 返回 {"results": [{"text": ..., "entities": ...}, ...]}
+        GET /health   服务状态，工作进程初始化完成前status为"starting"
+        GET /stats    请求数、批次数、平均批大小、延迟分位数等统计信息
+    """
+
+    def __init__(self, redactor, workers=0, max_batch=64, max_batch_chars=65536, max_delay=0.002,
+                 max_body=16 << 20):
+        """
+        参数:
+            redactor: PrivacyRedactor实例，工作进程按其配置创建各自的处理器
+            workers: 工作进程数，为0时在当前进程的后台线程中识别
+            max_batch: 每批最多的文本数量
+            max_batch_chars: 每批最多的字符数，单个超长文本单独成批
+            max_delay: 批次中第一个文本最多等待其他文本的时间（秒），为0时不等待
+            max_body: 请求体的大小上限（字节）
+        """
+        if workers < 0:
+            raise ValueError(f"workers不能为负数: {workers}")
+        if max_batch < 1:
+            raise ValueError(f"max_batch必须为正整数: {max_batch}")
+        self.redactor = redactor
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_batch_chars = max_batch_chars
+        self.max_delay = max_delay
+        self.max_body = max_body
+        self.ready = False
+        self._queue = None
+        self._slots = None
+        self._executor = None
+        self._batcher = None
+        self._tasks = set()
+        self._started = time.monotonic()
+        self._latencies = deque(maxlen=4096)
+        self._stats = {'requests': 0, 'texts': 0, 'batches': 0, 'errors': 0, 'max_batch_size': 0}
+
+    # ---- 生命周期 ----
+
+    async def start(self):
+        """创建执行器并预热策略，完成后开始接受批次"""
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(self.workers, 1))
+        if self.workers:
+            # 以fork方式启动时_pool_for先在当前进程中加载词典，放到线程中执行，预热期间仍能响应/health
+            self._executor = await loop.run_in_executor(None, _pool_for, self.redactor, self.workers)
+            # 工作进程在第一次提交任务时才启动，预先提交任务使各进程完成初始化（加载词典）
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)))
+        else:
+            # 策略不保证线程安全，只使用一个后台线程
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix='cn-hpp-redact')
+            warmup = getattr(self.redactor.strategy, 'warmup', None)
+            if warmup is not None:
+                await loop.run_in_executor(self._executor, warmup)
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        self._started = time.monotonic()
+        self.ready = True
+        logger.info("隐私信息处理服务已就绪，工作进程数: %d", self.workers)
+
+    async def close(self):
+        """停止接受批次，等待在途批次完成后关闭执行器"""
+        self.ready = False
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(HTTPError(503, '服务正在关闭'))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # ---- 微批 ----
+
+    async def redact(self, text, doc_id=None):
+        """
+        提交一个文本，与同时到达的其他文本合并识别
+
+        返回:
+            (redacted_text, entities)，与PrivacyRedactor.redact_text的返回值相同
+        """
+        if not self.ready:
+            raise HTTPError(503, '服务尚未就绪')
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Pending(text, doc_id, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 先占用一个执行槽位再收集批次，槽位被占满期间到达的文本都会并入下一批
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+                chars = len(batch[0].text)
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch and chars < self.max_batch_chars:
+                    if self._queue.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            pending = await asyncio.wait_for(self._queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    else:
+                        pending = self._queue.get_nowait()
+                    batch.append(pending)
+                    chars += len(pending.text)
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        texts = [pending.text for pending in batch]
+        metrics = self.redactor.metrics
+        started = time.perf_counter()
+        try:
+            if self.workers:
+                results = await loop.run_in_executor(self._executor, _redact_chunk, texts)
+            else:
+                doc_ids = [pending.doc_id for pending in batch]
+                results = await loop.run_in_executor(self._executor, self.redactor.redact_batch, texts, doc_ids)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.exception("批量识别失败")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self._stats['batches'] += 1
+        self._stats['texts'] += len(batch)
+        self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+        metrics.observe('server_batch', time.perf_counter() - started)
+        metrics.count('server_batch_texts', len(batch))
+        # 工作进程中的处理器没有entity_sink，实体在当前进程中写出
+        sink = self.redactor.entity_sink if self.workers else None
+        for pending, result in zip(batch, results):
+            if sink is not None:
+                sink.write(pending.doc_id, result[1])
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    # ---- 统计 ----
+
+    def health(self):
+        """返回服务状态"""
+        return {
+            'status': 'ok' if self.ready else 'starting',
+            'strategy': type(self.redactor.strategy).__name__,
+            'workers': self.workers,
+            'pid': os.getpid()
+        }
+
+    def stats(self):
+        """
+        返回服务统计信息
+
+        返回:
+            stats: 请求数、文本数、批次数、错误数、平均和最大批大小、排队的文本数、
+                在途批次数、最近4096个请求的延迟分位数（毫秒）和运行时间（秒）
+        """
+        stats = dict(self._stats)
+        stats['mean_batch_size'] = stats['texts'] / stats['batches'] if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        stats['in_flight'] = len(self._tasks)
+        latencies = sorted(self._latencies)
+        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            stats[f'latency_ms_{name}'] = (latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000
+                                           if latencies else 0.0)
+        stats['uptime_seconds'] = time.monotonic() - self._started
+        if not self.workers:
+            cache = getattr(self.redactor.strategy, 'cache', None)
+            if cache is not None:
+                stats['cache'] = cache.stats()
+        return stats
+
+    # ---- HTTP ----
+
+    async def _dispatch(self, method, path, body):
+        if path == '/health':
+            if method != 'GET':
+                raise HTTPError(405, '只支持GET')
+            return (200 if self.ready else 503), self.health()
+        if path == '/stats':
+            if method != 'GET':
+                raise HTTPError(405, '只支持GET')
+            return 200, self.stats()
+        if path == '/redact':
+            if method != 'POST':
+                raise HTTPError(405, '只支持POST')
+            return 200, await self._redact_request(body)
+        raise HTTPError(404, f'不存在的路径: {path}')
+
+    async def _redact_request(self, body):
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, '请求体不是有效的JSON') from None
+        if not isinstance(request, dict):
+            raise HTTPError(400, '请求体必须是JSON对象')
+        started = time.perf_counter()
+        self._stats['requests'] += 1
+        if 'texts' in request:
+            texts = request['texts']
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise HTTPError(400, 'texts必须是字符串列表')
+            doc_ids = request.get('doc_ids')
+            if doc_ids is None:
+                doc_ids = [None] * len(texts)
+            elif not isinstance(doc_ids, list) or len(doc_ids) != len(texts):
+                raise HTTPError(400, 'doc_ids必须是与texts等长的列表')
+            results = await asyncio.gather(*(self.redact(text, doc_id) for text, doc_id in zip(texts, doc_ids)))
+            response = {'results': [_result(redacted, entities) for redacted, entities in results]}
+        else:
+            text = request.get('text')
+            if not isinstance(text, str):
+                raise HTTPError(400, '缺少text字段或text不是字符串')
+            response = _result(*await self.redact(text, request.get('doc_id')))
+        self._latencies.append(time.perf_counter() - started)
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接上的请求，支持HTTP/1.1长连接"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (len(parts) == 3 and parts[2] == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                try:
+                    if len(parts) != 3:
+                        raise HTTPError(400, '无效的请求行')
+                    method, target, _ = parts
+                    if 'chunked' in headers.get('transfer-encoding', '').lower():
+                        raise HTTPError(411, '需要Content-Length')
+                    try:
+                        length = int(headers.get('content-length', 0))
+                    except ValueError:
+                        raise HTTPError(400, '无效的Content-Length') from None
+                    if length > self.max_body:
+                        keep_alive = False
+                        raise HTTPError(413, f'请求体超过{self.max_body}字节')
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self._dispatch(method, target.split('?', 1)[0], body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    logger.exception("请求处理失败")
+                    status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n'
+                    f'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host='127.0.0.1', port=8765, unix_path=None):
+        """
+        启动服务，直到收到SIGINT或SIGTERM
+
+        先开始监听再预热策略，加载词典期间/health返回503（status为"starting"），/redact返回503。
+
+        参数:
+            host: 监听地址
+            port: 监听端口
+            unix_path: Unix套接字路径，指定时不监听TCP端口
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+            logger.info("监听 %s", unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            logger.info("监听 http://%s:%d", host, port)
+        stop = asyncio.get_running_loop().create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signum, stop.cancel)
+            except (NotImplementedError, RuntimeError):
+                # Windows的事件循环不支持信号处理，按Ctrl+C时由KeyboardInterrupt结束
+                pass
+        try:
+            async with server:
+                await self.start()
+                await stop
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.close()
+            if unix_path is not None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+
+def _result(redacted_text, entities):
+    return {'text': redacted_text, 'entities': [dict(entity) for entity in entities]}
+
+
+def serve(redactor, host='127.0.0.1', port=8765, unix_path=None, **options):
+    """
+    启动常驻的隐私信息处理服务，参数见RedactionServer和RedactionServer.serve_forever
+
+    参数:
+        redactor: PrivacyRedactor实例
+        host: 监听地址
+        port: 监听端口
+        unix_path: Unix套接字路径
+        **options: RedactionServer的其他参数，如workers、max_batch、max_delay
+    """
+    server = RedactionServer(redactor, **options)
+    asyncio.run(server.serve_forever(host, port, unix_path))
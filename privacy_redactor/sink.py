@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+import re
+import threading
+
+
+def _segment_pattern(path):
+    root, ext = os.path.splitext(path)
+    return root, ext or '.jsonl'
+
+
+def segment_paths(path):
+    """
+    返回JsonlEntitySink写出的全部分段文件，按写入顺序排列
+
+    参数:
+        path: 创建JsonlEntitySink时使用的路径
+    """
+    root, ext = _segment_pattern(path)
+    number = re.compile(re.escape(os.path.basename(root)) + r'\.(\d+)' + re.escape(ext) + '$')
+    segments = []
+    for candidate in glob.glob(glob.escape(root) + '.*' + glob.escape(ext)):
+        match = number.match(os.path.basename(candidate))
+        if match:
+            segments.append((int(match.group(1)), candidate))
+    return [candidate for _, candidate in sorted(segments)]
+
+
+def _truncate_partial_line(path, block_size=65536):
+    """
+    截掉中断时留下的不完整的最后一行，之后追加的记录不会接在半行后面
+
+    返回:
+        size: 截断后的文件大小
+    """
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+        return end
+
+
+class JsonlEntitySink:
+    """
+    以JSON Lines格式流式写出实体
+
+    每处理完一个文档立即追加写出，不需要在内存中保留全部实体。每条实体记录包含文档编号和位置：
+    {"doc": ..., "original": ..., "type": ..., "replacement": ..., "start": ..., "end": ...}；
+    按文档写出时每个文档一行：{"doc": ..., "entities": [...]}。
+    写入一个文档会使当前文件超过max_bytes时先切换到下一个分段文件，同一文档的记录总在同一个文件中。
+    entities.jsonl依次写为entities.00000.jsonl、entities.00001.jsonl……，再次打开时从最后一个分段继续追加，
+    中断时留下的不完整的最后一行先被截掉。
+    可以在多个线程中共用。
+    """
+
+    def __init__(self, path, per_document=False, max_bytes=64 << 20):
+        """
+        参数:
+            path: 输出路径，实际写出的文件名在扩展名前加上分段编号
+            per_document: 是否每个文档写一行，默认每个实体写一行
+            max_bytes: 单个分段文件的大小上限（字节），为None时不切换分段
+        """
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(f"max_bytes必须为正整数: {max_bytes}")
+        self.path = path
+        self.per_document = per_document
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        segments = segment_paths(path)
+        if segments:
+            root, ext = _segment_pattern(path)
+            last = segments[-1]
+            self._index = int(last[len(root) + 1:-len(ext)])
+        else:
+            self._index = 0
+
+    def _segment_path(self, index):
+        root, ext = _segment_pattern(self.path)
+        return f'{root}.{index:05d}{ext}'
+
+    def _open(self):
+        path = self._segment_path(self._index)
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if os.path.exists(path):
+            _truncate_partial_line(path)
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+
+    def _encode(self, doc_id, entities):
+        if self.per_document:
+            record = {'doc': doc_id, 'entities': [dict(entity) for entity in entities]}
+            return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        return b''.join(
+            json.dumps(dict(entity, doc=doc_id), ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            for entity in entities
+        )
+
+    def write(self, doc_id, entities):
+        """
+        写出一个文档的实体
+
+        参数:
+            doc_id: 文档编号，如文件路径
+            entities: 实体列表或entity.EntityBatch，位置为实体在文档中的位置
+        """
+        data = self._encode(doc_id, entities)
+        if not data:
+            return
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self.max_bytes is not None and self._size and self._size + len(data) > self.max_bytes:
+                self._file.close()
+                self._index += 1
+                self._open()
+            self._file.write(data)
+            # 每个文档写完后立即写入磁盘，中断时最多丢失正在写的一行
+            self._file.flush()
+            self._size += len(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path):
+    """
+    逐行读取JsonlEntitySink写出的记录，不一次性加载到内存
+
+    参数:
+        path: 创建JsonlEntitySink时使用的路径，也可以是单个分段文件的路径
+
+    返回:
+        生成器，每项为一条记录（实体记录或文档记录）
+    """
+    paths = segment_paths(path) or ([path] if os.path.exists(path) else [])
+    for segment in paths:
+        with open(segment, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 中断时可能留下不完整的最后一行
+                    continue
+
+
+def iter_entities(path, doc_id=None):
+    """
+    逐个读取实体，按文档写出的记录展开为实体记录
+
+    参数:
+        path: 同iter_records
+        doc_id: 只返回该文档的实体，为None时返回全部
+
+    返回:
+        生成器，每项为带有doc字段的实体字典
+    """
+    for record in iter_records(path):
+        if doc_id is not None and record.get('doc') != doc_id:
+            continue
+        if 'entities' in record:
+            for entity in record['entities']:
+                entity['doc'] = record['doc']
+                yield entity
+        else:
+            yield record
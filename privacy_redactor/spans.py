@@ -0,0 +1,151 @@
+from bisect import bisect_right
+
+from .utils import ENTITY_TYPE_PRIORITY
+from .matcher import DictionaryMatcher
+
+
+class OffsetMap:
+    """
+    原文与脱敏后文本之间的位置映射
+
+    每个替换片段记录为 (原文起始, 原文结束, 脱敏后起始, 脱敏后结束)，
+    片段之外的字符两边一一对应，位置换算只需一次二分查找。
+    """
+
+    def __init__(self, segments):
+        """
+        参数:
+            segments: 按位置排序的替换片段列表
+        """
+        self.segments = segments
+        self._original_starts = [segment[0] for segment in segments]
+        self._redacted_starts = [segment[2] for segment in segments]
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    @staticmethod
+    def _convert(starts, segments, pos, source, target):
+        i = bisect_right(starts, pos) - 1
+        if i < 0:
+            return pos
+        segment = segments[i]
+        # 落在被替换片段内部的位置映射到替换片段的起始位置
+        if pos < segment[source + 1]:
+            return segment[target]
+        return segment[target + 1] + (pos - segment[source + 1])
+
+    def to_redacted(self, pos):
+        """将原文中的位置换算为脱敏后文本中的位置"""
+        return self._convert(self._original_starts, self.segments, pos, 0, 2)
+
+    def to_original(self, pos):
+        """将脱敏后文本中的位置换算为原文中的位置"""
+        return self._convert(self._redacted_starts, self.segments, pos, 2, 0)
+
+
+def locate_entities(text, entities):
+    """
+    为没有位置信息的实体补全位置
+
+    没有start/end的实体（例如自定义策略只给出原文）按原文在文本中的每次出现展开为多个实体，
+    所有原文通过一个词典自动机一次扫描定位。
+
+    参数:
+        text: 原始文本
+        entities: 实体列表
+
+    返回:
+        located: 全部带有位置信息的实体列表
+    """
+    located = []
+    originals = {}
+    for entity in entities:
+        if 'start' in entity and 'end' in entity:
+            located.append(entity)
+        elif entity.get('original'):
+            originals.setdefault(entity['original'], entity)
+    if originals:
+        matcher = DictionaryMatcher(list(originals))
+        for start, end, _ in matcher.iter_matches(text):
+            located.append(dict(originals[text[start:end]], start=start, end=end))
+    return located
+
+
+def resolve_overlaps(entities, priority=None):
+    """
+    解决实体之间的重叠
+
+    按类型优先级从高到低（同优先级时较长者、较靠前者优先）依次放入区间索引，
+    与已放入的区间重叠的实体被丢弃。
+
+    参数:
+        entities: 带有位置信息的实体列表
+        priority: 实体类型到优先级的映射，默认为utils.ENTITY_TYPE_PRIORITY
+
+    返回:
+        kept: 互不重叠的实体列表，按起始位置排序
+    """
+    if priority is None:
+        priority = ENTITY_TYPE_PRIORITY
+    ranked = sorted(
+        entities,
+        key=lambda e: (-priority.get(e['type'], 0), e['start'] - e['end'], e['start'])
+    )
+
+    starts, ends, kept = [], [], []
+    for entity in ranked:
+        start, end = entity['start'], entity['end']
+        if end <= start:
+            continue
+        i = bisect_right(starts, start)
+        if i and ends[i - 1] > start:
+            continue
+        if i < len(starts) and starts[i] < end:
+            continue
+        starts.insert(i, start)
+        ends.insert(i, end)
+        kept.insert(i, entity)
+    return kept
+
+
+def redact_spans(text, entities, priority=None, pseudonymizer=None):
+    """
+    按实体位置对文本进行替换
+
+    先补全位置并解决重叠，再按顺序拼接未替换的原文片段和替换文本，一次join生成结果。
+
+    参数:
+        text: 原始文本
+        entities: 实体列表
+        priority: 实体类型到优先级的映射，默认为utils.ENTITY_TYPE_PRIORITY
+        pseudonymizer: pseudonym.Pseudonymizer实例，提供时姓名、证件号等替换为由密钥派生的确定性替代文本
+
+    返回:
+        redacted_text: 脱敏后的文本
+        entities: 实际替换的实体列表，按起始位置排序
+        offset_map: 原文与脱敏后文本之间的位置映射
+    """
+    kept = resolve_overlaps(locate_entities(text, entities), priority)
+    if pseudonymizer is not None:
+        kept = [pseudonymizer.apply(entity) for entity in kept]
+
+    parts = []
+    segments = []
+    pos = 0
+    redacted_pos = 0
+    for entity in kept:
+        start, end = entity['start'], entity['end']
+        replacement = entity['replacement']
+        parts.append(text[pos:start])
+        parts.append(replacement)
+        redacted_pos += start - pos
+        segments.append((start, end, redacted_pos, redacted_pos + len(replacement)))
+        redacted_pos += len(replacement)
+        pos = end
+    parts.append(text[pos:])
+
+    return ''.join(parts), kept, OffsetMap(segments)
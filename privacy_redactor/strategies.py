@@ -1,10 +1,55 @@
+import os
 import re
 import json
+import hashlib
+import logging
+import threading
+from bisect import bisect_right
 from collections import defaultdict
 
-import jieba
-import jieba.posseg as pseg
-from .utils import REGEX_PATTERNS, MEDICAL_TERMS_TO_IGNORE
+from .utils import (MEDICAL_TERMS_TO_IGNORE, POS_ENTITY_TYPES, ENTITY_TYPE_PRIORITY, NAME_CUE_WORDS,
+                    COMMON_SURNAMES, LOCATION_SUFFIXES, ORGANIZATION_SUFFIXES)
+from .patterns import PatternEngine
+from .matcher import DictionaryMatcher, leftmost_longest, matches_to_entities
+from .spans import resolve_overlaps, redact_spans
+from .cache import segment_key
+from .segmenter import Segmenter, iter_sentences
+from .metrics import NULL_METRICS
+from .tokenizer import add_medical_terms, default_snapshot_path, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 批量识别时拼接文本用的分隔符，任何内置规则和分词结果都不会跨越它
+_BATCH_SEPARATOR = '\x00'
+
+# 人名线索词之后紧跟一个像人名的短词（2-4个汉字，其后是标点、空白或文本结尾）
+_NAME_CUE = re.compile(
+    '(?:' + '|'.join(map(re.escape, NAME_CUE_WORDS)) + r')[：:\s]*([\u4e00-\u9fa5·]{2,4})(?=[，,。；;、\s（(]|$)')
+_NAME_TYPES = ('NAME', 'DOCTOR_NAME')
+# 未被任何实体覆盖的长数字串可能是残缺或格式异常的证件号、电话号码
+_DIGIT_RUN = re.compile(r'\d[\d\s-]{4,}[\dXx]')
+# jieba.posseg在这些字符组成的词块内部分词，各词块的分词结果互不影响
+_POS_BLOCK = re.compile(r'[\u4e00-\u9fd5a-zA-Z0-9+#&._]+')
+# 词块中出现常见姓氏、地名后缀或机构名后缀时才可能包含人名、地名、机构名
+_POS_CANDIDATE = re.compile(
+    '[' + COMMON_SURNAMES + LOCATION_SUFFIXES + ']|' + '|'.join(map(re.escape, ORGANIZATION_SUFFIXES)))
+
+# jieba在第一次分词时才导入，医疗词典每个进程只加载一次
+_jieba_lock = threading.Lock()
+_pseg = None
+# jieba的词典由进程内所有策略共享，记录当前加载的词典：(快照的绝对路径, 快照的内容摘要)，
+# 逐个加入医疗词表时为 (None, None)，尚未加载时为None
+_loaded_dictionary = None
+
+
+def _get_pseg():
+    """导入jieba.posseg，导入本身需要加载词性标注模型，耗时较长"""
+    global _pseg
+    if _pseg is None:
+        import jieba.posseg
+        _pseg = jieba.posseg
+    return _pseg
+
 
 class MedicalStrategy:
     """
@@ -13,24 +58,178 @@ class MedicalStrategy:
     用于识别和处理中文医疗文本中的敏感信息，如患者姓名、身份证号、电话号码等。
     """
     
-    def __init__(self, use_llm=False, llm_config=None):
+    def __init__(self, use_llm=False, llm_config=None, custom_patterns=None, dictionaries=None,
+                 type_priority=None, cache=None, llm_mode='all', llm_samples=1, min_confidence=0.5,
+                 segmenter=None, pos_gate=True, tokenizer_snapshot=None):
         """
         初始化中文医疗文本隐私处理策略
         
         参数:
             use_llm: 是否使用大语言模型增强识别能力
             llm_config: 大语言模型配置信息
+            custom_patterns: 用户自定义的正则模式，实体类型到正则表达式的映射，
+                优先级低于内置模式
+            dictionaries: 用户词典，实体类型到词条列表（或每行一个词条的文件路径）的映射，
+                如 {'NAME': 患者名册, 'ORGANIZATION': 医院名称列表}
+            type_priority: 实体重叠时的类型优先级，会覆盖utils.ENTITY_TYPE_PRIORITY中的同名项
+            cache: 实体缓存（cache.EntityCache），重复出现的文本片段直接使用缓存的识别结果
+            llm_mode: 'all' 将所有文本交给大语言模型，'cascade' 只将规则识别结果不确定的句子交给大语言模型
+            llm_samples: 每个片段的采样次数，大于1时多次采样投票（见llm.vote_entities），
+                实体中的confidence为其得票比例
+            min_confidence: 投票时保留实体所需的得票比例
+            segmenter: 'all' 模式下把文本打包、切分为大语言模型请求的Segmenter，默认为Segmenter()
+            pos_gate: 是否只对包含常见姓氏、地名后缀或机构名后缀的词块做词性标注，
+                生命体征、检验结果等不含候选字的内容不再分词；为False时对全部文本做词性标注
+            tokenizer_snapshot: tokenizer.build_snapshot生成的分词词典快照，第一次分词时直接恢复jieba的状态，
+                默认读取环境变量CN_HPP_JIEBA_SNAPSHOT；快照无法使用时给出警告并逐个加载医疗词表
         """
+        if llm_mode not in ('all', 'cascade'):
+            raise ValueError(f"不支持的大语言模型模式: {llm_mode}，可选值为: all, cascade")
         self.use_llm = use_llm
         self.llm_config = llm_config or {}
+        self._llm_client = None
+        self.llm_mode = llm_mode
+        self.llm_samples = llm_samples
+        self.min_confidence = min_confidence
+        self.segmenter = segmenter or Segmenter()
+        self.pos_gate = pos_gate
+        self.tokenizer_snapshot = tokenizer_snapshot or default_snapshot_path()
+        self._snapshot_path = os.path.abspath(self.tokenizer_snapshot) if self.tokenizer_snapshot else None
+        # 快照中可能合并了用户词典，分词结果随快照内容变化，实际加载的快照的内容摘要计入配置指纹
+        self._tokenizer_id = None
+        # fingerprint()的计算结果，每个片段查询缓存时都要用到；修改配置的方法将其清空
+        self._fingerprint = None
+        # 交给大语言模型前检查的片段数和实际交给大语言模型的片段数
+        self._llm_segments = 0
+        self._llm_escalated = 0
+        self.cache = cache
+        # 各识别阶段的耗时记录到metrics（见metrics.Metrics），由PrivacyRedactor设置
+        self.metrics = NULL_METRICS
+        # redact_text使用的pseudonym.Pseudonymizer，为None时使用规则给出的替换文本
+        self.pseudonymizer = None
+        self.type_priority = dict(ENTITY_TYPE_PRIORITY, **(type_priority or {}))
+        self.pattern_engine = PatternEngine()
+        for entity_type, pattern in (custom_patterns or {}).items():
+            self.pattern_engine.add_pattern(entity_type, pattern)
+        self.dictionary_matcher = DictionaryMatcher()
+        for entity_type, words in (dictionaries or {}).items():
+            self.add_dictionary(entity_type, words)
+        
+    def enable_llm(self, model_name="qwen2:7b", url="http://127.0.0.1:11434", llm_mode=None,
+                   llm_samples=None, min_confidence=None, **client_options):
+        """
+        启用大语言模型增强识别
+        
+        参数:
+            model_name: 大语言模型名称
+            url: 大语言模型API地址
+            llm_mode: 'all' 或 'cascade'，为None时保持当前模式，见__init__
+            llm_samples: 每个片段的采样次数，大于1时多次采样投票，为None时保持当前设置
+            min_confidence: 投票时保留实体所需的得票比例，为None时保持当前设置
+            **client_options: 传给llm.OllamaClient的其他参数，如max_concurrency、timeout、retries
+        """
+        if llm_mode is not None:
+            if llm_mode not in ('all', 'cascade'):
+                raise ValueError(f"不支持的大语言模型模式: {llm_mode}，可选值为: all, cascade")
+            self.llm_mode = llm_mode
+        if llm_samples is not None:
+            self.llm_samples = llm_samples
+        if min_confidence is not None:
+            self.min_confidence = min_confidence
+        self.use_llm = True
+        self.llm_config.update(model_name=model_name, url=url, **client_options)
+        self._llm_client = None
+        self._fingerprint = None
+        
+    def _get_llm_client(self):
+        """按llm_config创建大语言模型客户端，连接池在多次调用之间复用"""
+        if self._llm_client is None:
+            from .llm import OllamaClient
+            self._llm_client = OllamaClient(**self.llm_config)
+        return self._llm_client
+        
+    def warmup(self):
+        """预先导入jieba并加载词典，供长期运行的进程或工作进程在处理文本前调用"""
         self._load_medical_dictionary()
+        _get_pseg()
+        import jieba
+        jieba.initialize()
         
     def _load_medical_dictionary(self):
-        """加载医疗词典"""
-        # 加载医疗专用词典到jieba
-        for term in MEDICAL_TERMS_TO_IGNORE:
-            jieba.add_word(term, freq=1000, tag='n')
+        """
+        加载医疗词典，在第一次分词前调用
+
+        同一词典每个进程只加载一次。快照通过版本校验并加载成功后才记录其内容摘要；
+        要求的快照与进程中已加载的词典不同时改为加载该快照，此后进程内所有策略都使用它。
+        快照无法使用而进程中已加载了其他快照时沿用该快照（其中已合并医疗词表）。
+        """
+        global _loaded_dictionary
+        loaded = _loaded_dictionary
+        if loaded is not None and loaded[0] == self._snapshot_path:
+            self._tokenizer_id = loaded[1]
+            return
+        with _jieba_lock:
+            loaded = _loaded_dictionary
+            if loaded is not None and loaded[0] == self._snapshot_path:
+                self._tokenizer_id = loaded[1]
+                return
+            if self._snapshot_path is not None:
+                try:
+                    # 快照中已合并医疗词表
+                    header = load_snapshot(self._snapshot_path)
+                except (OSError, ValueError) as e:
+                    logger.warning("分词词典快照无法使用，将逐个加载词条: %s", e)
+                    self._snapshot_path = None
+                else:
+                    if loaded is not None:
+                        logger.warning("进程中的jieba词典已替换为快照 %s，其他策略随之使用该快照", self._snapshot_path)
+                    _loaded_dictionary = (self._snapshot_path, header['id'])
+                    self._tokenizer_id = header['id']
+                    return
+            if loaded is not None:
+                # jieba的词典不能卸载，沿用已加载的快照
+                self._snapshot_path, self._tokenizer_id = loaded
+                return
+            import jieba
+            # 加载医疗专用词典到jieba
+            add_medical_terms(jieba)
+            _loaded_dictionary = (None, None)
+            self._tokenizer_id = None
             
+    def fingerprint(self):
+        """
+        策略配置的指纹，用作实体缓存键的一部分
+        
+        正则规则、用户词典、医疗词表、分词词典快照、类型优先级或LLM配置变化后指纹随之改变，
+        旧的缓存项不会再被命中。计算结果会被保存，直接修改type_priority、pos_gate等属性后
+        需要调用invalidate_fingerprint()。
+        """
+        # 指纹取决于实际加载的分词词典
+        self._load_medical_dictionary()
+        # 直接通过pattern_engine、dictionary_matcher添加的规则和词条也要让指纹失效，两者的指纹本身已被保存
+        state = (self._tokenizer_id, self.pattern_engine.fingerprint(), self.dictionary_matcher.fingerprint())
+        if self._fingerprint is not None and self._fingerprint[0] == state:
+            return self._fingerprint[1]
+        config = (
+            type(self).__qualname__,
+            self.pattern_engine.fingerprint(),
+            self.dictionary_matcher.fingerprint(),
+            sorted(MEDICAL_TERMS_TO_IGNORE),
+            sorted(POS_ENTITY_TYPES.items()),
+            self.pos_gate and _POS_CANDIDATE.pattern,
+            self._tokenizer_id,
+            sorted(self.type_priority.items()),
+            self.use_llm and (self.llm_mode, self.llm_samples, self.min_confidence, repr(self.segmenter),
+                              sorted(self.llm_config.items()))
+        )
+        digest = hashlib.sha256(repr(config).encode('utf-8')).hexdigest()
+        self._fingerprint = (state, digest)
+        return digest
+        
+    def invalidate_fingerprint(self):
+        """清空保存的指纹，直接修改策略属性后调用，下次fingerprint()时重新计算"""
+        self._fingerprint = None
+        
     def get_entities(self, text):
         """
         从文本中提取实体
@@ -41,136 +240,315 @@ class MedicalStrategy:
         返回:
             entities: 识别出的实体信息列表
         """
-        entities = []
+        if self.cache is None:
+            return self._get_entities(text)
+        key = segment_key(text, self.fingerprint())
+        entities = self.cache.get(key)
+        if entities is None:
+            entities = self._get_entities(text)
+            self.cache.put(key, entities)
+        return entities
+        
+    def _get_entities(self, text):
+        """从文本中提取实体，不使用缓存"""
+        return self._get_entities_batch([text])[0]
+        
+    def extract_entities(self, text, language='zh'):
+        """
+        从文本中提取实体，供PrivacyRedactor和文件处理器调用
+        
+        参数:
+            text: 要处理的文本
+            language: 文本语言
+            
+        返回:
+            entities: 识别出的实体信息列表
+        """
+        return self.get_entities(text)
+        
+    def extract_entities_batch(self, texts, language='zh'):
+        """
+        批量提取实体，结果与对每个文本分别调用extract_entities相同
+        
+        所有文本拼接后只做一次分词，适合Word文档中大量短段落、表格单元格的场景。
+        
+        参数:
+            texts: 文本列表
+            language: 文本语言
+            
+        返回:
+            results: 与texts一一对应的实体列表
+        """
+        texts = list(texts)
+        if self.cache is None:
+            return self._get_entities_batch(texts)
+        
+        # 只识别未命中缓存的文本，同一批中重复的文本只识别一次
+        fingerprint = self.fingerprint()
+        keys = [segment_key(text, fingerprint) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+        missing = {}
+        for key, text, entities in zip(keys, texts, results):
+            if entities is None:
+                missing.setdefault(key, text)
+        if not missing:
+            return results
+        computed = dict(zip(missing, self._get_entities_batch(list(missing.values()))))
+        self.cache.put_many(computed.items())
+        return [
+            entities if entities is not None else [dict(entity) for entity in computed[key]]
+            for key, entities in zip(keys, results)
+        ]
+        
+    def _get_entities_batch(self, texts):
+        """批量提取实体，不使用缓存"""
+        metrics = self.metrics
         
         # 1. 使用正则表达式识别结构化信息
-        entities.extend(self._extract_by_regex(text))
+        with metrics.timer('regex'):
+            results = [self._extract_by_regex(text) for text in texts]
         
         # 2. 使用jieba进行分词和命名实体识别
-        entities.extend(self._extract_by_jieba(text))
+        with metrics.timer('jieba'):
+            for entities, jieba_entities in zip(results, self._extract_by_jieba_batch(texts)):
+                entities.extend(jieba_entities)
         
-        # 3. 使用大语言模型增强识别（如果启用）
+        # 3. 使用大语言模型增强识别（如果启用），所有请求一次提交并发发送
         if self.use_llm:
-            entities.extend(self._extract_by_llm(text))
+            with metrics.timer('llm'):
+                for entities, llm_entities in zip(results, self._extract_by_llm_cascade(texts, results)):
+                    entities.extend(llm_entities)
+        
+        # 解决不同来源实体之间的重叠
+        with metrics.timer('resolve_overlaps'):
+            return [resolve_overlaps(entities, self.type_priority) for entities in results]
+        
+    def _extract_by_llm_cascade(self, texts, detected):
+        """
+        按llm_mode选择交给大语言模型的片段并识别
+        
+        'all' 模式下所有文本按token预算打包、切分为片段（见segmenter.Segmenter），
+        短段落合并发送，长文本不会超出模型的上下文长度；'cascade' 模式下只交出规则识别结果不确定的句子。
+        片段中识别出的实体位置换算回所在文本。
+        
+        参数:
+            texts: 文本列表
+            detected: 与texts对应的规则识别结果
             
-        # 去重
-        unique_entities = []
-        seen = set()
-        for entity in entities:
-            text_span = entity['original']
-            if text_span not in seen:
-                seen.add(text_span)
-                unique_entities.append(entity)
-                
-        return unique_entities
+        返回:
+            results: 与texts一一对应的大语言模型识别结果
+        """
+        if self.llm_mode == 'all':
+            def detect(pieces):
+                self._llm_segments += len(pieces)
+                self._llm_escalated += len(pieces)
+                return self._extract_by_llm_batch(pieces)
+            return self.segmenter.extract_many(detect, texts, self.type_priority)
+        
+        results = [[] for _ in texts]
+        segments = []
+        for i, (text, entities) in enumerate(zip(texts, detected)):
+            for start, end in iter_sentences(text):
+                if not text[start:end].strip():
+                    continue
+                self._llm_segments += 1
+                if self._is_uncertain(text, start, end, entities):
+                    segments.append((i, start, end))
+        self._llm_escalated += len(segments)
+        if not segments:
+            return results
+        
+        found = self._extract_by_llm_batch([texts[i][start:end] for i, start, end in segments])
+        for (i, start, _), entities in zip(segments, found):
+            for entity in entities:
+                entity['start'] += start
+                entity['end'] += start
+            results[i].extend(entities)
+        return results
+        
+    @staticmethod
+    def _is_uncertain(text, start, end, entities):
+        """
+        判断规则识别结果在句子范围内是否不确定
+        
+        人名线索词之后紧跟的短词没有被识别为人名，或者存在未被任何实体覆盖的长数字串时，
+        认为该句需要大语言模型复核。
+        """
+        def covered(span_start, span_end, types=None):
+            return any(
+                entity['start'] < span_end and entity['end'] > span_start
+                and (types is None or entity['type'] in types)
+                for entity in entities
+            )
+        
+        for cue in _NAME_CUE.finditer(text, start, end):
+            if not covered(cue.start(1), cue.end(1), _NAME_TYPES):
+                return True
+        for run in _DIGIT_RUN.finditer(text, start, end):
+            if not covered(run.start(), run.end()):
+                return True
+        return False
+        
+    def llm_stats(self):
+        """
+        返回大语言模型调用的统计信息
+        
+        返回:
+            stats: 包含segments（检查的片段数）、escalated（交给模型的片段数）、
+                escalation_rate（交给模型的比例）的字典
+        """
+        segments = self._llm_segments
+        return {
+            'segments': segments,
+            'escalated': self._llm_escalated,
+            'escalation_rate': self._llm_escalated / segments if segments else 0.0
+        }
+        
+    def add_pattern(self, entity_type, pattern, replacement=None, flags=0):
+        """
+        添加自定义正则模式，参数含义见PatternEngine.add_pattern
+        """
+        self.pattern_engine.add_pattern(entity_type, pattern, replacement, flags)
+        self._fingerprint = None
+        
+    def add_dictionary(self, entity_type, words):
+        """
+        添加用户词典，词典中的词条在文本中的每次出现都会被识别
+        
+        参数:
+            entity_type: 实体类型
+            words: 词条列表，或每行一个词条的UTF-8文本文件路径
+        """
+        if isinstance(words, str):
+            with open(words, 'r', encoding='utf-8') as f:
+                words = [line.strip() for line in f]
+        self.dictionary_matcher.add_words(words, entity_type)
+        self._fingerprint = None
         
     def _extract_by_regex(self, text):
         """使用正则表达式提取结构化敏感信息"""
-        entities = []
-        
-        for entity_type, pattern in REGEX_PATTERNS.items():
-            for match in re.finditer(pattern, text):
-                # 获取匹配组，如果有捕获组，使用第一个非空的捕获组
-                if match.groups():
-                    for group in match.groups():
-                        if group:
-                            start = text.find(group, match.start())
-                            end = start + len(group)
-                            entity = {
-                                'original': group,
-                                'type': entity_type,
-                                'replacement': f'[{entity_type}]',
-                                'start': start,
-                                'end': end
-                            }
-                            entities.append(entity)
-                            break
-                else:
-                    # 如果没有捕获组，使用整个匹配
-                    entity = {
-                        'original': match.group(),
-                        'type': entity_type,
-                        'replacement': f'[{entity_type}]',
-                        'start': match.start(),
-                        'end': match.end()
-                    }
-                    entities.append(entity)
-                    
-        return entities
+        return self.pattern_engine.extract(text)
         
     def _extract_by_jieba(self, text):
         """使用jieba分词提取命名实体"""
-        entities = []
-        
-        # 使用jieba的词性标注功能
-        words = pseg.cut(text)
-        
-        # 姓名识别
-        for word, flag in words:
-            if flag == 'nr' and len(word) >= 2:  # 人名
-                # 搜索所有出现的位置
-                start = 0
-                while True:
-                    start = text.find(word, start)
-                    if start == -1:
-                        break
-                        
-                    entity = {
-                        'original': word,
-                        'type': 'NAME',
-                        'replacement': '[姓名]',
-                        'start': start,
-                        'end': start + len(word)
-                    }
-                    entities.append(entity)
-                    start += len(word)
-            
-            elif flag == 'ns':  # 地名
-                # 搜索所有出现的位置
-                start = 0
-                while True:
-                    start = text.find(word, start)
-                    if start == -1:
-                        break
-                        
-                    entity = {
-                        'original': word,
-                        'type': 'LOCATION',
-                        'replacement': '[地址]',
-                        'start': start,
-                        'end': start + len(word)
-                    }
-                    entities.append(entity)
-                    start += len(word)
-                    
-            elif flag == 'nt':  # 机构名
-                # 搜索所有出现的位置
-                start = 0
-                while True:
-                    start = text.find(word, start)
-                    if start == -1:
-                        break
-                        
-                    entity = {
-                        'original': word,
-                        'type': 'ORGANIZATION',
-                        'replacement': '[机构]',
-                        'start': start,
-                        'end': start + len(word)
-                    }
-                    entities.append(entity)
-                    start += len(word)
-                    
-        return entities
+        return self._extract_by_jieba_batch([text])[0]
+        
+    def _extract_by_jieba_batch(self, texts):
+        """
+        对多个文本一次分词提取命名实体
+        
+        文本用分隔符拼接后调用一次pseg.cut，jieba会在分隔符处切分，
+        每个词按累计长度换算回所属文本。每个文本只匹配本文本中识别出的表层形式，
+        因此结果与逐个文本处理相同。启用pos_gate时只对候选词块做词性标注，
+        识别出的表层形式仍在全部文本中匹配。
+        """
+        self._load_medical_dictionary()
+        
+        joined = _BATCH_SEPARATOR.join(texts)
+        starts = []
+        pos = 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text) + 1
+        
+        # 收集每个文本中词性标注识别出的人名、地名、机构名的表层形式
+        surface_forms = DictionaryMatcher()
+        forms_by_text = [{} for _ in texts]
+        for pos, word, flag in self._pos_tag(joined):
+            entity_type = POS_ENTITY_TYPES.get(flag)
+            if entity_type is None:
+                continue
+            if entity_type == 'NAME' and len(word) < 2:
+                continue
+            # 用户词典中已有的词条以用户词典的类型为准
+            if word in self.dictionary_matcher:
+                continue
+            index = bisect_right(starts, pos) - 1
+            forms_by_text[index].setdefault(word, entity_type)
+            surface_forms.add_word(word, entity_type)
+        
+        # 用自动机一次扫描找出所有出现位置，与用户词典的匹配重叠时保留最长的
+        matches = [[] for _ in texts]
+        for start, end, _ in surface_forms.iter_matches(joined):
+            index = bisect_right(starts, start) - 1
+            entity_type = forms_by_text[index].get(joined[start:end])
+            if entity_type is not None:
+                matches[index].append((start - starts[index], end - starts[index], entity_type))
+        if len(self.dictionary_matcher):
+            for start, end, entity_type in self.dictionary_matcher.iter_matches(joined):
+                index = bisect_right(starts, start) - 1
+                matches[index].append((start - starts[index], end - starts[index], entity_type))
+        
+        return [
+            matches_to_entities(text, leftmost_longest(text_matches))
+            for text, text_matches in zip(texts, matches)
+        ]
     
+    def _pos_tag(self, text):
+        """
+        对文本做词性标注
+        
+        jieba.posseg在词块（连续的汉字、字母和数字）内部独立分词，
+        所以只对候选词块标注与对全文标注，候选词块中的结果完全相同。
+        候选词块以分隔符拼接后调用一次pseg.cut，词的位置换算回原文。
+        
+        返回:
+            生成器，每项为 (词在text中的起始位置, 词, 词性)
+        """
+        pseg = _get_pseg()
+        if not self.pos_gate:
+            pos = 0
+            for word, flag in pseg.cut(text):
+                yield pos, word, flag
+                pos += len(word)
+            return
+        
+        blocks = [
+            match.span() for match in _POS_BLOCK.finditer(text)
+            if _POS_CANDIDATE.search(text, *match.span())
+        ]
+        if not blocks:
+            return
+        # 每个候选词块在拼接文本中的起始位置
+        offsets = []
+        pos = 0
+        for start, end in blocks:
+            offsets.append(pos)
+            pos += end - start + 1
+        pos = 0
+        for word, flag in pseg.cut(_BATCH_SEPARATOR.join(text[start:end] for start, end in blocks)):
+            if word != _BATCH_SEPARATOR:
+                index = bisect_right(offsets, pos) - 1
+                yield blocks[index][0] + pos - offsets[index], word, flag
+            pos += len(word)
+        
     def _extract_by_llm(self, text):
-        """使用大语言模型增强识别能力（需要实现具体的调用逻辑）"""
-        entities = []
+        """使用大语言模型增强识别能力"""
+        return self._extract_by_llm_batch([text])[0]
         
-        # TODO: 实现大语言模型调用逻辑
-        # 此处需要根据实际使用的大语言模型接口实现
+    def _extract_by_llm_batch(self, texts):
+        """
+        使用大语言模型识别多个文本中的实体
         
-        return entities
+        所有请求通过同一个连接池并发发送，调用失败的文本只使用规则识别的结果。
+        llm_samples大于1时多次采样投票。
+        """
+        from .llm import build_prompt, parse_entities, vote_entities
+        
+        if self.llm_samples > 1:
+            return vote_entities(self._get_llm_client(), texts, self.llm_samples, self.min_confidence)
+        
+        results = [[] for _ in texts]
+        # 空白文本不需要请求模型
+        indexes = [i for i, text in enumerate(texts) if text.strip()]
+        responses = self._get_llm_client().generate_many(
+            [build_prompt(texts[i]) for i in indexes], format='json')
+        for i, response in zip(indexes, responses):
+            if isinstance(response, Exception):
+                logger.warning("大语言模型调用失败，仅使用规则识别结果: %s", response)
+                continue
+            results[i] = parse_entities(texts[i], response.get('response'))
+        return results
     
     def redact_text(self, text, entities):
         """
@@ -182,27 +560,218 @@ class MedicalStrategy:
             
         返回:
             redacted_text: 脱敏后的文本
-            entity_map: 实体替换映射
+            entity_map: 实体替换映射，替换文本 -> 原文。设置了pseudonymizer时每个实体的替代文本各不相同，
+                否则同类实体共用一个替换文本，只保留最后一个原文
         """
-        # 按照起始位置排序实体，从后向前替换，避免位置偏移问题
-        sorted_entities = sorted(entities, key=lambda e: e.get('start', 0), reverse=True)
+        redacted_text, applied, _ = redact_spans(text, entities, self.type_priority, self.pseudonymizer)
         
-        redacted_text = text
+        # 记录替换映射
         entity_map = {}
+        for entity in applied:
+            entity_map[entity['replacement']] = entity['original']
+            
+        return redacted_text, entity_map
+
+
+
+class RegexStrategy:
+    """
+    只使用正则表达式的隐私处理策略
+    
+    识别身份证号、电话号码、住院号等结构化信息，不需要分词，速度最快，
+    适合英文文本、非医疗文本，或作为自定义策略的基类。
+    """
+    
+    def __init__(self, custom_patterns=None, type_priority=None):
+        """
+        初始化正则表达式策略
         
-        for entity in sorted_entities:
-            original = entity['original']
-            replacement = entity['replacement']
+        参数:
+            custom_patterns: 用户自定义的正则模式，实体类型到正则表达式的映射，优先级低于内置模式
+            type_priority: 实体重叠时的类型优先级，会覆盖utils.ENTITY_TYPE_PRIORITY中的同名项
+        """
+        self.type_priority = dict(ENTITY_TYPE_PRIORITY, **(type_priority or {}))
+        self.pattern_engine = PatternEngine()
+        for entity_type, pattern in (custom_patterns or {}).items():
+            self.pattern_engine.add_pattern(entity_type, pattern)
+        self.metrics = NULL_METRICS
+        # redact_text使用的pseudonym.Pseudonymizer，为None时使用规则给出的替换文本
+        self.pseudonymizer = None
+        
+    def add_pattern(self, entity_type, pattern, replacement=None, flags=0):
+        """
+        添加自定义正则模式，参数含义见PatternEngine.add_pattern
+        """
+        self.pattern_engine.add_pattern(entity_type, pattern, replacement, flags)
+        
+    def fingerprint(self):
+        """策略配置的指纹，正则规则或类型优先级变化后随之改变"""
+        config = (type(self).__qualname__, self.pattern_engine.fingerprint(), sorted(self.type_priority.items()))
+        return hashlib.sha256(repr(config).encode('utf-8')).hexdigest()
+        
+    def extract_entities(self, text, language='zh'):
+        """
+        从文本中提取实体
+        
+        参数:
+            text: 要处理的文本
+            language: 文本语言
             
-            # 如果有位置信息，直接使用
-            if 'start' in entity and 'end' in entity:
-                start, end = entity['start'], entity['end']
-                redacted_text = redacted_text[:start] + replacement + redacted_text[end:]
-            else:
-                # 否则全局替换，可能会有误替换
-                redacted_text = redacted_text.replace(original, replacement)
+        返回:
+            entities: 识别出的实体信息列表
+        """
+        with self.metrics.timer('regex'):
+            return resolve_overlaps(self.pattern_engine.extract(text), self.type_priority)
+        
+    def extract_entities_batch(self, texts, language='zh'):
+        """批量提取实体，结果与逐个调用extract_entities相同"""
+        return [self.extract_entities(text, language) for text in texts]
+        
+    def redact_text(self, text, entities=None):
+        """
+        对文本进行脱敏处理
+        
+        参数:
+            text: 原始文本
+            entities: 需要脱敏的实体列表，为None时调用extract_entities识别
             
-            # 记录替换映射
-            entity_map[replacement] = original
+        返回:
+            redacted_text: 脱敏后的文本
+        """
+        if entities is None:
+            entities = self.extract_entities(text)
+        return redact_spans(text, entities, self.type_priority, self.pseudonymizer)[0]
+
+
+class TriageStrategy:
+    """
+    按文档类型选择策略
+    
+    先用triage.classify对文档做一次取样分类，再交给够用的最便宜的策略：
+    英文或非医疗文本只使用正则表达式（'regex'），医疗文本使用正则加jieba（'medical'），
+    启用大语言模型后，隐私线索密集的医疗文本再交给大语言模型（'llm'）。
+    批量识别时（如Word文档的全部段落）整批作为一个文档分类，使用同一个策略。
+    """
+    
+    def __init__(self, dense_threshold=5.0, sample_chars=4096, custom_patterns=None,
+                 type_priority=None, **medical_options):
+        """
+        初始化按文档类型选择策略的策略
+        
+        参数:
+            dense_threshold: 每千字隐私线索达到该数量的医疗文本交给大语言模型
+            sample_chars: 分类时的样本字符数上限
+            custom_patterns: 用户自定义的正则模式，各策略共用
+            type_priority: 实体重叠时的类型优先级，各策略共用
+            **medical_options: 创建MedicalStrategy的其他参数，如dictionaries、cache
+        """
+        self.dense_threshold = dense_threshold
+        self.sample_chars = sample_chars
+        self.regex = RegexStrategy(custom_patterns, type_priority)
+        self._medical_options = dict(medical_options, custom_patterns=custom_patterns,
+                                     type_priority=type_priority)
+        self.medical = MedicalStrategy(**self._medical_options)
+        # 启用大语言模型后创建
+        self.full = None
+        self.type_priority = self.medical.type_priority
+        self.cache = self.medical.cache
+        self._metrics = NULL_METRICS
+        self._routes = {'regex': 0, 'medical': 0, 'llm': 0}
+        
+    @property
+    def metrics(self):
+        return self._metrics
+        
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+        for strategy in self._strategies():
+            strategy.metrics = metrics
             
-        return redacted_text, entity_map 
\ No newline at end of file
+    @property
+    def use_llm(self):
+        return self.full is not None
+        
+    def _strategies(self):
+        return [strategy for strategy in (self.regex, self.medical, self.full) if strategy is not None]
+        
+    def enable_llm(self, model_name="qwen2:7b", url="http://127.0.0.1:11434", **options):
+        """
+        启用大语言模型，参数见MedicalStrategy.enable_llm
+        
+        只有隐私线索密集的医疗文本会交给大语言模型。
+        """
+        self.full = MedicalStrategy(**self._medical_options)
+        self.full.enable_llm(model_name=model_name, url=url, **options)
+        self.full.metrics = self._metrics
+        
+    def warmup(self):
+        """预先导入jieba并加载词典"""
+        self.medical.warmup()
+        
+    def route(self, triage):
+        """
+        根据分类结果选择策略
+        
+        返回:
+            name: 'regex'、'medical' 或 'llm'
+        """
+        if triage.language != 'zh' or not triage.medical:
+            return 'regex'
+        if self.full is not None and triage.pii_density >= self.dense_threshold:
+            return 'llm'
+        return 'medical'
+        
+    def _classify(self, text):
+        from .triage import classify
+        
+        name = self.route(classify(text, self.sample_chars))
+        self._routes[name] += 1
+        self._metrics.count('triage', route=name)
+        return name
+        
+    def _strategy(self, name):
+        return {'regex': self.regex, 'medical': self.medical, 'llm': self.full}[name]
+        
+    def _select(self, text):
+        return self._strategy(self._classify(text))
+        
+    def extract_entities(self, text, language='zh'):
+        """从文本中提取实体，文本作为一个文档分类"""
+        return self._select(text).extract_entities(text, language)
+        
+    def extract_entities_batch(self, texts, language='zh'):
+        """批量提取实体，整批文本作为一个文档分类"""
+        texts = list(texts)
+        return self._select('\n'.join(texts)).extract_entities_batch(texts, language)
+        
+    def extract_documents(self, texts, language='zh'):
+        """
+        批量提取多个独立文档的实体
+        
+        与extract_entities_batch不同，每个文本单独分类，同一策略的文本再合并为一次批量识别。
+        """
+        groups = defaultdict(list)
+        for i, text in enumerate(texts):
+            groups[self._classify(text)].append(i)
+        results = [None] * len(texts)
+        for name, indices in groups.items():
+            batch = self._strategy(name).extract_entities_batch([texts[i] for i in indices], language)
+            for i, entities in zip(indices, batch):
+                results[i] = entities
+        return results
+        
+    def triage_stats(self):
+        """
+        返回各策略处理的文档数
+        
+        返回:
+            stats: 包含regex、medical、llm三个计数的字典
+        """
+        return dict(self._routes)
+        
+    def llm_stats(self):
+        """返回大语言模型调用的统计信息，见MedicalStrategy.llm_stats"""
+        if self.full is None:
+            return {'segments': 0, 'escalated': 0, 'escalation_rate': 0.0}
+        return self.full.llm_stats()
@@ -0,0 +1,182 @@
+import hashlib
+import io
+import json
+import logging
+import marshal
+import os
+import struct
+import sys
+import types
+
+from .utils import MEDICAL_TERMS_TO_IGNORE
+
+logger = logging.getLogger(__name__)
+
+# 快照文件格式：8字节标识、4字节头部长度、JSON头部、marshal序列化的分词器状态
+SNAPSHOT_MAGIC = b'CNHPPTOK'
+# 快照格式版本，内容结构发生不兼容变化时递增
+SNAPSHOT_VERSION = 1
+# 未显式指定快照时从该环境变量读取快照路径，子进程（包括spawn方式启动的工作进程）自动继承
+SNAPSHOT_ENV = 'CN_HPP_JIEBA_SNAPSHOT'
+
+_HEADER_LENGTH = struct.Struct('<I')
+# jieba.posseg导入时执行的HMM参数模块，快照中保存其中的P
+_HMM_MODULES = ('char_state_tab', 'prob_start', 'prob_trans', 'prob_emit')
+_MEDICAL_TERM_FREQ = 1000
+_MEDICAL_TERM_TAG = 'n'
+
+
+def add_medical_terms(jieba):
+    """把医疗词表加入jieba词典，医疗术语不会被切分成人名、地名"""
+    for term in MEDICAL_TERMS_TO_IGNORE:
+        jieba.add_word(term, freq=_MEDICAL_TERM_FREQ, tag=_MEDICAL_TERM_TAG)
+
+
+def medical_terms_digest():
+    """医疗词表的摘要，词表变化后旧快照随之失效"""
+    data = repr((sorted(MEDICAL_TERMS_TO_IGNORE), _MEDICAL_TERM_FREQ, _MEDICAL_TERM_TAG))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def default_snapshot_path():
+    """返回环境变量CN_HPP_JIEBA_SNAPSHOT指定的快照路径，未设置时返回None"""
+    return os.environ.get(SNAPSHOT_ENV) or None
+
+
+def build_snapshot(path, user_dicts=(), words=()):
+    """
+    生成分词词典快照
+
+    在当前进程中完整初始化jieba（前缀词典、词性表、词性标注的HMM参数），合并医疗词表、
+    用户词典和额外词条后整体序列化，加载快照的进程不再逐行读取词典文件、逐个添加词条。
+    应在新进程中调用，当前进程此前添加到jieba的词条也会写入快照。
+
+    参数:
+        path: 快照文件路径
+        user_dicts: jieba格式的用户词典文件（每行：词条 [词频] [词性]）
+        words: 额外的词条，每项为 (词条, 词频, 词性)，词频和词性可以为None
+
+    返回:
+        header: 快照的头部信息（见read_snapshot_header）
+    """
+    import jieba
+    import jieba.posseg as pseg
+
+    jieba.initialize()
+    add_medical_terms(jieba)
+    for user_dict in user_dicts:
+        jieba.load_userdict(user_dict)
+    for word, freq, tag in words:
+        jieba.add_word(word, freq=freq, tag=tag)
+    # 用户词条的词性先记在user_word_tag_tab中，第一次词性标注时才合并
+    pseg.dt.makesure_userdict_loaded()
+
+    # 词性表与前缀词典使用同一批字符串对象，相同的词性也只保留一个对象，
+    # marshal对同一对象只写出一次引用，快照更小，加载时也少创建几十万个字符串
+    keys = {word: word for word in jieba.dt.FREQ}
+    tags = {}
+    word_tag_tab = {keys.get(word, word): tags.setdefault(tag, tag) for word, tag in pseg.dt.word_tag_tab.items()}
+    state = {
+        'FREQ': jieba.dt.FREQ,
+        'total': jieba.dt.total,
+        'word_tag_tab': word_tag_tab,
+        'hmm': [getattr(pseg, name) for name in ('char_state_tab_P', 'start_P', 'trans_P', 'emit_P')]
+    }
+    payload = marshal.dumps(state)
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'id': hashlib.sha256(payload).hexdigest()[:16],
+        # marshal格式与Python版本相关，jieba版本不同时词典内容可能不同
+        'python': '%d.%d' % sys.version_info[:2],
+        'jieba': getattr(jieba, '__version__', ''),
+        'medical_terms': medical_terms_digest(),
+        'user_dicts': [os.path.basename(str(user_dict)) for user_dict in user_dicts],
+        'words': len(jieba.dt.FREQ)
+    }
+    encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + _HEADER_LENGTH.pack(len(encoded)) + encoded)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return header
+
+
+def _read_header(f, path):
+    prefix = f.read(len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size)
+    if len(prefix) < len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size or not prefix.startswith(SNAPSHOT_MAGIC):
+        raise ValueError(f"不是分词词典快照: {path}")
+    (length,) = _HEADER_LENGTH.unpack_from(prefix, len(SNAPSHOT_MAGIC))
+    try:
+        header = json.loads(f.read(length).decode('utf-8'))
+    except ValueError:
+        raise ValueError(f"分词词典快照头部损坏: {path}") from None
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"分词词典快照版本 {header.get('version')} 与当前版本 {SNAPSHOT_VERSION} 不一致: {path}")
+    return header
+
+
+def read_snapshot_header(path):
+    """
+    读取快照的头部信息，不加载词典
+
+    返回:
+        header: 包含version、id（内容摘要）、python、jieba、medical_terms、user_dicts、words的字典
+    """
+    with open(path, 'rb') as f:
+        return _read_header(f, path)
+
+
+def load_snapshot(path):
+    """
+    从快照恢复jieba的分词器状态
+
+    在导入jieba.posseg之前调用效果最好：词性标注的HMM参数和词性表直接取自快照，
+    跳过导入时执行的大型参数模块和对整个词典文件的逐行读取。已经导入时只恢复前缀词典和词性表。
+    快照与当前的Python版本、jieba版本或医疗词表不一致时抛出ValueError，此时jieba状态不变。
+
+    参数:
+        path: build_snapshot生成的快照文件路径
+
+    返回:
+        header: 快照的头部信息
+    """
+    import jieba
+
+    with open(path, 'rb') as f:
+        header = _read_header(f, path)
+        python = '%d.%d' % sys.version_info[:2]
+        if header.get('python') != python:
+            raise ValueError(f"分词词典快照由Python {header.get('python')} 生成，当前为 {python}: {path}")
+        if header.get('jieba') != getattr(jieba, '__version__', ''):
+            raise ValueError(f"分词词典快照由jieba {header.get('jieba')} 生成，当前为 "
+                             f"{getattr(jieba, '__version__', '')}: {path}")
+        if header.get('medical_terms') != medical_terms_digest():
+            raise ValueError(f"医疗词表已变化，需要重新生成分词词典快照: {path}")
+        state = marshal.loads(f.read())
+
+    if 'jieba.posseg' not in sys.modules:
+        for name, table in zip(_HMM_MODULES, state['hmm']):
+            module = types.ModuleType(f'jieba.posseg.{name}')
+            module.P = table
+            sys.modules[module.__name__] = module
+        # 导入时创建的POSTokenizer会逐行读取整个词典文件建立词性表，词性表已在快照中，临时让它读取空文件
+        jieba.dt.get_dict_file = lambda: io.BytesIO()
+        try:
+            import jieba.posseg
+        finally:
+            del jieba.dt.get_dict_file
+    import jieba.posseg as pseg
+
+    with jieba.dt.lock:
+        jieba.dt.FREQ = state['FREQ']
+        jieba.dt.total = state['total']
+        jieba.dt.user_word_tag_tab = {}
+        jieba.dt.initialized = True
+    pseg.dt.word_tag_tab = state['word_tag_tab']
+    logger.debug("已加载分词词典快照 %s（%d 个词条）", path, header.get('words', 0))
+    return header
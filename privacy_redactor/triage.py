@@ -0,0 +1,92 @@
+import re
+
+from .utils import MEDICAL_KEYWORDS, NAME_CUE_WORDS, sample_text
+
+# 提示文本中可能有隐私信息的字段名
+PII_CUE_WORDS = (
+    '姓名', '电话', '手机', '联系方式', '身份证', '证件号', '住址', '地址', '住院号', '门诊号',
+    '病案号', '病历号', '医保号', '社保号', '医师', '出生日期', '工作单位'
+)
+
+_CUES = sorted(set(PII_CUE_WORDS) | set(NAME_CUE_WORDS), key=len, reverse=True)
+
+# 医疗关键词与隐私字段名有共同的前缀（住院/住院号、病历/病历号、患者），两者分别扫描，
+# 同一处文字可以同时计入医疗关键词和隐私线索。
+# 开头的前瞻只允许可能匹配的首字符，其余位置不必逐个尝试各分支
+_MEDICAL = re.compile(
+    '(?=[' + ''.join(sorted({word[0] for word in MEDICAL_KEYWORDS})) + '])'
+    '(?:' + '|'.join(map(re.escape, MEDICAL_KEYWORDS)) + ')'
+)
+# 隐私字段名、长数字串和英文单词合并为一个正则，一次扫描统计
+_HINT = re.compile(
+    '(?=[' + ''.join(sorted({word[0] for word in _CUES})) + r'\dA-Za-z])'
+    '(?:(?P<pii>' + '|'.join(map(re.escape, _CUES)) + r'|\d{6,})'
+    '|(?P<latin>[A-Za-z]+))'
+)
+# 连续的中文字符
+_CHINESE_RUN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+class Triage:
+    """
+    文档分类结果
+
+    属性:
+        language: 'zh' 或 'en'
+        chinese_ratio: 样本的字母中中文字符的占比，数字、标点和空白不计入
+        medical_hits: 样本中医疗关键词出现的次数
+        pii_hints: 样本中隐私字段名、人名线索词和长数字串出现的次数
+        sample_chars: 样本的字符数
+    """
+    __slots__ = ('language', 'chinese_ratio', 'medical_hits', 'pii_hints', 'sample_chars')
+
+    def __init__(self, language, chinese_ratio, medical_hits, pii_hints, sample_chars):
+        self.language = language
+        self.chinese_ratio = chinese_ratio
+        self.medical_hits = medical_hits
+        self.pii_hints = pii_hints
+        self.sample_chars = sample_chars
+
+    @property
+    def medical(self):
+        """是否为医疗文本，与utils.is_medical_text的判断一致"""
+        return self.medical_hits > 0
+
+    @property
+    def pii_density(self):
+        """每千字中隐私线索的数量"""
+        return self.pii_hints * 1000 / self.sample_chars if self.sample_chars else 0.0
+
+    def __repr__(self):
+        return (f'Triage(language={self.language!r}, chinese_ratio={self.chinese_ratio:.2f}, '
+                f'medical_hits={self.medical_hits}, pii_density={self.pii_density:.1f})')
+
+
+def classify(text, sample_chars=4096):
+    """
+    判断文本的语言、是否为医疗文本以及隐私线索的密度
+
+    长文本只检查开头、中间和结尾的样本（见utils.sample_text），耗时与文本长度无关。
+    语言按中文字符与英文字母的比例判断，病历中大量的数字和标点不影响结果。
+
+    参数:
+        text: 要分类的文本
+        sample_chars: 样本的字符数上限
+
+    返回:
+        triage: Triage实例
+    """
+    sample = sample_text(text, sample_chars)
+    if not sample:
+        return Triage('en', 0.0, 0, 0, 0)
+    chinese = sum(len(run) for run in _CHINESE_RUN.findall(sample))
+    latin = 0
+    medical_hits = sum(1 for _ in _MEDICAL.finditer(sample))
+    pii_hints = 0
+    for match in _HINT.finditer(sample):
+        if match.lastgroup == 'pii':
+            pii_hints += 1
+        else:
+            latin += match.end() - match.start()
+    ratio = chinese / (chinese + latin) if chinese + latin else 0.0
+    return Triage('zh' if ratio > 0.5 else 'en', ratio, medical_hits, pii_hints, len(sample))
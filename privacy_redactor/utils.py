@@ -2,24 +2,50 @@ import re
 import os
 import json
 
-def is_chinese(text):
+# 连续的中文字符
+_CHINESE_RUN = re.compile(r'[\u4e00-\u9fff]+')
+
+# 医疗相关关键词
+MEDICAL_KEYWORDS = [
+    '患者', '医生', '护士', '病人', '医院', '诊所', '药物', '治疗', '疾病', '症状',
+    '病历', '手术', '检查', '化验', '诊断', '用药', '住院', '出院', '病房', '门诊',
+    '急诊', '医嘱', '护理', '康复', '病史', '血压', '体温', '心率', '呼吸'
+]
+_MEDICAL_KEYWORD = re.compile('|'.join(map(re.escape, MEDICAL_KEYWORDS)))
+
+
+def sample_text(text, limit=4096):
+    """
+    从长文本中取样
+
+    不超过limit个字符的文本原样返回，否则取开头、中间、结尾各三分之一limit个字符。
+    """
+    if len(text) <= limit:
+        return text
+    part = limit // 3
+    middle = (len(text) - part) // 2
+    return text[:part] + text[middle:middle + part] + text[-part:]
+
+
+def chinese_ratio(text):
+    """返回文本中中文字符的占比"""
+    if not text:
+        return 0.0
+    return sum(len(run) for run in _CHINESE_RUN.findall(text)) / len(text)
+
+
+def is_chinese(text, sample_chars=4096):
     """
     检测文本是否主要为中文
     
     参数:
         text: 需要检测的文本
+        sample_chars: 超过该长度的文本只检测开头、中间和结尾的样本
         
     返回:
         bool: 如果中文字符占比超过50%则返回True，否则返回False
     """
-    chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
-    chinese_chars = chinese_pattern.findall(text)
-    
-    # 计算中文字符占比
-    if not text or len(text) == 0:
-        return False
-        
-    return len(chinese_chars) / len(text) > 0.5
+    return chinese_ratio(sample_text(text, sample_chars)) > 0.5
 
 def is_medical_text(text):
     """
@@ -31,18 +57,8 @@ def is_medical_text(text):
     返回:
         bool: 如果包含医疗相关关键词则返回True，否则返回False
     """
-    # 医疗相关关键词
-    medical_keywords = [
-        '患者', '医生', '护士', '病人', '医院', '诊所', '药物', '治疗', '疾病', '症状',
-        '病历', '手术', '检查', '化验', '诊断', '用药', '住院', '出院', '病房', '门诊',
-        '急诊', '医嘱', '护理', '康复', '病史', '血压', '体温', '心率', '呼吸'
-    ]
-    
-    for keyword in medical_keywords:
-        if keyword in text:
-            return True
-            
-    return False
+    # 所有关键词合并为一个正则，一次扫描
+    return _MEDICAL_KEYWORD.search(text) is not None
 
 # 医疗文本中常见的需要忽略的医学术语
 MEDICAL_TERMS_TO_IGNORE = [
@@ -56,6 +72,56 @@ MEDICAL_TERMS_TO_IGNORE = [
     '高密度脂蛋白', '空腹血糖', '糖化血红蛋白', '凝血酶原时间', '活化部分凝血活酶时间'
 ]
 
+# 分词词性到实体类型的映射
+POS_ENTITY_TYPES = {
+    'nr': 'NAME',  # 人名
+    'ns': 'LOCATION',  # 地名
+    'nt': 'ORGANIZATION',  # 机构名
+}
+
+# 常见姓氏，用于识别医生姓名和筛选需要词性标注的文本
+COMMON_SURNAMES = ('张李王赵刘陈杨黄周吴徐孙马朱胡林郭何高罗郑梁谢宋唐许邓冯韩曹曾彭萧蒋蔡沈韦江童陆姜戴崔邹潘'
+                   '薛叶阎余袁侯贺龚顾毛郝龙邵钱汪石井廖洪姚欧艾熊孟贾范宁庄马苏何傅俞'
+                   '章萧程于舒康齐吕金陶沈伍刘')
+
+# 地名、机构名的常见后缀，用于筛选需要词性标注的文本
+LOCATION_SUFFIXES = '省市区县镇乡村路街'
+ORGANIZATION_SUFFIXES = ('医院', '卫生院', '诊所', '中心', '公司', '大学', '学院')
+
+# 非正则来源实体的替换文本
+ENTITY_REPLACEMENTS = {
+    'NAME': '[姓名]',
+    'LOCATION': '[地址]',
+    'ORGANIZATION': '[机构]',
+}
+
+# 实体重叠时的类型优先级，数值越大越优先，未列出的类型为0
+# 结构化编号优先于其中可能出现的日期、时间，医生姓名优先于分词识别的人名
+ENTITY_TYPE_PRIORITY = {
+    'ID_CARD': 100,
+    'PATIENT_ID': 90,
+    'MEDICAL_RECORD_NO': 90,
+    'ADMISSION_NO': 90,
+    'MEDICAL_INSURANCE_NO': 90,
+    'SOCIAL_SECURITY_NO': 90,
+    'BANK_CARD': 80,
+    'PHONE': 80,
+    'EMAIL': 80,
+    'DOCTOR_NAME': 70,
+    'LOCATION': 60,
+    'NAME': 50,
+    'ORGANIZATION': 50,
+    'MEDICAL_EXPENSES': 40,
+    'DATE': 30,
+    'TIME': 20,
+}
+
+# 级联模式下提示其后应出现人名的线索词，线索词之后一段距离内没有识别出人名时交给大语言模型复核
+NAME_CUE_WORDS = [
+    '患者', '病人', '家属', '联系人', '姓名', '监护人', '配偶', '父亲', '母亲', '之子', '之女',
+    '陪护', '签名', '签字', '代诉人'
+]
+
 # 正则表达式模式
 REGEX_PATTERNS = {
     # 个人信息
@@ -71,9 +137,7 @@ REGEX_PATTERNS = {
     'MEDICAL_INSURANCE_NO': r'医保号[：:]?\s*([A-Za-z0-9]+)',  # 医保号
     'SOCIAL_SECURITY_NO': r'社保号[：:]?\s*(\d{10,20})',  # 社保号
     'MEDICAL_EXPENSES': r'(?:医疗费用|总费用|自费金额)[：:]?\s*[¥￥]?(\d+(?:\.\d+)?)',  # 医疗费用
-    'DOCTOR_NAME': r'(?:主治|主管|经治|值班|记录)医师[：:]?\s*([张李王赵刘陈杨黄周吴徐孙马朱胡林郭何高罗郑梁谢宋唐许邓冯韩曹曾彭萧蒋蔡沈韦江童陆姜戴崔邹潘'
-                r'薛叶阎余袁侯贺龚顾毛郝龙邵钱汪石井廖洪姚欧艾熊孟贾范宁庄马苏何傅俞'
-                r'章萧程于舒康齐吕金陶沈伍刘)'
+    'DOCTOR_NAME': r'(?:主治|主管|经治|值班|记录)医师[：:]?\s*([' + COMMON_SURNAMES + r']'
                 r'[\u4e00-\u9fa5]{1,2})',  # 医生姓名
     'DATE': r'(\d{4}[-/年]\d{1,2}[-/月]\d{1,2}[日]?)',  # 日期
     'TIME': r'(\d{1,2}[:：]\d{1,2}(?:[:：]\d{1,2})?)',  # 时间
@@ -85,7 +149,7 @@ def save_entities(entities, output_path):
     保存识别出的实体到文件
     
     参数:
-        entities: 实体列表
+        entities: 实体列表或entity.EntityBatch
         output_path: 输出文件路径
     """
     dirname = os.path.dirname(output_path)
@@ -99,4 +163,4 @@ def save_entities(entities, output_path):
     
     # 保存实体到JSON文件
     with open(entities_path, 'w', encoding='utf-8') as f:
-        json.dump(entities, f, ensure_ascii=False, indent=2) 
\ No newline at end of file
+        json.dump([dict(entity) for entity in entities], f, ensure_ascii=False, indent=2) 
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""EntityCache的LRU淘汰、磁盘持久化，以及策略指纹随配置变化"""
+from privacy_redactor.cache import EntityCache, segment_key
+from privacy_redactor.strategies import MedicalStrategy
+
+ENTITY = {'original': '张伟', 'type': 'NAME', 'replacement': '[姓名]', 'start': 2, 'end': 4}
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EntityCache(maxsize=2)
+    cache.put('a', [ENTITY])
+    cache.put('b', [])
+    assert cache.get('a') == [ENTITY]
+    # 'a' 刚被读取，写入 'c' 时淘汰的是 'b'
+    cache.put('c', [])
+    assert cache.get('b') is None
+    assert cache.get('a') == [ENTITY]
+    assert cache.get('c') == []
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'disk_hits': 0, 'hit_rate': 0.75, 'size': 2}
+
+
+def test_returned_entities_are_copies():
+    cache = EntityCache()
+    cache.put('a', [ENTITY])
+    cache.get('a')[0]['replacement'] = '[改动]'
+    assert cache.get('a') == [ENTITY]
+
+
+def test_sqlite_cache_survives_new_instance(tmp_path):
+    path = str(tmp_path / 'cache' / 'entities.db')
+    cache = EntityCache(path=path)
+    cache.put_many([('a', [ENTITY]), ('b', [])])
+    cache.close()
+
+    reopened = EntityCache(maxsize=0, path=path)
+    assert reopened.get('a') == [ENTITY]
+    assert reopened.get('b') == []
+    assert reopened.get('c') is None
+    assert reopened.stats()['disk_hits'] == 2
+    reopened.clear()
+    assert reopened.get('a') is None
+    reopened.close()
+
+
+def test_fingerprint_changes_when_configuration_changes():
+    strategy = MedicalStrategy(cache=EntityCache())
+    fingerprints = [strategy.fingerprint()]
+    assert strategy.fingerprint() == fingerprints[-1]
+
+    strategy.add_pattern('CASE_NUMBER', r'CASE-\d{4}')
+    fingerprints.append(strategy.fingerprint())
+    strategy.add_dictionary('NAME', ['欧阳青'])
+    fingerprints.append(strategy.fingerprint())
+    strategy.enable_llm(model_name='qwen2:1.5b')
+    fingerprints.append(strategy.fingerprint())
+    # 绕过策略直接添加到规则引擎
+    strategy.pattern_engine.add_pattern('CASE_NUMBER', r'CASE-[A-Z]{2}')
+    fingerprints.append(strategy.fingerprint())
+    strategy.type_priority['CASE_NUMBER'] = 99
+    strategy.invalidate_fingerprint()
+    fingerprints.append(strategy.fingerprint())
+    assert len(set(fingerprints)) == len(fingerprints)
+
+
+def test_cached_segment_is_recomputed_after_add_pattern():
+    strategy = MedicalStrategy(cache=EntityCache())
+    text = '复查单号 CASE-2024'
+    assert not any(entity['type'] == 'CASE_NUMBER' for entity in strategy.get_entities(text))
+    key = segment_key(text, strategy.fingerprint())
+
+    strategy.add_pattern('CASE_NUMBER', r'CASE-\d{4}')
+    assert segment_key(text, strategy.fingerprint()) != key
+    assert [entity['original'] for entity in strategy.get_entities(text)
+            if entity['type'] == 'CASE_NUMBER'] == ['CASE-2024']
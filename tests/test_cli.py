@@ -0,0 +1,40 @@
+"""目录批量处理的断点续处理清单"""
+import os
+
+import pytest
+
+docx = pytest.importorskip('docx')
+
+from privacy_redactor import PrivacyRedactor
+from privacy_redactor.cli import MANIFEST_NAME, Manifest, redact_directory
+
+
+def _make_inputs(input_dir):
+    input_dir.mkdir()
+    document = docx.Document()
+    document.add_paragraph('患者张伟，联系电话13812345678。')
+    document.save(str(input_dir / 'a.docx'))
+    (input_dir / 'b.txt').write_text('邮箱zhangwei@example.com', encoding='utf-8')
+
+
+@pytest.mark.parametrize('docx_engine', ['python-docx', 'stream'])
+def test_failed_save_is_recorded_and_retried(tmp_path, docx_engine):
+    input_dir = tmp_path / 'in'
+    output_dir = tmp_path / 'out'
+    _make_inputs(input_dir)
+    # 输出路径被同名目录占用，保存Word文档失败
+    (output_dir / 'a.docx').mkdir(parents=True)
+    redactor = PrivacyRedactor(strategy='regex', docx_engine=docx_engine)
+
+    summary = redact_directory(redactor, str(input_dir), str(output_dir), workers=1, stream=None)
+    assert summary == {'done': 1, 'skipped': 0, 'failed': 1}
+    records = Manifest(str(output_dir / MANIFEST_NAME)).records
+    assert records['a.docx']['status'] == 'failed'
+    assert records['b.txt']['status'] == 'done'
+
+    # 问题排除后重新运行，只重新处理失败的文件
+    os.rmdir(output_dir / 'a.docx')
+    summary = redact_directory(redactor, str(input_dir), str(output_dir), workers=1, stream=None)
+    assert summary == {'done': 1, 'skipped': 1, 'failed': 0}
+    assert Manifest(str(output_dir / MANIFEST_NAME)).records['a.docx']['status'] == 'done'
+    assert os.path.isfile(output_dir / 'a.docx')
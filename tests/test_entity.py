@@ -0,0 +1,73 @@
+"""EntityBatch与字典列表之间的转换和筛选"""
+import pickle
+
+import pytest
+
+from privacy_redactor.entity import EntityBatch
+
+ENTITIES = [
+    {'original': '张伟', 'type': 'NAME', 'replacement': '[姓名]', 'start': 2, 'end': 4},
+    {'original': '13812345678', 'type': 'PHONE', 'replacement': '[PHONE]', 'start': 7, 'end': 18},
+    {'original': '张伟', 'type': 'NAME', 'replacement': '[姓名]', 'start': 19, 'end': 21, 'confidence': 0.5},
+    {'type': 'DATE', 'start': 30, 'end': 40},
+]
+
+
+def test_round_trip_to_dicts():
+    batch = EntityBatch(ENTITIES)
+    assert len(batch) == 4 and batch
+    assert batch.to_dicts() == ENTITIES
+    assert batch == ENTITIES
+    assert EntityBatch(batch).to_dicts() == ENTITIES
+    assert pickle.loads(pickle.dumps(batch)).to_dicts() == ENTITIES
+    assert batch.types == ['NAME', 'PHONE', 'DATE']
+
+
+def test_dict_style_access():
+    batch = EntityBatch(ENTITIES)
+    entity = batch[-2]
+    assert entity['original'] == '张伟' and entity['confidence'] == 0.5
+    assert dict(entity) == ENTITIES[2]
+    assert list(batch[3]) == ['type', 'start', 'end']
+    assert batch[3].get('original') is None
+    with pytest.raises(KeyError):
+        batch[3]['replacement']
+    with pytest.raises(IndexError):
+        batch[4]
+    # 通过视图修改的字段写回批次
+    entity['replacement'] = '[患者]'
+    entity['start'] = 20
+    entity['source'] = 'llm'
+    assert batch.to_dicts()[2] == dict(ENTITIES[2], replacement='[患者]', start=20, source='llm')
+    assert batch[0]['replacement'] == '[姓名]'
+
+
+def test_filter_slice_and_sort():
+    batch = EntityBatch(ENTITIES)
+    assert batch.filter(types={'NAME'}).to_dicts() == [ENTITIES[0], ENTITIES[2]]
+    assert batch.filter(types={'EMAIL'}).to_dicts() == []
+    assert batch.filter(start=5, end=21).to_dicts() == ENTITIES[1:3]
+    assert batch[1:3].to_dicts() == ENTITIES[1:3]
+    reversed_batch = EntityBatch(reversed(ENTITIES))
+    assert reversed_batch.sorted().to_dicts() == ENTITIES
+    reversed_batch.shift(10)
+    assert [entity['start'] for entity in reversed_batch] == [40, 29, 17, 12]
+
+
+def test_extend_merges_type_and_string_tables():
+    first = EntityBatch(ENTITIES[:2])
+    second = EntityBatch([ENTITIES[3], ENTITIES[2]])
+    first.extend(second)
+    assert first.to_dicts() == ENTITIES[:2] + [ENTITIES[3], ENTITIES[2]]
+    assert first.types == ['NAME', 'PHONE', 'DATE']
+
+
+def test_to_numpy_shares_columns():
+    np = pytest.importorskip('numpy')
+    batch = EntityBatch(ENTITIES)
+    columns = batch.to_numpy()
+    assert columns['start'].tolist() == [2, 7, 19, 30]
+    assert columns['end'].tolist() == [4, 18, 21, 40]
+    assert [batch.types[code] for code in columns['type_code']] == ['NAME', 'PHONE', 'NAME', 'DATE']
+    order = np.argsort(-columns['start'], kind='stable')
+    assert batch.select(order).to_dicts() == ENTITIES[::-1]
@@ -0,0 +1,64 @@
+"""修订后的Word文档增量处理的结果必须与完整处理完全相同"""
+import zipfile
+
+import pytest
+
+docx = pytest.importorskip('docx')
+
+from privacy_redactor import PrivacyRedactor
+from privacy_redactor.metrics import Metrics, MetricsCollector
+
+PARAGRAPHS = [
+    "患者张伟，男，45岁，身份证号码330102197508124567，联系电话13812345678。",
+    "家庭住址：浙江省杭州市西湖区文三路123号，邮箱zhangwei@example.com",
+    "今日血压130/80mmHg，心率80次/分，双肺呼吸音清。",
+    "住院号：12345678，2023年5月12日入院。主治医师：李明",
+    "签名：李明",
+]
+
+
+def _make(path, paragraphs, cells):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    table = document.add_table(rows=1, cols=len(cells))
+    for cell, text in zip(table.rows[0].cells, cells):
+        cell.text = text
+    document.save(path)
+
+
+def _document_xml(path):
+    with zipfile.ZipFile(path) as archive:
+        return archive.read('word/document.xml')
+
+
+@pytest.mark.parametrize('docx_engine', ['python-docx', 'stream'])
+@pytest.mark.parametrize('strategy', ['regex', 'medical'])
+def test_incremental_matches_full_run(tmp_path, docx_engine, strategy):
+    v1 = str(tmp_path / 'v1.docx')
+    v2 = str(tmp_path / 'v2.docx')
+    _make(v1, PARAGRAPHS, ['电话13912345678', '签名：李明'])
+    # 修订：修改一段、删除一段、调整顺序、新增一段，重复出现的段落保持不变
+    revised = [PARAGRAPHS[3], PARAGRAPHS[0].replace('13812345678', '13700001111'), PARAGRAPHS[2],
+               "出院后联系家属王芳，电话15900002222。", PARAGRAPHS[4], PARAGRAPHS[4]]
+    _make(v2, revised, ['电话13912345678', '签名：李明'])
+
+    collector = MetricsCollector()
+    incremental = PrivacyRedactor(strategy=strategy, docx_engine=docx_engine, incremental=True,
+                                  metrics=Metrics([collector]))
+    output = str(tmp_path / 'report.docx')
+    incremental.redact_file(v1, output)
+    collector.reset()
+    _, entities = incremental.redact_file(v2, output)
+
+    full = PrivacyRedactor(strategy=strategy, docx_engine=docx_engine)
+    expected_output = str(tmp_path / 'full.docx')
+    _, expected_entities = full.redact_file(v2, expected_output)
+
+    assert entities.to_dicts() == expected_entities.to_dicts()
+    assert _document_xml(output) == _document_xml(expected_output)
+
+    # 只有修改过的和新增的两个段落需要重新识别
+    counters = collector.snapshot()['counters']
+    assert counters['paragraphs_detected'] == 2
+    assert counters['paragraphs_reused'] > 0
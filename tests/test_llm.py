@@ -0,0 +1,154 @@
+"""OllamaClient对本地模拟的 /api/generate 服务的并发、重试和超时处理"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from privacy_redactor.llm import LLMError, OllamaClient
+
+
+class StubOllama:
+    """
+    模拟Ollama的 /api/generate
+
+    responses中的每一项依次用于一个请求：状态码或 (状态码, 延迟秒数)，用完后返回200。
+    回复的response字段为请求的prompt，记录请求总数、最大同时在途数和使用过的连接数。
+    """
+
+    def __init__(self, responses=(), delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    stub.connections.add(self.client_address)
+                    status, delay = stub.responses.pop(0) if stub.responses else (200, stub.delay)
+                try:
+                    time.sleep(delay)
+                    body = json.dumps({'response': payload['prompt'], 'done': True}).encode('utf-8')
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    # 客户端超时后关闭了连接
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_factory():
+    stubs, clients = [], []
+
+    def make(responses=(), delay=0.0, **options):
+        stub = StubOllama([(r, 0.0) if isinstance(r, int) else r for r in responses], delay)
+        client = OllamaClient(url=stub.url, backoff=0.01, **options)
+        stubs.append(stub)
+        clients.append(client)
+        return stub, client
+
+    yield make
+    for client in clients:
+        client.close()
+    for stub in stubs:
+        stub.close()
+
+
+def test_concurrency_is_bounded_and_connections_reused(stub_factory):
+    stub, client = stub_factory(delay=0.05, max_concurrency=3)
+    prompts = [f'文本{i}' for i in range(12)]
+    results = client.generate_many(prompts)
+    assert [result['response'] for result in results] == prompts
+    assert 2 <= stub.max_in_flight <= 3
+    assert len(stub.connections) <= 3
+
+    # 第二批请求复用连接池中的长连接
+    client.generate_many([f'其他{i}' for i in range(6)])
+    assert len(stub.connections) <= 3
+
+
+def test_identical_deterministic_requests_are_cached(stub_factory):
+    stub, client = stub_factory()
+    first, second = client.generate_many(['相同的文本', '相同的文本'])
+    assert first == second
+    client.generate_many(['相同的文本'])
+    assert stub.requests <= 2
+
+
+def test_server_errors_are_retried(stub_factory):
+    stub, client = stub_factory([503, 429], retries=2)
+    (result,) = client.generate_many(['重试'])
+    assert result['response'] == '重试'
+    assert stub.requests == 3
+
+
+def test_retries_are_exhausted(stub_factory):
+    stub, client = stub_factory([500, 502, 503], retries=2)
+    (result,) = client.generate_many(['失败'])
+    assert isinstance(result, LLMError)
+    assert result.status == 503
+    assert stub.requests == 3
+
+
+def test_client_errors_are_not_retried(stub_factory):
+    stub, client = stub_factory([400], retries=2)
+    (result,) = client.generate_many(['错误请求'])
+    assert isinstance(result, LLMError)
+    assert result.status == 400
+    assert stub.requests == 1
+
+
+def test_timeout_then_retry(stub_factory):
+    stub, client = stub_factory([(200, 1.0)], timeout=0.2, retries=1)
+    (result,) = client.generate_many(['超时'])
+    assert result['response'] == '超时'
+    assert stub.requests == 2
+
+
+def test_timeout_without_retries(stub_factory):
+    stub, client = stub_factory(delay=1.0, timeout=0.2, retries=0)
+    start = time.perf_counter()
+    (result,) = client.generate_many(['超时'])
+    assert isinstance(result, asyncio.TimeoutError)
+    assert time.perf_counter() - start < 0.9
+
+
+def test_agenerate_many_in_caller_loop(stub_factory):
+    stub, client = stub_factory(delay=0.01, max_concurrency=2)
+
+    async def run():
+        return await client.agenerate_many(['一', '二', '三'])
+
+    assert [result['response'] for result in asyncio.run(run())] == ['一', '二', '三']
+    assert stub.max_in_flight <= 2
@@ -0,0 +1,84 @@
+"""词典自动机与逐个词条str.find的结果对照"""
+import pickle
+
+import pytest
+
+from privacy_redactor.matcher import DictionaryMatcher, leftmost_longest
+
+WORDS = {
+    '张伟': 'NAME',
+    '张伟明': 'NAME',
+    '伟明': 'NAME',
+    '北京': 'LOCATION',
+    '北京协和医院': 'ORGANIZATION',
+    '协和': 'ORGANIZATION',
+    '和医': 'OTHER',
+    '啊啊': 'OTHER',
+    'ab': 'OTHER',
+    'b': 'OTHER',
+}
+
+CORPUS = [
+    '患者张伟明在北京协和医院就诊，张伟陪同。',
+    '啊啊啊啊',
+    'abab b',
+    '北京北京协和',
+    '无匹配内容',
+    '',
+]
+
+
+def naive(words, text):
+    """逐个词条用str.find查找全部出现位置（包括重叠的出现）"""
+    result = []
+    for word, entity_type in words.items():
+        start = text.find(word)
+        while start != -1:
+            result.append((start, start + len(word), entity_type))
+            start = text.find(word, start + 1)
+    return result
+
+
+@pytest.mark.parametrize('text', CORPUS)
+def test_matches_per_word_find(text):
+    matcher = DictionaryMatcher(WORDS)
+    assert sorted(matcher.iter_matches(text)) == sorted(naive(WORDS, text))
+    assert matcher.find_all(text) == leftmost_longest(naive(WORDS, text))
+
+
+def test_leftmost_longest():
+    matcher = DictionaryMatcher(WORDS)
+    text = CORPUS[0]
+    assert [(text[start:end], entity_type) for start, end, entity_type in matcher.find_all(text)] == [
+        ('张伟明', 'NAME'), ('北京协和医院', 'ORGANIZATION'), ('张伟', 'NAME')]
+    assert matcher.find_all('啊啊啊啊') == [(0, 2, 'OTHER'), (2, 4, 'OTHER')]
+
+
+def test_first_type_wins_and_words_added_after_matching():
+    matcher = DictionaryMatcher(['李雷'], 'NAME')
+    matcher.add_word('李雷', 'ORGANIZATION')
+    assert len(matcher) == 1
+    assert matcher.extract('李雷和韩梅梅') == [
+        {'original': '李雷', 'type': 'NAME', 'replacement': '[姓名]', 'start': 0, 'end': 2}]
+    # 匹配之后继续添加词条，下次匹配时重新构建
+    matcher.add_word('韩梅梅', 'NAME')
+    assert matcher.find_all('李雷和韩梅梅') == [(0, 2, 'NAME'), (3, 6, 'NAME')]
+    assert '韩梅梅' in matcher and '韩梅' not in matcher
+
+
+def test_fingerprint_and_pickle():
+    matcher = DictionaryMatcher(WORDS)
+    fingerprint = matcher.fingerprint()
+    assert DictionaryMatcher(WORDS).fingerprint() == fingerprint
+    matcher.find_all(CORPUS[0])
+    restored = pickle.loads(pickle.dumps(matcher))
+    assert restored.find_all(CORPUS[0]) == matcher.find_all(CORPUS[0])
+    matcher.add_word('就诊', 'OTHER')
+    assert matcher.fingerprint() != fingerprint
+
+
+def test_empty_matcher():
+    matcher = DictionaryMatcher()
+    matcher.add_word('')
+    assert len(matcher) == 0
+    assert matcher.find_all('张伟') == []
@@ -0,0 +1,130 @@
+"""组合扫描器与逐条规则匹配的结果对照"""
+import re
+
+import pytest
+
+from privacy_redactor.patterns import PatternEngine, _compile_rules
+from privacy_redactor.utils import REGEX_PATTERNS
+
+CORPUS = [
+    '患者张伟，身份证号110105198003151234，手机13812345678，邮箱zhang.wei@example.com。',
+    '住院号：20240315  门诊号:A12345  病案号 8899001122  病历号：MR7788',
+    '医保号：YB0099 社保号：12345678901234 总费用：￥1234.50 自费金额321',
+    '主治医师：李明 记录医师王芳 2024年3月15日 08:30 复查 2024-03-16 14:05:09',
+    '现住址：北京市海淀区中关村大街27号院3号楼 银行卡6222021234567890123',
+    '无隐私信息的体征记录：体温36.5℃，脉搏80次/分，血压120/80mmHg。',
+    '',
+]
+
+# 带有前后断言、命名组、作用域标志的自定义规则
+CUSTOM = [
+    ('CASE_NUMBER', r'(?<=单号)\d{4}(?=号)', 0),
+    ('BED', r'(?P<bed>\d{1,3})床(?!位费)', 0),
+    ('TAG', r'(?i)tag-[a-z]+', 0),
+    ('WARD', r'病区\s*(\w+)', 0),
+]
+CUSTOM_CORPUS = ['复查单号1234号，12床，13床位费，TAG-abc tag-XY，病区 东3', '单号5678 号，床']
+
+
+def reference(rules, text):
+    """在每个位置按顺序逐条尝试规则，命中后从匹配结束处继续"""
+    compiled = [re.compile(pattern, flags) for _, pattern, flags in rules]
+    result = []
+    pos = 0
+    while pos < len(text):
+        for (entity_type, _, _), regex in zip(rules, compiled):
+            match = regex.match(text, pos)
+            if match:
+                break
+        else:
+            pos += 1
+            continue
+        pos = match.end()
+        spans = [match.span(group) for group in range(1, regex.groups + 1)] or [match.span()]
+        spans = [span for span in spans if span[1] > span[0]]
+        if spans:
+            result.append((entity_type, spans[0][0], spans[0][1]))
+    return result
+
+
+def legacy(rules, text):
+    """改为组合扫描器之前的逐条规则finditer，结果之间可能重叠"""
+    result = []
+    for entity_type, pattern, flags in rules:
+        for match in re.finditer(pattern, text, flags):
+            group = next((i for i in range(1, match.re.groups + 1) if match.group(i)), 0)
+            result.append((entity_type, match.start(group), match.end(group)))
+    return result
+
+
+def engine_for(rules):
+    engine = PatternEngine(patterns={})
+    for entity_type, pattern, flags in rules:
+        engine.add_pattern(entity_type, pattern, flags=flags)
+    return engine
+
+
+def found(engine, text):
+    return [(rule.entity_type, start, end) for rule, start, end in engine.finditer(text)]
+
+
+BUILTIN = [(entity_type, pattern, 0) for entity_type, pattern in REGEX_PATTERNS.items()]
+
+
+@pytest.mark.parametrize('text', CORPUS)
+def test_builtin_rules_match_reference(text):
+    engine = PatternEngine()
+    result = found(engine, text)
+    assert result == reference(BUILTIN, text)
+    # 每个结果都是旧实现中某条规则给出的结果，重叠的低优先级结果被去掉
+    assert set(result) <= set(legacy(BUILTIN, text))
+
+
+def test_builtin_rules_use_first_char_prefilter():
+    scanner, _ = _compile_rules(tuple(rule.key() for rule in PatternEngine().rules))
+    assert scanner.pattern.startswith('[')
+
+
+@pytest.mark.parametrize('text', CUSTOM_CORPUS)
+def test_custom_rules_with_assertions_match_reference(text):
+    engine = engine_for(CUSTOM)
+    # 开头的全局内联标志已转换为本条规则的标志位
+    assert engine.rules[2].pattern == 'tag-[a-z]+' and engine.rules[2].flags == re.IGNORECASE
+    rules = [rule.key() for rule in engine.rules]
+    assert found(engine, text) == reference(rules, text)
+
+
+def test_custom_rules_results():
+    engine = engine_for(CUSTOM)
+    text = CUSTOM_CORPUS[0]
+    assert [(entity_type, text[start:end]) for entity_type, start, end in found(engine, text)] == [
+        ('CASE_NUMBER', '1234'), ('BED', '12'), ('TAG', 'TAG-abc'), ('TAG', 'tag-XY'), ('WARD', '东3')]
+    # 忽略大小写的规则无法计算首字符集合，扫描器不加前置字符集
+    scanner, _ = _compile_rules(tuple(rule.key() for rule in engine.rules))
+    assert not scanner.pattern.startswith('[')
+    assert found(engine_for(CUSTOM[:2]), text) == [('CASE_NUMBER', 4, 8), ('BED', 10, 12)]
+
+
+def test_earlier_rule_wins_at_same_position():
+    text = '住院号：20240315'
+    assert found(PatternEngine(), text) == [('PATIENT_ID', 4, 12)]
+    engine = engine_for([('ADMISSION_NO', REGEX_PATTERNS['ADMISSION_NO'], 0),
+                         ('PATIENT_ID', REGEX_PATTERNS['PATIENT_ID'], 0)])
+    assert found(engine, text) == [('ADMISSION_NO', 4, 12)]
+
+
+@pytest.mark.parametrize('pattern, message', [
+    (r'(\d)\1', '数字反向引用'),
+    (r'\d*', '空字符串'),
+])
+def test_rejected_patterns(pattern, message):
+    with pytest.raises(ValueError, match=message):
+        PatternEngine(patterns={}).add_pattern('X', pattern)
+
+
+def test_fingerprint_changes_with_rules():
+    engine = PatternEngine()
+    fingerprint = engine.fingerprint()
+    assert PatternEngine().fingerprint() == fingerprint
+    engine.add_pattern('BED', r'\d+床')
+    assert engine.fingerprint() != fingerprint
@@ -0,0 +1,55 @@
+"""伪名化对应表在代号冲突时的记录与还原"""
+from privacy_redactor.pseudonym import PseudonymVault, Pseudonymizer
+
+
+def _colliding_names(pseudonymizer):
+    """找出得到同一代号的两个不同姓名，4位代号只有65536种，几百个姓名内必然出现冲突"""
+    seen = {}
+    for i in range(100000):
+        name = f'患者{i}'
+        surrogate = pseudonymizer.surrogate('NAME', name)
+        if surrogate in seen:
+            return seen[surrogate], name, surrogate
+        seen[surrogate] = name
+    raise AssertionError('没有找到冲突的代号')
+
+
+def test_colliding_surrogates_keep_every_original(tmp_path):
+    first, second, surrogate = _colliding_names(Pseudonymizer('test-key', code_length=4))
+
+    with PseudonymVault(str(tmp_path), shards=4) as vault:
+        pseudonymizer = Pseudonymizer('test-key', vault=vault, code_length=4)
+        assert pseudonymizer.surrogate('NAME', first) == pseudonymizer.surrogate('NAME', second) == surrogate
+        # 重复出现的实体不会重复写入
+        pseudonymizer.surrogate('NAME', first)
+        assert vault.lookup(surrogate) == [first, second]
+
+    # 重新打开对应表后按已有记录去重，新的冲突原文仍会写入
+    with PseudonymVault(str(tmp_path), shards=4) as vault:
+        vault.record('NAME', surrogate, first)
+        vault.record('NAME', surrogate, second)
+        vault.record('NAME', surrogate, '患者甲')
+        assert vault.lookup(surrogate) == [first, second, '患者甲']
+        assert sum(1 for record in vault.iter_records() if record['surrogate'] == surrogate) == 3
+
+
+def test_reopen_after_partial_line(tmp_path):
+    with PseudonymVault(str(tmp_path), shards=1) as vault:
+        vault.record('NAME', '[姓名A]', '张伟')
+    # 模拟写到一半时进程被终止
+    with open(vault.shard_path(0), 'ab') as f:
+        f.write('{"surrogate":"[姓名B]","type":"NA'.encode('utf-8'))
+
+    with PseudonymVault(str(tmp_path), shards=1) as vault:
+        vault.record('NAME', '[姓名B]', '李娜')
+        vault.record('NAME', '[姓名A]', '张伟')
+        assert vault.lookup('[姓名B]') == ['李娜']
+        assert [record['original'] for record in vault.iter_records()] == ['张伟', '李娜']
+    with open(vault.shard_path(0), 'rb') as f:
+        assert f.read().count(b'\n') == 2
+
+
+def test_default_code_length():
+    surrogate = Pseudonymizer('test-key').surrogate('NAME', '张伟')
+    assert len(surrogate) == len('[姓名]') + 16
+    assert Pseudonymizer('test-key', code_length=8).surrogate('NAME', '张伟') == surrogate[:-9] + ']'
@@ -0,0 +1,97 @@
+"""同一个PrivacyRedactor在多个线程和协程中并发处理文件"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from privacy_redactor import PrivacyRedactor
+from privacy_redactor.handlers import FileHandler
+from privacy_redactor.matcher import DictionaryMatcher
+
+
+def _write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f'note{i}.txt'
+        lines = [f'患者编号{i}，联系电话138{i:08d}。'] * (i % 5 + 1)
+        path.write_text('\n'.join(lines), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def _summary(result):
+    output_path, entities = result
+    with open(output_path, encoding='utf-8') as f:
+        return f.read(), [(entity['original'], entity['start']) for entity in entities]
+
+
+def test_redact_file_from_many_threads(tmp_path):
+    redactor = PrivacyRedactor(strategy='regex')
+    paths = _write_files(tmp_path, 40)
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda path: redactor.redact_file(path, path + '.out'), paths))
+    # 每个文件得到自己的实体，条数与文件中的电话号码数一致
+    for i, (path, result) in enumerate(zip(paths, results)):
+        text, entities = _summary(result)
+        assert len(entities) == i % 5 + 1
+        assert {original for original, _ in entities} == {f'138{i:08d}'}
+        assert '[PHONE]' in text
+
+
+def test_redact_files_async_matches_sequential(tmp_path):
+    redactor = PrivacyRedactor(strategy='regex')
+    paths = _write_files(tmp_path, 12)
+    expected = [_summary(redactor.redact_file(path, path + '.seq')) for path in paths]
+    results = asyncio.run(redactor.redact_files_async(paths, [path + '.async' for path in paths], concurrency=4))
+    assert [_summary(result) for result in results] == expected
+
+
+def test_redact_files_async_errors(tmp_path):
+    redactor = PrivacyRedactor(strategy='regex')
+    (path,) = _write_files(tmp_path, 1)
+    unsupported = str(tmp_path / 'scan.pdf')
+    results = asyncio.run(redactor.redact_files_async([unsupported, path], return_exceptions=True))
+    assert isinstance(results[0], ValueError)
+    assert len(results[1][1]) == 1
+    with pytest.raises(ValueError):
+        asyncio.run(redactor.redact_files_async([unsupported, path]))
+    with pytest.raises(ValueError):
+        asyncio.run(redactor.redact_files_async([path], [None, None]))
+
+
+class _LegacyHandler(FileHandler):
+    """把结果保存在实例上、redact不返回实体的旧式处理器"""
+
+    def redact(self, input_path, output_path, strategy, language=None):
+        with open(input_path, encoding='utf-8') as f:
+            text = f.read()
+        self.entities = strategy.extract_entities(text)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def test_legacy_handler_without_return_value(tmp_path):
+    redactor = PrivacyRedactor(strategy='regex')
+    redactor.file_handlers['.txt'] = _LegacyHandler()
+    (path,) = _write_files(tmp_path, 1)
+    _, entities = redactor.redact_file(path, path + '.out')
+    assert [entity['type'] for entity in entities] == ['PHONE']
+
+
+def test_dictionary_matcher_first_match_from_many_threads():
+    words = [f'医院{i}号楼' for i in range(2000)]
+    text = '，'.join(words[::7])
+    expected = DictionaryMatcher(words, 'ORGANIZATION').find_all(text)
+    for _ in range(5):
+        # 自动机在第一次匹配时构建，多个线程同时触发构建
+        matcher = DictionaryMatcher(words, 'ORGANIZATION')
+        barrier = threading.Barrier(8)
+
+        def match():
+            barrier.wait()
+            return matcher.find_all(text)
+
+        with ThreadPoolExecutor(8) as executor:
+            results = [future.result() for future in [executor.submit(match) for _ in range(8)]]
+        assert all(result == expected for result in results)
@@ -0,0 +1,39 @@
+"""策略注册表与包的导出名称"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import privacy_redactor
+from privacy_redactor import PrivacyRedactor, available_strategies, register_strategy, unregister_strategy
+
+
+def test_every_export_resolves():
+    for name in privacy_redactor.__all__:
+        assert getattr(privacy_redactor, name) is not None
+    # 星号导入会访问全部导出名称，在子进程中执行避免污染当前命名空间
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', 'from privacy_redactor import *'], check=True, cwd=root)
+
+
+def test_builtin_strategies_can_be_created():
+    assert set(available_strategies()) >= {'regex', 'medical', 'auto'}
+    for name in ('regex', 'medical', 'auto'):
+        assert PrivacyRedactor(strategy=name).strategy is not None
+
+
+def test_register_custom_strategy():
+    class Upper:
+        def extract_entities(self, text, language=None):
+            return []
+
+    register_strategy('test-upper', Upper)
+    try:
+        assert isinstance(PrivacyRedactor(strategy='test-upper').strategy, Upper)
+        with pytest.raises(ValueError):
+            register_strategy('test-upper', Upper)
+    finally:
+        unregister_strategy('test-upper')
+    with pytest.raises(ValueError):
+        PrivacyRedactor(strategy='test-upper')
@@ -0,0 +1,97 @@
+"""常驻服务的请求校验和启动过程"""
+import asyncio
+import json
+import multiprocessing
+import threading
+
+import pytest
+
+from privacy_redactor import PrivacyRedactor
+from privacy_redactor.server import RedactionServer
+
+
+async def _request(path, method='GET', payload=None, unix_path=None, port=None):
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'
+                 .encode('latin-1') + body)
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_texts_and_doc_ids_must_have_the_same_length():
+    async def run():
+        server = RedactionServer(PrivacyRedactor(strategy='regex'), max_delay=0)
+        await server.start()
+        listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            texts = ['电话13812345678', '邮箱a@example.com', '无隐私信息']
+            status, payload = await _request('/redact', 'POST', {'texts': texts, 'doc_ids': ['a']}, port=port)
+            assert status == 400
+            status, payload = await _request('/redact', 'POST', {'texts': texts, 'doc_ids': ['a', 'b', 'c']},
+                                             port=port)
+            assert status == 200
+            assert [result['text'] for result in payload['results']] == [
+                '电话[PHONE]', '邮箱[EMAIL]', '无隐私信息']
+        finally:
+            listener.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+class _SlowWarmup:
+    """预热阻塞到测试允许为止的策略"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def warmup(self):
+        self.release.wait(10)
+
+    def extract_entities(self, text, language=None):
+        return []
+
+
+@pytest.mark.parametrize('workers', [
+    0,
+    # 以fork方式启动工作进程时先在服务进程中预热，工作进程继承已释放的事件
+    pytest.param(1, marks=pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                             reason='预热阻塞的策略只能通过fork传给工作进程')),
+])
+def test_health_reports_starting_during_warmup(tmp_path, workers):
+    unix_path = str(tmp_path / 'cn-hpp.sock')
+    strategy = _SlowWarmup()
+
+    async def wait_for(status):
+        for _ in range(200):
+            try:
+                result = await _request('/health', unix_path=unix_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                result = None
+            if result is not None and result[0] == status:
+                return result[1]
+            await asyncio.sleep(0.02)
+        raise AssertionError(f'/health没有返回{status}')
+
+    async def run():
+        server = RedactionServer(PrivacyRedactor(strategy=strategy), workers=workers)
+        task = asyncio.ensure_future(server.serve_forever(unix_path=unix_path))
+        try:
+            assert (await wait_for(503))['status'] == 'starting'
+            status, _ = await _request('/redact', 'POST', {'text': '你好'}, unix_path=unix_path)
+            assert status == 503
+            strategy.release.set()
+            assert (await wait_for(200))['status'] == 'ok'
+        finally:
+            strategy.release.set()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+"""JsonlEntitySink中断后重新打开时的续写"""
+from privacy_redactor.sink import JsonlEntitySink, iter_entities, segment_paths
+
+ENTITY = {'original': '张伟', 'type': 'NAME', 'replacement': '[姓名]', 'start': 2, 'end': 4}
+
+
+def test_reopen_after_partial_line(tmp_path):
+    path = str(tmp_path / 'entities.jsonl')
+    with JsonlEntitySink(path) as sink:
+        sink.write('a.txt', [ENTITY])
+    # 模拟写到一半时进程被终止
+    (segment,) = segment_paths(path)
+    with open(segment, 'ab') as f:
+        f.write('{"original":"李'.encode('utf-8'))
+
+    with JsonlEntitySink(path) as sink:
+        sink.write('b.txt', [ENTITY, dict(ENTITY, start=10, end=12)])
+    assert [(entity['doc'], entity['start']) for entity in iter_entities(path)] == [
+        ('a.txt', 2), ('b.txt', 2), ('b.txt', 10)]
+
+
+def test_reopen_file_without_newline_at_all(tmp_path):
+    path = str(tmp_path / 'entities.jsonl')
+    segment = tmp_path / 'entities.00000.jsonl'
+    segment.write_bytes(b'{"doc":')
+    with JsonlEntitySink(path, per_document=True) as sink:
+        sink.write('a.txt', [ENTITY])
+    assert [entity['doc'] for entity in iter_entities(path)] == ['a.txt']
+    assert segment.read_bytes().count(b'\n') == 1
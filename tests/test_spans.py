@@ -0,0 +1,99 @@
+"""按位置替换、重叠取舍和位置映射"""
+import pytest
+
+from privacy_redactor.spans import locate_entities, redact_spans, resolve_overlaps
+
+
+def entity(text, original, entity_type, start=None, replacement=None):
+    start = text.index(original) if start is None else start
+    return {'original': original, 'type': entity_type, 'replacement': replacement or f'[{entity_type}]',
+            'start': start, 'end': start + len(original)}
+
+
+def legacy_redact(text, entities):
+    """改为按位置替换之前的逐个实体str.replace"""
+    for item in sorted(entities, key=lambda e: len(e['original']), reverse=True):
+        text = text.replace(item['original'], item['replacement'])
+    return text
+
+
+def test_matches_str_replace_for_disjoint_entities():
+    text = '患者张伟，电话13812345678，张伟的家属李娜。'
+    entities = [entity(text, '张伟', 'NAME'), entity(text, '13812345678', 'PHONE'),
+                entity(text, '张伟', 'NAME', start=text.rindex('张伟')), entity(text, '李娜', 'NAME')]
+    redacted, kept, _ = redact_spans(text, entities)
+    assert redacted == legacy_redact(text, entities) == '患者[NAME]，电话[PHONE]，[NAME]的家属[NAME]。'
+    assert [item['start'] for item in kept] == [2, 7, 19, 24]
+
+
+def test_replacement_text_is_not_rescanned():
+    # str.replace会把替换文本中的“姓名”再次替换，按位置替换不会
+    text = '张三 姓名'
+    entities = [entity(text, '张三', 'NAME', replacement='姓名'), entity(text, '姓名', 'OTHER', start=3)]
+    assert redact_spans(text, entities)[0] == '姓名 [OTHER]'
+    assert legacy_redact(text, entities) == '[OTHER] [OTHER]'
+
+
+def test_higher_priority_type_wins_overlap():
+    text = '身份证110105198003151234'
+    id_card = entity(text, '110105198003151234', 'ID_CARD')
+    phone = entity(text, '10519800315', 'PHONE')
+    date = entity(text, '19800315', 'DATE')
+    assert resolve_overlaps([date, phone, id_card]) == [id_card]
+    # 自定义优先级覆盖默认值
+    assert resolve_overlaps([date, phone, id_card], {'DATE': 200}) == [date]
+
+
+def test_equal_priority_prefers_longer_then_earlier():
+    text = '北京协和医院协和'
+    short = entity(text, '北京', 'LOCATION')
+    long = entity(text, '北京协和医院', 'ORGANIZATION')
+    tail = entity(text, '协和', 'ORGANIZATION', start=6)
+    overlapping = entity(text, '医院协和', 'ORGANIZATION', start=4)
+    priority = {'LOCATION': 50, 'ORGANIZATION': 50}
+    assert resolve_overlaps([short, tail, overlapping, long], priority) == [long, tail]
+    first = entity(text, '京协', 'NAME', start=1)
+    second = entity(text, '协和', 'NAME', start=2)
+    assert resolve_overlaps([second, first]) == [first]
+
+
+def test_touching_and_empty_spans():
+    text = '张伟李娜'
+    a, b = entity(text, '张伟', 'NAME'), entity(text, '李娜', 'NAME')
+    empty = dict(a, start=1, end=1)
+    assert resolve_overlaps([b, empty, a]) == [a, b]
+
+
+def test_locate_entities_expands_every_occurrence():
+    text = '张伟和张伟明'
+    located = locate_entities(text, [{'original': '张伟', 'type': 'NAME', 'replacement': '[姓名]'},
+                                     {'original': '', 'type': 'NAME', 'replacement': '[姓名]'}])
+    assert sorted((item['start'], item['end']) for item in located) == [(0, 2), (3, 5)]
+
+
+def test_offset_map_round_trip():
+    text = '患者张伟，电话13812345678。'
+    entities = [entity(text, '张伟', 'NAME', replacement='[姓名]'), entity(text, '13812345678', 'PHONE')]
+    redacted, kept, offsets = redact_spans(text, entities)
+    assert redacted == '患者[姓名]，电话[PHONE]。'
+    assert list(offsets) == [(2, 4, 2, 6), (7, 18, 9, 16)]
+    for item, (_, _, redacted_start, redacted_end) in zip(kept, offsets):
+        assert redacted[redacted_start:redacted_end] == item['replacement']
+        assert offsets.to_redacted(item['start']) == redacted_start
+        assert offsets.to_original(redacted_start) == item['start']
+    # 替换片段之外的字符两边一一对应
+    for pos, char in enumerate(text):
+        if not any(start <= pos < end for start, end, _, _ in offsets):
+            assert redacted[offsets.to_redacted(pos)] == char
+            assert offsets.to_original(offsets.to_redacted(pos)) == pos
+    # 被替换片段内部的位置映射到替换片段的起始位置
+    assert offsets.to_redacted(3) == 2
+    assert offsets.to_original(4) == 2
+    assert offsets.to_redacted(len(text)) == len(redacted)
+
+
+@pytest.mark.parametrize('text', ['', '没有实体'])
+def test_no_entities(text):
+    redacted, kept, offsets = redact_spans(text, [])
+    assert (redacted, kept, len(offsets)) == (text, [], 0)
+    assert offsets.to_redacted(len(text)) == len(text)
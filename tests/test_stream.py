@@ -0,0 +1,41 @@
+"""纯文本文件流式处理的输出必须与一次性处理完全相同，包括实体恰好跨越块边界的情况"""
+import pytest
+
+from privacy_redactor.handlers import TextFileHandler
+from privacy_redactor.registry import create_strategy
+
+LINES = [
+    "患者张伟，男，45岁，身份证号码330102197508124567，联系电话13812345678。",
+    "家庭住址：浙江省杭州市西湖区文三路123号，邮箱zhangwei@example.com",
+    "住院号：12345678，2023年5月12日入院。主治医师：李明",
+    "今日血压130/80mmHg，心率80次/分，双肺呼吸音清。",
+]
+
+
+def _redact(tmp_path, name, text, **options):
+    input_path = tmp_path / f'{name}.txt'
+    output_path = tmp_path / f'{name}_redacted.txt'
+    input_path.write_text(text, encoding='utf-8')
+    stream = options.pop('stream')
+    handler = TextFileHandler(**options)
+    entities = handler.redact(str(input_path), str(output_path), create_strategy('regex'), stream=stream)
+    return output_path.read_text(encoding='utf-8'), entities.to_dicts()
+
+
+@pytest.mark.parametrize('chunk_size', [7, 31, 64, 113])
+def test_stream_matches_full_run(tmp_path, chunk_size):
+    # 行长度与块大小互不整除，实体会落在各种块边界位置上
+    text = '\n'.join(LINES[i % len(LINES)] for i in range(60))
+    expected_text, expected_entities = _redact(tmp_path, 'full', text, stream=False)
+    redacted_text, entities = _redact(tmp_path, 'stream', text, stream=True, chunk_size=chunk_size, overlap=96)
+    assert redacted_text == expected_text
+    assert entities == expected_entities
+    assert expected_entities
+
+
+def test_stream_without_boundary_chars(tmp_path):
+    # 没有换行和句末标点时在重叠窗口处硬切，跨越切分点的实体留到下一轮
+    text = '，'.join('电话13812345678身份证330102197508124567' for _ in range(40))
+    expected = _redact(tmp_path, 'full', text, stream=False)
+    assert len(expected[1]) == 80
+    assert _redact(tmp_path, 'stream', text, stream=True, chunk_size=23, overlap=64) == expected
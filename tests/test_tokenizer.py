@@ -0,0 +1,100 @@
+"""分词词典快照的校验、加载与配置指纹
+
+jieba的词典是进程内共享的状态，每个用例在单独的子进程中运行。
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip('jieba')
+
+from privacy_redactor.tokenizer import SNAPSHOT_MAGIC, _HEADER_LENGTH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('CN_HPP_JIEBA_SNAPSHOT', None)
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)], env=env, cwd=ROOT,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope='module')
+def snapshots(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('snapshots')
+    user_dict = directory / 'terms.txt'
+    user_dict.write_text('文三路 1000 ns\n', encoding='utf-8')
+    paths = {'plain': str(directory / 'plain.snap'), 'user': str(directory / 'user.snap')}
+    _run(f"""
+        import json
+        from privacy_redactor.tokenizer import build_snapshot
+        print(json.dumps(build_snapshot({paths['plain']!r})))
+    """)
+    _run(f"""
+        import json
+        from privacy_redactor.tokenizer import build_snapshot
+        print(json.dumps(build_snapshot({paths['user']!r}, user_dicts=[{str(user_dict)!r}])))
+    """)
+
+    # 改写头部中的Python版本，模拟由其他Python版本生成的快照
+    with open(paths['plain'], 'rb') as f:
+        data = f.read()
+    offset = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+    (length,) = _HEADER_LENGTH.unpack_from(data, len(SNAPSHOT_MAGIC))
+    header = json.loads(data[offset:offset + length])
+    header['python'] = '2.7'
+    encoded = json.dumps(header).encode('utf-8')
+    paths['stale'] = str(directory / 'stale.snap')
+    with open(paths['stale'], 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + _HEADER_LENGTH.pack(len(encoded)) + encoded + data[offset + length:])
+    return paths
+
+
+def _strategy_state(*snapshots):
+    return _run(f"""
+        import json
+        from privacy_redactor.strategies import MedicalStrategy
+        text = '患者张伟，家住杭州市西湖区文三路123号，电话13812345678。'
+        results = []
+        for snapshot in {list(snapshots)!r}:
+            strategy = MedicalStrategy(tokenizer_snapshot=snapshot)
+            fingerprint = strategy.fingerprint()
+            results.append({{'id': strategy._tokenizer_id, 'fingerprint': fingerprint,
+                             'entities': [dict(e) for e in strategy.get_entities(text)]}})
+        print(json.dumps(results, ensure_ascii=False))
+    """)
+
+
+def test_snapshot_matches_plain_dictionary(snapshots):
+    (plain,) = _strategy_state(None)
+    (snapshot,) = _strategy_state(snapshots['plain'])
+    assert plain['id'] is None
+    assert snapshot['id'] is not None
+    assert snapshot['entities'] == plain['entities']
+    assert snapshot['fingerprint'] != plain['fingerprint']
+
+
+def test_rejected_snapshot_does_not_enter_fingerprint(snapshots):
+    (plain,) = _strategy_state(None)
+    (stale,) = _strategy_state(snapshots['stale'])
+    assert stale['id'] is None
+    assert stale['fingerprint'] == plain['fingerprint']
+
+
+def test_later_snapshot_replaces_loaded_dictionary(snapshots):
+    first, second, third = _strategy_state(snapshots['plain'], snapshots['user'], snapshots['user'])
+    assert first['id'] != second['id']
+    assert second['id'] == third['id']
+    assert second['fingerprint'] == third['fingerprint']
+    # 第二个快照中的用户词典在同一进程中生效，结果与单独使用该快照相同
+    (alone,) = _strategy_state(snapshots['user'])
+    assert second['entities'] == alone['entities']
+    assert '文三路' in [entity['original'] for entity in second['entities']]
+    assert '文三路' not in [entity['original'] for entity in first['entities']]
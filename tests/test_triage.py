@@ -0,0 +1,19 @@
+"""文档分类中医疗关键词与隐私线索的统计"""
+from privacy_redactor.triage import classify
+
+
+def test_pii_cues_sharing_medical_prefixes_are_counted():
+    # 住院号、门诊号、病历号以医疗关键词开头，仍应计为隐私线索
+    triage = classify('住院号：12345678 门诊号：A1234 病历号')
+    assert triage.medical
+    assert triage.medical_hits == 3
+    assert triage.pii_hints == 4
+
+
+def test_language_and_medical_detection():
+    assert classify('Patient John Smith was admitted on Monday.').language == 'en'
+    triage = classify('患者张伟，男，45岁，血压130/80mmHg，联系电话13812345678。')
+    assert triage.language == 'zh'
+    assert triage.medical_hits == 2
+    # 人名线索词“患者”、字段名“电话”和手机号
+    assert triage.pii_hints == 3